@@ -0,0 +1,201 @@
+import numpy as np
+import ChessEngine
+from ChessEngine import PIECES, EMPTY, KING, WHITE, BLACK, POSITION_BYTES
+from Evaluation import MIDDLEGAME_TABLES, ENDGAME_TABLES, PIECE_VALUES, PHASE_WEIGHTS, MAX_PHASE
+
+'''
+Vectorized analysis of many positions at once with NumPy, the engine itself does not need NumPy.
+A batch is either an (N, 12) uint64 array of piece bitboards or an (N, 12, 64) uint8 array of piece planes,
+both in ChessEngine piece order (color*6 + type) and square order (row*8 + col, a8 is 0).
+Side to move travels separately as an (N,) bool array, True for white
+'''
+U64 = np.uint64
+SQUARE_SHIFTS = np.arange(64, dtype=U64)
+
+_FILE_A = np.bitwise_or.reduce(np.array([1 << (r*8) for r in range(8)], dtype=U64))
+_FILE_H = _FILE_A << U64(7)
+NOT_FILE_A = ~_FILE_A
+NOT_FILE_H = ~_FILE_H
+NOT_FILES_AB = ~(_FILE_A | (_FILE_A << U64(1)))
+NOT_FILES_GH = ~(_FILE_H | (_FILE_H >> U64(1)))
+
+# (shift, mask of squares a step may land on) per direction, positive shifts go towards h1
+_EAST, _WEST = (1, NOT_FILE_A), (-1, NOT_FILE_H)
+_NORTH, _SOUTH = (-8, ~U64(0)), (8, ~U64(0))
+_NORTH_EAST, _NORTH_WEST = (-7, NOT_FILE_A), (-9, NOT_FILE_H)
+_SOUTH_EAST, _SOUTH_WEST = (9, NOT_FILE_A), (7, NOT_FILE_H)
+ROOK_DIRECTIONS = (_EAST, _WEST, _NORTH, _SOUTH)
+BISHOP_DIRECTIONS = (_NORTH_EAST, _NORTH_WEST, _SOUTH_EAST, _SOUTH_WEST)
+KNIGHT_STEPS = ((-17, NOT_FILE_H), (-15, NOT_FILE_A), (-10, NOT_FILES_GH), (-6, NOT_FILES_AB),
+                (6, NOT_FILES_GH), (10, NOT_FILES_AB), (15, NOT_FILE_H), (17, NOT_FILE_A))
+KING_STEPS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+_MIDDLEGAME = np.array(MIDDLEGAME_TABLES, dtype=np.int32)
+_ENDGAME = np.array(ENDGAME_TABLES, dtype=np.int32)
+_VALUES = np.array(PIECE_VALUES * 2, dtype=np.int32)
+_PHASE_WEIGHTS = np.array(PHASE_WEIGHTS * 2, dtype=np.int32)
+
+
+def _shift(bitboards, shift):
+    return bitboards << U64(shift) if shift > 0 else bitboards >> U64(-shift)
+
+
+def _step(bitboards, direction):
+    shift, mask = direction
+    return _shift(bitboards, shift) & mask
+
+
+'''
+Kogge-Stone fill: squares a slider on gen reaches along one direction, stopping at (and including) blockers
+'''
+def _slide(gen, empty, direction):
+    shift, mask = direction
+    empty = empty & mask
+    gen = gen | (empty & _shift(gen, shift))
+    empty = empty & _shift(empty, shift)
+    gen = gen | (empty & _shift(gen, 2 * shift))
+    empty = empty & _shift(empty, 2 * shift)
+    gen = gen | (empty & _shift(gen, 4 * shift))
+    return _shift(gen, shift) & mask
+
+
+def bitboardsToPlanes(bitboards):
+    return ((np.asarray(bitboards, dtype=U64)[:, :, None] >> SQUARE_SHIFTS) & U64(1)).astype(np.uint8)
+
+
+def planesToBitboards(planes):
+    return np.bitwise_or.reduce(np.asarray(planes).astype(U64) << SQUARE_SHIFTS, axis=2)
+
+
+'''
+Bitboards of a sequence of GameStates, with their side to move
+'''
+def fromGameStates(states):
+    bitboards = np.array([gs.pieceBitboards for gs in states], dtype=U64).reshape(-1, 12)
+    whiteToMove = np.array([gs.whiteToMove for gs in states], dtype=bool)
+    return bitboards, whiteToMove
+
+
+'''
+Piece planes straight from GameState.board style 8x8 lists of piece names
+'''
+def fromBoards(boards):
+    indexes = np.array([[ChessEngine.PIECE_INDEX[piece] for row in board for piece in row] for board in boards],
+                       dtype=np.uint8).reshape(-1, 64)
+    return (indexes[:, None, :] == np.arange(12, dtype=np.uint8)[None, :, None]).astype(np.uint8)
+
+
+def toBoard(planes):
+    indexes = np.full(64, EMPTY, dtype=np.int64)
+    for piece in range(12):
+        indexes[np.asarray(planes[piece]).astype(bool)] = piece
+    return [[PIECES[indexes[r*8 + c]] for c in range(8)] for r in range(8)]
+
+
+def toGameState(planes, whiteToMove = True, castlingRights = 0, enpassantPossible = ()):
+    gs = ChessEngine.GameState()
+    gs.setPosition(toBoard(planes), bool(whiteToMove), castlingRights, enpassantPossible)
+    return gs
+
+
+'''
+Decodes consecutive GameState.toBytes records (a bytes object, mmap or PositionFile data) in one go.
+Returns bitboards, side to move, castling rights and en passant square (ChessEngine.NO_SQUARE when there is none)
+'''
+def fromPositionBytes(data):
+    records = np.frombuffer(data, dtype=np.uint8).reshape(-1, POSITION_BYTES)
+    occupancy = records[:, :8].copy().view('<u8').reshape(-1)
+    occupied = ((occupancy[:, None] >> SQUARE_SHIFTS) & U64(1)).astype(bool)
+    nibbles = np.empty((len(records), 32), dtype=np.uint8)
+    nibbles[:, 0::2] = records[:, 8:24] & 15
+    nibbles[:, 1::2] = records[:, 8:24] >> 4
+    order = np.clip(np.cumsum(occupied, axis=1) - 1, 0, 31) # the n-th occupied square holds the n-th nibble
+    pieces = np.where(occupied, np.take_along_axis(nibbles, order, axis=1), EMPTY)
+    planes = (pieces[:, None, :] == np.arange(12)[None, :, None])
+    bitboards = planesToBitboards(planes)
+    flags = records[:, 24]
+    return bitboards, (flags & 1) == WHITE, (flags >> 1) & 15, records[:, 25].astype(np.int64)
+
+
+'''
+Material per side without kings, (N, 2) white then black
+'''
+def material(bitboards):
+    counts = popcount(bitboards)
+    return np.stack([(counts[:, :6] * _VALUES[:6]).sum(axis=1), (counts[:, 6:] * _VALUES[6:]).sum(axis=1)], axis=1)
+
+
+def gamePhase(bitboards):
+    return (popcount(bitboards) * _PHASE_WEIGHTS).sum(axis=1)
+
+
+'''
+Middlegame and endgame piece-square sums (material included, white positive) and the tapered score
+the engine would use, (N,) each
+'''
+def pieceSquareScores(planes):
+    planes = np.asarray(planes, dtype=np.int32)
+    middlegame = np.einsum('nps,ps->n', planes, _MIDDLEGAME)
+    endgame = np.einsum('nps,ps->n', planes, _ENDGAME)
+    phase = np.minimum((planes.sum(axis=2) * _PHASE_WEIGHTS).sum(axis=1), MAX_PHASE)
+    tapered = (middlegame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE
+    return middlegame, endgame, tapered
+
+
+'''
+Tapered score from the point of view of the side to move, like Evaluation.evaluate
+'''
+def evaluate(planes, whiteToMove):
+    return np.where(whiteToMove, 1, -1) * pieceSquareScores(planes)[2]
+
+
+def popcount(bitboards):
+    bitboards = np.asarray(bitboards, dtype=U64)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bitboards).astype(np.int32)
+    return np.unpackbits(bitboards.view(np.uint8), axis=-1).reshape(bitboards.shape + (64,)).sum(axis=-1).astype(np.int32)
+
+
+'''
+Squares attacked by each color, (N, 2) uint64 white then black. Sliders see through nothing, kings included
+'''
+def attackMaps(bitboards):
+    bitboards = np.asarray(bitboards, dtype=U64)
+    occupied = np.bitwise_or.reduce(bitboards, axis=1)
+    empty = ~occupied
+    attacks = np.zeros((len(bitboards), 2), dtype=U64)
+    for color in (WHITE, BLACK):
+        base = color * 6
+        pawns = bitboards[:, base]
+        if color == WHITE:
+            attacked = _step(pawns, _NORTH_EAST) | _step(pawns, _NORTH_WEST)
+        else:
+            attacked = _step(pawns, _SOUTH_EAST) | _step(pawns, _SOUTH_WEST)
+        knights = bitboards[:, base + 1]
+        for step in KNIGHT_STEPS:
+            attacked |= _step(knights, step)
+        king = bitboards[:, base + KING]
+        for step in KING_STEPS:
+            attacked |= _step(king, step)
+        queens = bitboards[:, base + 4]
+        rooks = bitboards[:, base + 3] | queens
+        bishops = bitboards[:, base + 2] | queens
+        for direction in ROOK_DIRECTIONS:
+            attacked |= _slide(rooks, empty, direction)
+        for direction in BISHOP_DIRECTIONS:
+            attacked |= _slide(bishops, empty, direction)
+        attacks[:, color] = attacked
+    return attacks
+
+
+'''
+Whether the side to move is in check, (N,) bool
+'''
+def inCheck(bitboards, whiteToMove, attacks = None):
+    bitboards = np.asarray(bitboards, dtype=U64)
+    if attacks is None:
+        attacks = attackMaps(bitboards)
+    whiteToMove = np.asarray(whiteToMove, dtype=bool)
+    king = np.where(whiteToMove, bitboards[:, KING], bitboards[:, 6 + KING])
+    enemyAttacks = np.where(whiteToMove, attacks[:, BLACK], attacks[:, WHITE])
+    return (king & enemyAttacks) != 0
@@ -0,0 +1,133 @@
+'''
+Bitboard attack tables, built once at import.
+Square index is row*8 + col with row 0 being the 8th rank, the same orientation as GameState.board
+'''
+FULL = (1 << 64) - 1
+
+SQUARES = [(r, c) for r in range(8) for c in range(8)]
+
+ROW_MASKS = [0xFF << (8 * r) for r in range(8)]
+LIGHT_SQUARES = sum(1 << (r*8 + c) for r, c in SQUARES if (r + c) % 2 == 0) # a8 is a light square
+DARK_SQUARES = FULL ^ LIGHT_SQUARES
+
+
+def squareIndex(r, c):
+    return r*8 + c
+
+
+def squareBit(r, c):
+    return 1 << (r*8 + c)
+
+
+def squaresOf(bb):
+    squares = []
+    while bb:
+        low = bb & -bb
+        squares.append(low.bit_length() - 1)
+        bb ^= low
+    return squares
+
+
+def _offsetTable(offsets):
+    table = []
+    for r, c in SQUARES:
+        bb = 0
+        for dr, dc in offsets:
+            ri, ci = r + dr, c + dc
+            if 0 <= ri <= 7 and 0 <= ci <= 7:
+                bb |= squareBit(ri, ci)
+        table.append(bb)
+    return table
+
+
+def _rayTable(dr, dc):
+    table = []
+    for r, c in SQUARES:
+        bb = 0
+        ri, ci = r + dr, c + dc
+        while 0 <= ri <= 7 and 0 <= ci <= 7:
+            bb |= squareBit(ri, ci)
+            ri += dr
+            ci += dc
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _offsetTable(((1, -2), (2, -1), (2, 1), (1, 2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)))
+KING_ATTACKS = _offsetTable(((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)))
+# squares attacked by a pawn of the given color standing on the square
+PAWN_ATTACKS = {'w': _offsetTable(((-1, -1), (-1, 1))), 'b': _offsetTable(((1, -1), (1, 1)))}
+
+# rays going towards lower square indexes stop at the highest blocker, the others at the lowest one
+NORTH = _rayTable(-1, 0)
+SOUTH = _rayTable(1, 0)
+WEST = _rayTable(0, -1)
+EAST = _rayTable(0, 1)
+NORTH_WEST = _rayTable(-1, -1)
+NORTH_EAST = _rayTable(-1, 1)
+SOUTH_WEST = _rayTable(1, -1)
+SOUTH_EAST = _rayTable(1, 1)
+
+ROOK_EMPTY_ATTACKS = [NORTH[sq] | SOUTH[sq] | WEST[sq] | EAST[sq] for sq in range(64)]
+BISHOP_EMPTY_ATTACKS = [NORTH_WEST[sq] | NORTH_EAST[sq] | SOUTH_WEST[sq] | SOUTH_EAST[sq] for sq in range(64)]
+
+
+def rookAttacks(sq, occupied):
+    attacks = 0
+    ray = NORTH[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= NORTH[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = WEST[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= WEST[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = SOUTH[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= SOUTH[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = EAST[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= EAST[(blockers & -blockers).bit_length() - 1]
+    return attacks | ray
+
+
+def bishopAttacks(sq, occupied):
+    attacks = 0
+    ray = NORTH_WEST[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= NORTH_WEST[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = NORTH_EAST[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= NORTH_EAST[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = SOUTH_WEST[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= SOUTH_WEST[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = SOUTH_EAST[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= SOUTH_EAST[(blockers & -blockers).bit_length() - 1]
+    return attacks | ray
+
+
+def _betweenTable():
+    table = [[0] * 64 for _ in range(64)]
+    for rays in (NORTH, SOUTH, WEST, EAST, NORTH_WEST, NORTH_EAST, SOUTH_WEST, SOUTH_EAST):
+        for a in range(64):
+            for b in squaresOf(rays[a]):
+                table[a][b] = rays[a] & ~rays[b] & ~(1 << b)
+    return table
+
+
+# squares strictly between two squares sharing a line, 0 when they are not aligned
+BETWEEN = _betweenTable()
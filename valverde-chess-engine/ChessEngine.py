@@ -1,3 +1,71 @@
+import struct
+from array import array
+from Bitboards import (FULL, ROW_MASKS, LIGHT_SQUARES, DARK_SQUARES, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, ROOK_EMPTY_ATTACKS,
+                       BISHOP_EMPTY_ATTACKS, BETWEEN, rookAttacks, bishopAttacks)
+from Zobrist import PIECE_KEYS, BLACK_TO_MOVE_KEY, CASTLING_KEYS, ENPASSANT_FILE_KEYS, computeKey
+from Evaluation import MIDDLEGAME_TABLES, ENDGAME_TABLES, PIECE_VALUES, PHASE_WEIGHTS, computeTerms
+from MoveCache import MoveCache, DEFAULT_MAX_ENTRIES
+
+'''
+Pieces are indexed color*6 + type, EMPTY marks a square without a piece
+'''
+PIECES = ('wP', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bP', 'bN', 'bB', 'bR', 'bQ', 'bK', '--')
+PIECE_INDEX = {piece: i for i, piece in enumerate(PIECES)}
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+WHITE, BLACK = 0, 1
+EMPTY = 12
+
+'''
+Moves are packed into one int:
+bits 0-5 start square, 6-11 end square, 12-15 flags, 16-19 promoted piece, 20-23 moved piece, 24-27 captured piece.
+Squares are row*8 + col
+'''
+MOVE_ENPASSANT = 1 << 12
+MOVE_CASTLE = 1 << 13
+MOVE_PROMOTION = 1 << 14
+MOVE_DOUBLE_PUSH = 1 << 15
+MOVE_KEY_MASK = 0xFFF | (0xF << 16) # start, end and promoted piece identify a move in a position
+ALL_MOVES, TACTICAL_MOVES, QUIET_MOVES = 0, 1, 2 # move generation stages
+
+'''
+Game status, see GameState.gameStatus
+'''
+ONGOING, CHECKMATE, STALEMATE, INSUFFICIENT_MATERIAL, FIFTY_MOVE_RULE, THREEFOLD_REPETITION = range(6)
+GAME_STATUS_NAMES = ('ongoing', 'checkmate', 'stalemate', 'insufficient material', 'fifty move rule', 'threefold repetition')
+FIFTY_MOVE_PLIES = 100
+
+'''
+Castling rights are 4 bits. A right is lost for good once its king or rook leaves its square
+or the rook is captured there, so every move keeps only the bits both of its squares allow
+'''
+WHITE_KING_SIDE, WHITE_QUEEN_SIDE, BLACK_KING_SIDE, BLACK_QUEEN_SIDE = 1, 2, 4, 8
+ALL_CASTLING_RIGHTS = 15
+CASTLING_RIGHTS_KEPT = [ALL_CASTLING_RIGHTS] * 64
+CASTLING_RIGHTS_KEPT[60] = BLACK_KING_SIDE | BLACK_QUEEN_SIDE # e1
+CASTLING_RIGHTS_KEPT[63] = ALL_CASTLING_RIGHTS & ~WHITE_KING_SIDE # h1
+CASTLING_RIGHTS_KEPT[56] = ALL_CASTLING_RIGHTS & ~WHITE_QUEEN_SIDE # a1
+CASTLING_RIGHTS_KEPT[4] = WHITE_KING_SIDE | WHITE_QUEEN_SIDE # e8
+CASTLING_RIGHTS_KEPT[7] = ALL_CASTLING_RIGHTS & ~BLACK_KING_SIDE # h8
+CASTLING_RIGHTS_KEPT[0] = ALL_CASTLING_RIGHTS & ~BLACK_QUEEN_SIDE # a8
+
+
+def encodeMove(startSq, endSq, pieceMoved, pieceCaptured, flags = 0, promoted = 0):
+    return startSq | (endSq << 6) | flags | (promoted << 16) | (pieceMoved << 20) | (pieceCaptured << 24)
+
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+FEN_PIECES = 'PNBRQKpnbrqk' # same order as PIECES
+FEN_CASTLING = {'K': WHITE_KING_SIDE, 'Q': WHITE_QUEEN_SIDE, 'k': BLACK_KING_SIDE, 'q': BLACK_QUEEN_SIDE}
+
+'''
+Binary position, 32 bytes little endian: occupancy bitboard, one 4 bit piece index per occupied square
+in square order (low nibble first), side to move in bit 0 and castling rights in bits 1-4,
+en passant square (NO_SQUARE when there is none), halfmove clock, fullmove number, 3 padding bytes
+'''
+POSITION_STRUCT = struct.Struct('<Q16sBBBH3x')
+POSITION_BYTES = POSITION_STRUCT.size
+NO_SQUARE = 64
+
 
 class GameState():
     def __init__(self):
@@ -10,110 +78,435 @@ class GameState():
             ["--", "--", "--", "--", "--", "--", "--", "--"],
             ["wP", "wP", "wP", "wP", "wP", "wP", "wP", "wP"],
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
-        self.moveFunctions = { "P": self.addPawnMoves, "R": self.addRockMoves, "B": self.addBishopMoves,
-                               "N": self.addKnightMoves, "Q": self.addQueenMoves, "K": self.addKingMoves }
         self.whiteToMove = True
-        self.moveLog = []
+        self.undoStack = [] # (move code, castling rights, en passant square, halfmove clock, zobrist key) per ply
         self.whiteKingLocation = (7, 4)
         self.blackKingLocation = (0, 4)
         self.checkMate = False
         self.staleMate = False
         self.enpassantPossible = ()
-        self.currentCastlingRights = CastleRights(True, True, True, True)
-        self.castleRightsLog = [self.copyOfCastleRights(self.currentCastlingRights)]
+        self.castlingRights = ALL_CASTLING_RIGHTS
+        self.halfmoveClock = 0 # plies since the last capture or pawn move
+        self.plyOffset = 0 # plies played before the position the game was set up from
+        self.moveCache = None # see enableMoveCache
+        self.syncBitboards()
+
+
+    '''
+    Forsyth-Edwards Notation: fromFen builds a new GameState, loadFen resets this one.
+    The en passant square is kept as written even when no pawn can take.
+    Positions that cannot come up in a game raise ValueError, see checkPosition
+    '''
+    @classmethod
+    def fromFen(cls, fen):
+        gs = cls()
+        gs.loadFen(fen)
+        return gs
+
+
+    def loadFen(self, fen):
+        fields = fen.split()
+        if len(fields) < 2:
+            raise ValueError(f"FEN needs at least piece placement and side to move: {fen!r}")
+        ranks = fields[0].split('/')
+        if len(ranks) != 8:
+            raise ValueError(f"FEN piece placement needs 8 ranks: {fen!r}")
+        board = [['--'] * 8 for _ in range(8)]
+        for r, rank in enumerate(ranks):
+            c = 0
+            for ch in rank:
+                if ch.isdigit():
+                    c += int(ch)
+                elif ch in FEN_PIECES and c < 8:
+                    board[r][c] = PIECES[FEN_PIECES.index(ch)]
+                    c += 1
+                else:
+                    raise ValueError(f"bad FEN rank {rank!r}: {fen!r}")
+            if c != 8:
+                raise ValueError(f"FEN rank {rank!r} does not cover 8 files: {fen!r}")
+        if fields[1] not in ('w', 'b'):
+            raise ValueError(f"bad FEN side to move {fields[1]!r}: {fen!r}")
+
+        castlingRights = 0
+        castling = fields[2] if len(fields) > 2 else '-'
+        if castling != '-':
+            for symbol in castling:
+                if symbol not in FEN_CASTLING:
+                    raise ValueError(f"bad FEN castling rights {castling!r}: {fen!r}")
+                castlingRights |= FEN_CASTLING[symbol]
+        enpassant = fields[3] if len(fields) > 3 else '-'
+        enpassantPossible = ()
+        if enpassant != '-':
+            if len(enpassant) != 2 or enpassant[0] not in Move.filesToCols or enpassant[1] not in ('3', '6'):
+                raise ValueError(f"bad FEN en passant square {enpassant!r}: {fen!r}")
+            enpassantPossible = (Move.ranksToRows[enpassant[1]], Move.filesToCols[enpassant[0]])
+        halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+        fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+
+        self.setPosition(board, fields[1] == 'w', castlingRights, enpassantPossible, halfmoveClock, fullmoveNumber)
+        error = self.checkPosition()
+        if error is not None:
+            raise ValueError(f"{error}: {fen!r}")
+
+
+    '''
+    Why move generation and search cannot work on the position, None when they can: each side needs exactly one king,
+    at most 32 pieces fit the binary encoding, pawns never stand on the first or last rank
+    and the side that just moved cannot have left its king in check
+    '''
+    def checkPosition(self):
+        bitboards = self.pieceBitboards
+        for color, name in ((WHITE, 'white'), (BLACK, 'black')):
+            if bitboards[color*6 + KING].bit_count() != 1:
+                return f"{name} needs exactly one king"
+        if (self.colorBitboards[WHITE] | self.colorBitboards[BLACK]).bit_count() > 32:
+            return "more than 32 pieces"
+        if (bitboards[PAWN] | bitboards[6 + PAWN]) & (ROW_MASKS[0] | ROW_MASKS[7]):
+            return "pawns on the first or last rank"
+        r, c = self.blackKingLocation if self.whiteToMove else self.whiteKingLocation
+        occupied = self.colorBitboards[WHITE] | self.colorBitboards[BLACK]
+        if self.attackersTo(r*8 + c, occupied, WHITE if self.whiteToMove else BLACK):
+            return "the side not to move is in check"
+        return None
+
+
+    def toFen(self):
+        ranks = []
+        for row in self.board:
+            rank = ''
+            empty = 0
+            for piece in row:
+                if piece == '--':
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += FEN_PIECES[PIECE_INDEX[piece]]
+            ranks.append(rank + (str(empty) if empty else ''))
+        castling = ''.join(symbol for symbol, right in FEN_CASTLING.items() if self.castlingRights & right) or '-'
+        enpassant = '-'
+        if self.enpassantPossible != ():
+            enpassant = Move.colsToFiles[self.enpassantPossible[1]] + Move.rowsToRanks[self.enpassantPossible[0]]
+        return f"{'/'.join(ranks)} {'w' if self.whiteToMove else 'b'} {castling} {enpassant} {self.halfmoveClock} {self.fullmoveNumber}"
+
+
+    '''
+    Fixed-width 32 byte encoding, see POSITION_STRUCT. Meant for bulk storage and for passing positions
+    between processes, loadBytes reads straight out of a bytes-like buffer such as an mmap at any offset
+    '''
+    def toBytes(self):
+        occupancy = occupied = self.colorBitboards[WHITE] | self.colorBitboards[BLACK]
+        if occupied.bit_count() > 32:
+            raise ValueError("positions with more than 32 pieces do not fit the binary encoding")
+        pieceAt = [EMPTY] * 64
+        for piece, bitboard in enumerate(self.pieceBitboards):
+            while bitboard:
+                low = bitboard & -bitboard
+                bitboard ^= low
+                pieceAt[low.bit_length() - 1] = piece
+        nibbles = bytearray(16)
+        i = 0
+        while occupied:
+            low = occupied & -occupied
+            occupied ^= low
+            nibbles[i >> 1] |= pieceAt[low.bit_length() - 1] << ((i & 1) * 4)
+            i += 1
+        flags = (WHITE if self.whiteToMove else BLACK) | (self.castlingRights << 1)
+        enpassant = self.enpassantPossible[0]*8 + self.enpassantPossible[1] if self.enpassantPossible != () else NO_SQUARE
+        return POSITION_STRUCT.pack(occupancy, bytes(nibbles), flags,
+                                    enpassant, min(self.halfmoveClock, 255), min(self.fullmoveNumber, 65535))
+
+
+    @classmethod
+    def fromBytes(cls, data, offset = 0):
+        gs = cls()
+        gs.loadBytes(data, offset)
+        return gs
+
+
+    def loadBytes(self, data, offset = 0):
+        occupied, nibbles, flags, enpassant, halfmoveClock, fullmoveNumber = POSITION_STRUCT.unpack_from(data, offset)
+        board = [['--'] * 8 for _ in range(8)]
+        i = 0
+        while occupied:
+            low = occupied & -occupied
+            occupied ^= low
+            sq = low.bit_length() - 1
+            board[sq >> 3][sq & 7] = PIECES[(nibbles[i >> 1] >> ((i & 1) * 4)) & 15]
+            i += 1
+        enpassantPossible = (enpassant >> 3, enpassant & 7) if enpassant < NO_SQUARE else ()
+        self.setPosition(board, flags & 1 == WHITE, (flags >> 1) & ALL_CASTLING_RIGHTS, enpassantPossible,
+                         halfmoveClock, fullmoveNumber)
+
+
+    '''
+    Replaces the whole position and forgets the played moves
+    '''
+    def setPosition(self, board, whiteToMove, castlingRights, enpassantPossible = (), halfmoveClock = 0, fullmoveNumber = 1):
+        self.board = board
+        self.whiteToMove = whiteToMove
+        self.castlingRights = castlingRights
+        self.enpassantPossible = enpassantPossible
+        self.halfmoveClock = halfmoveClock
+        self.plyOffset = 2 * (max(fullmoveNumber, 1) - 1) + (0 if whiteToMove else 1)
+        self.undoStack = []
+        self.checkMate = False
+        self.staleMate = False
+        self.syncBitboards()
+
+
+    @property
+    def fullmoveNumber(self):
+        return (self.plyOffset + len(self.undoStack)) // 2 + 1
+
+
+    '''
+    Rebuilds the bitboards (one per piece, one per color), the zobrist key and the evaluation terms from the board,
+    needed after the board, side to move, castling rights or en passant square are edited directly
+    '''
+    def syncBitboards(self):
+        self.pieceBitboards = [0] * 12
+        self.colorBitboards = [0, 0]
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != '--':
+                    bit = 1 << (r*8 + c)
+                    self.pieceBitboards[PIECE_INDEX[piece]] |= bit
+                    self.colorBitboards[WHITE if piece[0] == 'w' else BLACK] |= bit
+                    if piece == 'wK':
+                        self.whiteKingLocation = (r, c)
+                    elif piece == 'bK':
+                        self.blackKingLocation = (r, c)
+        self.currentZobristKey = computeKey(self)
+        self.material, self.middlegameScore, self.endgameScore, self.phase = computeTerms(self)
+
+
+    '''
+    64-bit key of the position: pieces, side to move, castling rights and a capturable en passant file
+    '''
+    @property
+    def zobristKey(self):
+        return self.currentZobristKey
+
+
+    def enpassantKey(self):
+        if self.enpassantPossible == ():
+            return 0
+        r, c = self.enpassantPossible
+        ally = WHITE if self.whiteToMove else BLACK
+        # only hashed when a pawn of the side to move can take, so otherwise equal positions share a key
+        if PAWN_ATTACKS['b' if ally == WHITE else 'w'][r*8 + c] & self.pieceBitboards[ally*6 + PAWN]:
+            return ENPASSANT_FILE_KEYS[c]
+        return 0
+
+
+    '''
+    Castling rights as an object, for display
+    '''
+    @property
+    def currentCastlingRights(self):
+        rights = self.castlingRights
+        return CastleRights(rights & WHITE_KING_SIDE != 0, rights & BLACK_KING_SIDE != 0,
+                            rights & WHITE_QUEEN_SIDE != 0, rights & BLACK_QUEEN_SIDE != 0)
+
+
+    '''
+    Played moves, rebuilt as Move views from the undo stack
+    '''
+    @property
+    def moveLog(self):
+        return [Move.fromCode(record[0]) for record in self.undoStack]
 
 
     def makeMove(self, move, simulate = False):
-        self.board[move.startRow][move.startCol] = '--'
-        self.board[move.endRow][move.endCol] = move.pieceMoved
-        self.moveLog.append(move)
+        self.makeMoveCode(move.code)
+
+
+    def makeMoveCode(self, code):
+        startSq = code & 63
+        endSq = (code >> 6) & 63
+        moved = (code >> 20) & 15
+        captured = code >> 24
+        startRow, startCol = startSq >> 3, startSq & 7
+        endRow, endCol = endSq >> 3, endSq & 7
+        board = self.board
+        bitboards = self.pieceBitboards
+        colors = self.colorBitboards
+        color = BLACK if moved >= 6 else WHITE
+        fromBit = 1 << startSq
+        toBit = 1 << endSq
+        self.undoStack.append((code, self.castlingRights, self.enpassantPossible, self.halfmoveClock, self.currentZobristKey))
+        key = self.currentZobristKey ^ self.enpassantKey() ^ BLACK_TO_MOVE_KEY
+        movedKeys = PIECE_KEYS[moved]
+
+        board[startRow][startCol] = '--'
+        board[endRow][endCol] = PIECES[moved]
+        bitboards[moved] ^= fromBit | toBit
+        colors[color] ^= fromBit | toBit
+        key ^= movedKeys[startSq] ^ movedKeys[endSq]
         self.whiteToMove = not self.whiteToMove
 
-        # Update king position
-        if move.pieceMoved == 'wK':
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == 'bK':
-            self.blackKingLocation = (move.endRow, move.endCol)
+        # enpassant move
+        if code & MOVE_ENPASSANT:
+            board[startRow][endCol] = '--' # capture pawn
+            capturedBit = 1 << (startRow*8 + endCol)
+            bitboards[captured] ^= capturedBit
+            colors[color ^ 1] ^= capturedBit
+            key ^= PIECE_KEYS[captured][startRow*8 + endCol]
+        elif captured != EMPTY:
+            bitboards[captured] ^= toBit
+            colors[color ^ 1] ^= toBit
+            key ^= PIECE_KEYS[captured][endSq]
 
         # pawn promotion
-        if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0]+'Q'
+        if code & MOVE_PROMOTION:
+            promoted = (code >> 16) & 15
+            board[endRow][endCol] = PIECES[promoted]
+            bitboards[moved] ^= toBit
+            bitboards[promoted] ^= toBit
+            key ^= movedKeys[endSq] ^ PIECE_KEYS[promoted][endSq]
 
-        # enpassant move
-        if move.isEnpassant:
-            self.board[move.startRow][move.endCol] = '--' # capture pawn
+        # Update king position
+        if moved == KING:
+            self.whiteKingLocation = (endRow, endCol)
+        elif moved == 6 + KING:
+            self.blackKingLocation = (endRow, endCol)
 
         # update enpassant possible
-        if move.pieceMoved[1] == 'P' and abs(move.startRow - move.endRow) == 2: # only 2 square pawn advance
-            self.enpassantPossible = ((move.startRow + move.endRow)//2, move.endCol)
+        if code & MOVE_DOUBLE_PUSH: # only 2 square pawn advance
+            self.enpassantPossible = ((startRow + endRow)//2, endCol)
+        else:
+            self.enpassantPossible = ()
+
+        if captured != EMPTY or moved % 6 == PAWN:
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
 
         # castle move
-        if move.isCastle:
-            if move.endCol - move.startCol == 2: # king side castle
-                self.board[move.endRow][move.endCol-1] = self.board[move.endRow][move.endCol+1] # move rook
-                self.board[move.endRow][move.endCol+1] = '--'
+        if code & MOVE_CASTLE:
+            rookKeys = PIECE_KEYS[color*6 + ROOK]
+            if endCol - startCol == 2: # king side castle
+                board[endRow][endCol-1] = board[endRow][endCol+1] # move rook
+                board[endRow][endCol+1] = '--'
+                rookBits = (toBit << 1) | (toBit >> 1)
+                key ^= rookKeys[endSq + 1] ^ rookKeys[endSq - 1]
             else: # queen side castle
-                self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 2]  # move rook
-                self.board[move.endRow][move.endCol - 2] = '--'
+                board[endRow][endCol + 1] = board[endRow][endCol - 2]  # move rook
+                board[endRow][endCol - 2] = '--'
+                rookBits = (toBit >> 2) | (toBit << 1)
+                key ^= rookKeys[endSq - 2] ^ rookKeys[endSq + 1]
+            bitboards[color*6 + ROOK] ^= rookBits
+            colors[color] ^= rookBits
 
         # update castling rights, when rook or king moves
-        self.updateCastleRights(move)
-        self.castleRightsLog.append(self.copyOfCastleRights(self.currentCastlingRights))
-
-
-    def updateCastleRights(self, move):
-        if move.pieceMoved == 'wK':
-            self.currentCastlingRights.wks = False
-            self.currentCastlingRights.wqs = False
-        elif move.pieceMoved == 'bK':
-            self.currentCastlingRights.bks = False
-            self.currentCastlingRights.bqs = False
-        elif move.pieceMoved == 'wR': # white rook
-            if move.startRow == 7:
-                if move.startCol == 0: # left rook
-                    self.currentCastlingRights.wqs = False
-                elif move.startCol == 7: # right rook
-                    self.currentCastlingRights.wks = False
-        elif move.pieceMoved == 'bR': # black rook
-            if move.startRow == 0:
-                if move.startCol == 0:  # left rook
-                    self.currentCastlingRights.bqs = False
-                elif move.startCol == 7:  # right rook
-                    self.currentCastlingRights.bks = False
+        rights = self.castlingRights & CASTLING_RIGHTS_KEPT[startSq] & CASTLING_RIGHTS_KEPT[endSq]
+        if rights != self.castlingRights:
+            key ^= CASTLING_KEYS[self.castlingRights] ^ CASTLING_KEYS[rights]
+            self.castlingRights = rights
 
+        self.currentZobristKey = key ^ self.enpassantKey()
+        self.updateEvaluationTerms(code, 1)
 
-    def undoMove(self):
-        if len(self.moveLog) > 0:
-            move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
-            self.whiteToMove = not self.whiteToMove
 
-            if move.pieceMoved == 'wK':
-                self.whiteKingLocation = (move.startRow, move.startCol)
-            elif move.pieceMoved == 'bK':
-                self.blackKingLocation = (move.startRow, move.startCol)
+    '''
+    Applies the evaluation deltas of a move, sign 1 when it is made and -1 when it is taken back
+    '''
+    def updateEvaluationTerms(self, code, sign):
+        startSq = code & 63
+        endSq = (code >> 6) & 63
+        moved = (code >> 20) & 15
+        captured = code >> 24
+        middlegame = MIDDLEGAME_TABLES[moved][endSq] - MIDDLEGAME_TABLES[moved][startSq]
+        endgame = ENDGAME_TABLES[moved][endSq] - ENDGAME_TABLES[moved][startSq]
+
+        if captured != EMPTY:
+            capturedSq = (startSq & ~7) | (endSq & 7) if code & MOVE_ENPASSANT else endSq
+            middlegame -= MIDDLEGAME_TABLES[captured][capturedSq]
+            endgame -= ENDGAME_TABLES[captured][capturedSq]
+            self.material[captured // 6] -= sign * PIECE_VALUES[captured % 6]
+            self.phase -= sign * PHASE_WEIGHTS[captured % 6]
+
+        if code & MOVE_PROMOTION:
+            promoted = (code >> 16) & 15
+            middlegame += MIDDLEGAME_TABLES[promoted][endSq] - MIDDLEGAME_TABLES[moved][endSq]
+            endgame += ENDGAME_TABLES[promoted][endSq] - ENDGAME_TABLES[moved][endSq]
+            self.material[moved // 6] += sign * (PIECE_VALUES[promoted % 6] - PIECE_VALUES[PAWN])
+            self.phase += sign * PHASE_WEIGHTS[promoted % 6]
+        elif code & MOVE_CASTLE:
+            rook = (moved // 6)*6 + ROOK
+            if endSq > startSq: # king side castle
+                rookStart, rookEnd = endSq + 1, endSq - 1
+            else:
+                rookStart, rookEnd = endSq - 2, endSq + 1
+            middlegame += MIDDLEGAME_TABLES[rook][rookEnd] - MIDDLEGAME_TABLES[rook][rookStart]
+            endgame += ENDGAME_TABLES[rook][rookEnd] - ENDGAME_TABLES[rook][rookStart]
+
+        self.middlegameScore += sign * middlegame
+        self.endgameScore += sign * endgame
 
-            if move.isEnpassant:
-                self.board[move.endRow][move.endCol] = '--'
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
-                self.enpassantPossible = (move.endRow, move.endCol)
 
-            if move.pieceMoved[1] == 'P' and abs(move.startRow - move.endRow) == 2:  # only 2 square pawn advance
-                self.enpassantPossible = ()
+    '''
+    Takes back the last move in O(1), restoring the irreversible state from its undo record
+    '''
+    def undoMove(self):
+        if len(self.undoStack) > 0:
+            code, self.castlingRights, self.enpassantPossible, self.halfmoveClock, self.currentZobristKey = self.undoStack.pop()
+            startSq = code & 63
+            endSq = (code >> 6) & 63
+            moved = (code >> 20) & 15
+            captured = code >> 24
+            startRow, startCol = startSq >> 3, startSq & 7
+            endRow, endCol = endSq >> 3, endSq & 7
+            board = self.board
+            bitboards = self.pieceBitboards
+            colors = self.colorBitboards
+            color = BLACK if moved >= 6 else WHITE
+            fromBit = 1 << startSq
+            toBit = 1 << endSq
+
+            board[startRow][startCol] = PIECES[moved]
+            board[endRow][endCol] = PIECES[captured]
+            self.whiteToMove = not self.whiteToMove
 
-            # undo castling rights
-            self.castleRightsLog.pop()
-            self.currentCastlingRights = self.copyOfCastleRights(self.castleRightsLog[-1])
+            if code & MOVE_PROMOTION:
+                promoted = (code >> 16) & 15
+                bitboards[promoted] ^= toBit
+                bitboards[moved] ^= toBit
+            bitboards[moved] ^= fromBit | toBit
+            colors[color] ^= fromBit | toBit
+
+            if code & MOVE_ENPASSANT:
+                board[endRow][endCol] = '--'
+                board[startRow][endCol] = PIECES[captured]
+                capturedBit = 1 << (startRow*8 + endCol)
+                bitboards[captured] ^= capturedBit
+                colors[color ^ 1] ^= capturedBit
+            elif captured != EMPTY:
+                bitboards[captured] ^= toBit
+                colors[color ^ 1] ^= toBit
+
+            if moved == KING:
+                self.whiteKingLocation = (startRow, startCol)
+            elif moved == 6 + KING:
+                self.blackKingLocation = (startRow, startCol)
+
+            self.updateEvaluationTerms(code, -1)
 
             # undo castle move
-            if move.isCastle:
-                if move.endCol - move.startCol == 2:  # king side castle
-                    self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 1]  # move rook
-                    self.board[move.endRow][move.endCol - 1] = '--'
+            if code & MOVE_CASTLE:
+                if endCol - startCol == 2:  # king side castle
+                    board[endRow][endCol + 1] = board[endRow][endCol - 1]  # move rook
+                    board[endRow][endCol - 1] = '--'
+                    rookBits = (toBit << 1) | (toBit >> 1)
                 else:  # queen side castle
-                    self.board[move.endRow][move.endCol - 2] = self.board[move.endRow][move.endCol + 1]  # move rook
-                    self.board[move.endRow][move.endCol + 1] = '--'
+                    board[endRow][endCol - 2] = board[endRow][endCol + 1]  # move rook
+                    board[endRow][endCol + 1] = '--'
+                    rookBits = (toBit >> 2) | (toBit << 1)
+                bitboards[color*6 + ROOK] ^= rookBits
+                colors[color] ^= rookBits
 
             self.checkMate = False
             self.staleMate = False
@@ -122,220 +515,409 @@ class GameState():
     All moves considering checks
     '''
     def getValidMoves(self):
-        tmpEnpassantPossible = self.enpassantPossible
-        tmpCastlingRights = self.copyOfCastleRights(self.currentCastlingRights)
-        moves = self.getPossibleMoves()
-        if self.whiteToMove:
-            self.addCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
-        else:
-            self.addCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
+        cache = self.moveCache
+        if cache is None:
+            return [Move.fromCode(code) for code in self.getValidMoveCodes()]
+        entry = cache.get(self.currentZobristKey)
+        if entry is None:
+            codes = self.getValidMoveCodes()
+            noMoves = len(codes) == 0
+            inCheck = noMoves and self.isInCheck()
+            entry = cache.put(self.currentZobristKey, tuple(Move.fromCode(code) for code in codes), inCheck, noMoves and not inCheck)
+        elif entry.checkMate:
+            self.checkMate = True
+        elif entry.staleMate:
+            self.staleMate = True
+        return list(entry.moves)
 
-        for i in range(len(moves) - 1, -1, -1):
-            self.makeMove(moves[i], simulate=True)
-            self.whiteToMove = not self.whiteToMove
-            if self.isInCheck():
-                moves.remove(moves[i])
 
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove()
+    '''
+    Opt-in LRU cache in front of getValidMoves, worth it when the same positions come back (undo, transpositions)
+    '''
+    def enableMoveCache(self, maxEntries = DEFAULT_MAX_ENTRIES):
+        self.moveCache = MoveCache(maxEntries)
+        return self.moveCache
+
+
+    def disableMoveCache(self):
+        self.moveCache = None
+
+
+    '''
+    Legal moves as packed ints, appended to moves after clearing it so callers can reuse one buffer per ply.
+    stage picks all moves, only tactical ones (captures, en passant, promotions) or only the quiet rest,
+    so a search can stop before generating quiet moves; only ALL_MOVES sets the check mate and stale mate flags
+    '''
+    def getValidMoveCodes(self, moves = None, stage = ALL_MOVES):
+        if moves is None:
+            moves = array('I')
+        else:
+            del moves[:]
+        ally = WHITE if self.whiteToMove else BLACK
+        enemy = ally ^ 1
+        kingSq = self.pieceBitboards[ally*6 + KING].bit_length() - 1
+        occupied = self.colorBitboards[WHITE] | self.colorBitboards[BLACK]
+        checkers = self.attackersTo(kingSq, occupied, enemy)
+
+        if stage == ALL_MOVES:
+            stageMask = FULL
+        elif stage == TACTICAL_MOVES:
+            stageMask = self.colorBitboards[enemy]
+        else:
+            stageMask = ~occupied & FULL
+        self.addKingMoves(kingSq, moves, True, stageMask)
+        if checkers & (checkers - 1) == 0: # double check, only king can move
+            if checkers:
+                checkMask = BETWEEN[kingSq][checkers.bit_length() - 1] | checkers
+            else:
+                checkMask = FULL
+                if stage != TACTICAL_MOVES:
+                    self.addCastleMoves(kingSq >> 3, kingSq & 7, moves)
+            self.addPieceMoves(moves, checkMask, self.getPinnedPieces(kingSq, occupied, ally, enemy), stage)
 
-        if len(moves) == 0: # check mate or stale mate
-            if self.isInCheck(): # check mate
+        if stage == ALL_MOVES and len(moves) == 0: # check mate or stale mate
+            if checkers: # check mate
                 self.checkMate = True
             else:
                 self.staleMate = True
 
-        self.enpassantPossible = tmpEnpassantPossible
-        self.currentCastlingRights = tmpCastlingRights
         return moves
 
 
-    def isInCheck(self):
-        if self.whiteToMove:
-            return self.isSquareUnderAttack(self.whiteKingLocation[0], self.whiteKingLocation[1])
-        else:
-            return self.isSquareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
-
-
-    def isSquareUnderAttack(self, r, c):
-        self.whiteToMove = not self.whiteToMove
-        oppMoves = self.getPossibleMoves()
-        self.whiteToMove = not self.whiteToMove
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c:
+    '''
+    Whether the side to move has a legal move, stopping at the first one found.
+    Castling is left out: when it is legal so is the king's step towards the rook
+    '''
+    def hasLegalMove(self):
+        ally = WHITE if self.whiteToMove else BLACK
+        enemy = ally ^ 1
+        bitboards = self.pieceBitboards
+        allies = self.colorBitboards[ally]
+        occupied = allies | self.colorBitboards[enemy]
+        kingSq = bitboards[ally*6 + KING].bit_length() - 1
+        occupiedWithoutKing = occupied ^ (1 << kingSq)
+        targets = KING_ATTACKS[kingSq] & ~allies
+        while targets:
+            target = targets & -targets
+            targets ^= target
+            if not self.attackersTo(target.bit_length() - 1, occupiedWithoutKing, enemy):
                 return True
 
-        return False
+        checkers = self.attackersTo(kingSq, occupied, enemy)
+        if checkers & (checkers - 1): # double check, only king can move
+            return False
+        checkMask = BETWEEN[kingSq][checkers.bit_length() - 1] | checkers if checkers else FULL
+        pinned = self.getPinnedPieces(kingSq, occupied, ally, enemy)
+        targetMask = ~allies & checkMask
+        for pieceType in (KNIGHT, BISHOP, ROOK, QUEEN):
+            pieces = bitboards[ally*6 + pieceType]
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                sq = low.bit_length() - 1
+                if pieceType == KNIGHT:
+                    targets = KNIGHT_ATTACKS[sq]
+                elif pieceType == BISHOP:
+                    targets = bishopAttacks(sq, occupied)
+                elif pieceType == ROOK:
+                    targets = rookAttacks(sq, occupied)
+                else:
+                    targets = bishopAttacks(sq, occupied) | rookAttacks(sq, occupied)
+                targets &= targetMask
+                if sq in pinned:
+                    targets &= pinned[sq]
+                if targets:
+                    return True
+
+        moves = array('I')
+        self.addPawnMoves(moves, checkMask, pinned, ally, occupied)
+        return len(moves) > 0
+
 
     '''
-    All moves without considering checks
+    Whether the position already stood times - 1 times on the board with the same side to move.
+    Only the plies since the last capture or pawn move can repeat it, so the keys kept in the undo stack
+    are scanned back no further than the halfmove clock
     '''
-    def getPossibleMoves(self):
-        moves = []
-        for r in range(len(self.board)):
-            for c in range(len(self.board[r])):
-                turn = self.board[r][c][0]
-                if (turn == 'w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):
-                    piece = self.board[r][c][1]
-                    self.moveFunctions[piece](r, c, moves)
+    def isRepetition(self, times = 3):
+        key = self.currentZobristKey
+        stack = self.undoStack
+        oldest = max(len(stack) - self.halfmoveClock, 0)
+        count = 1
+        for index in range(len(stack) - 4, oldest - 1, -2): # a position cannot come back in fewer than 4 plies
+            if stack[index][4] == key:
+                count += 1
+                if count >= times:
+                    return True
+        return False
 
-        return moves
 
+    '''
+    Neither side can mate: bare kings, a single minor piece, or only bishops all on squares of one color
+    '''
+    def isInsufficientMaterial(self):
+        bitboards = self.pieceBitboards
+        if bitboards[PAWN] | bitboards[ROOK] | bitboards[QUEEN] | \
+                bitboards[6 + PAWN] | bitboards[6 + ROOK] | bitboards[6 + QUEEN]:
+            return False
+        knights = bitboards[KNIGHT] | bitboards[6 + KNIGHT]
+        bishops = bitboards[BISHOP] | bitboards[6 + BISHOP]
+        minors = knights | bishops
+        if minors & (minors - 1) == 0:
+            return True
+        return knights == 0 and (bishops & LIGHT_SQUARES == 0 or bishops & DARK_SQUARES == 0)
 
-    def addPawnMoves(self, r, c, moves):
-        if self.whiteToMove: # moving white pawns
-            if self.board[r-1][c] == '--': # 1 square pawn advance
-                moves.append(Move((r, c),(r-1, c), self.board))
-                if r == 6 and self.board[r-2][c] == '--': # 2 square pawn advance
-                    moves.append(Move((r, c),(r-2, c), self.board))
-            if c-1 >= 0:
-                if self.board[r-1][c-1][0] == 'b': # black piece to capture
-                    moves.append(Move((r, c), (r-1, c-1), self.board))
-                elif (r-1, c-1) == self.enpassantPossible and self.board[r][c-1][0] == 'b':
-                    moves.append(Move((r, c), (r-1, c-1), self.board, isEnpassantMove=True))
-
-            if c + 1 <= 7:
-                if self.board[r - 1][c + 1][0] == 'b':  # black piece to capture
-                    moves.append(Move((r, c), (r-1, c+1), self.board))
-                elif (r - 1, c + 1) == self.enpassantPossible and self.board[r][c+1][0] == 'b':
-                    moves.append(Move((r, c), (r - 1, c + 1), self.board, isEnpassantMove=True))
-
-        else: # moving black pawns
-            if self.board[r + 1][c] == '--':  # 1 square pawn advance
-                moves.append(Move((r, c), (r+1, c), self.board))
-                if r == 1 and self.board[r+2][c] == '--':  # 2 square pawn advance
-                    moves.append(Move((r, c), (r+2, c), self.board))
-            if c - 1 >= 0:
-                if self.board[r + 1][c - 1][0] == 'w':  # white piece to capture
-                    moves.append(Move((r, c), (r + 1, c - 1), self.board))
-                elif (r + 1, c - 1) == self.enpassantPossible and self.board[r][c-1][0] == 'w':
-                    moves.append(Move((r, c), (r + 1, c - 1), self.board, isEnpassantMove=True))
-            if c + 1 <= 7:
-                if self.board[r + 1][c + 1][0] == 'w':  # white piece to capture
-                    moves.append(Move((r, c), (r + 1, c + 1), self.board))
-                elif (r + 1, c + 1) == self.enpassantPossible and self.board[r][c+1][0] == 'w':
-                    moves.append(Move((r, c), (r + 1, c + 1), self.board, isEnpassantMove=True))
-
-
-    def addRockMoves(self, r, c, moves):
-        self.addMovesVertical(r, c, moves, r-1, -1)  # move up
-        self.addMovesVertical(r, c, moves, r+1, 1)  # move down
-        self.addMovesHorizontal(r, c, moves, c-1, -1)  # move left
-        self.addMovesHorizontal(r, c, moves, c+1, 1)  # move right
-
-
-    def addMovesVertical(self, r, c, moves, startIndex, direction):
-        if direction == 1:
-            endIndex = 8
-        else:
-            endIndex = -1
 
-        for ri in range(startIndex, endIndex, direction):
-            doContinue = self.addMove(r, c, moves, ri, c)
-            if not doContinue:
-                break
+    '''
+    One of the game status constants, without generating the move list.
+    A mate on the move that completes the fifty moves still counts as a mate.
+    Sets the check mate and stale mate flags like getValidMoveCodes does
+    '''
+    def gameStatus(self):
+        if not self.hasLegalMove():
+            if self.isInCheck():
+                self.checkMate = True
+                return CHECKMATE
+            self.staleMate = True
+            return STALEMATE
+        if self.isInsufficientMaterial():
+            return INSUFFICIENT_MATERIAL
+        if self.halfmoveClock >= FIFTY_MOVE_PLIES:
+            return FIFTY_MOVE_RULE
+        if self.isRepetition(3):
+            return THREEFOLD_REPETITION
+        return ONGOING
 
 
-    def addMovesHorizontal(self, r, c, moves, startIndex, direction):
-        if direction == 1:
-            endIndex = 8
-        else:
-            endIndex = -1
+    '''
+    Draw by any rule but stale mate, cheap enough to ask at every search node.
+    Search passes repetitions=2, the side that repeated once can repeat again.
+    Like gameStatus, a mate on the move that completes the fifty moves is no draw
+    '''
+    def isDrawByRule(self, repetitions = 3):
+        if self.halfmoveClock >= FIFTY_MOVE_PLIES and (not self.isInCheck() or self.hasLegalMove()):
+            return True
+        return self.isRepetition(repetitions) or self.isInsufficientMaterial()
 
-        for ci in range(startIndex, endIndex, direction):
-            doContinue = self.addMove(r, c, moves, r, ci)
-            if not doContinue:
-                break
 
+    '''
+    Copy that keeps the played moves, so repetitions are still seen; undoing past the copy point works too
+    '''
+    def copy(self):
+        gs = type(self).fromBytes(self.toBytes())
+        gs.halfmoveClock = self.halfmoveClock
+        gs.plyOffset = self.plyOffset
+        gs.undoStack = list(self.undoStack)
+        return gs
 
-    def addBishopMoves(self, r, c, moves):
-        self.addDiagonalMoves(r, c, moves, 1, 1)
-        self.addDiagonalMoves(r, c, moves, 1, -1)
-        self.addDiagonalMoves(r, c, moves, -1, -1)
-        self.addDiagonalMoves(r, c, moves, -1, 1)
 
+    '''
+    Pieces of the side to move shielding its king from an enemy slider, mapped to the squares they may still move to
+    '''
+    def getPinnedPieces(self, kingSq, occupied, ally, enemy):
+        bitboards = self.pieceBitboards
+        queens = bitboards[enemy*6 + QUEEN]
+        snipers = (ROOK_EMPTY_ATTACKS[kingSq] & (bitboards[enemy*6 + ROOK] | queens)) | \
+                  (BISHOP_EMPTY_ATTACKS[kingSq] & (bitboards[enemy*6 + BISHOP] | queens))
+        pinned = {}
+        allies = self.colorBitboards[ally]
+        while snipers:
+            sniper = snipers & -snipers
+            snipers ^= sniper
+            sniperSq = sniper.bit_length() - 1
+            blockers = BETWEEN[kingSq][sniperSq] & occupied
+            if blockers and blockers & (blockers - 1) == 0 and blockers & allies:
+                pinned[blockers.bit_length() - 1] = BETWEEN[kingSq][sniperSq] | sniper
+        return pinned
+
+
+    def attackersTo(self, sq, occupied, enemy):
+        bitboards = self.pieceBitboards
+        offset = enemy*6
+        queens = bitboards[offset + QUEEN]
+        return (KNIGHT_ATTACKS[sq] & bitboards[offset + KNIGHT]) | \
+               (PAWN_ATTACKS['b' if enemy == WHITE else 'w'][sq] & bitboards[offset + PAWN]) | \
+               (KING_ATTACKS[sq] & bitboards[offset + KING]) | \
+               (rookAttacks(sq, occupied) & (bitboards[offset + ROOK] | queens)) | \
+               (bishopAttacks(sq, occupied) & (bitboards[offset + BISHOP] | queens))
 
-    def addDiagonalMoves(self, r, c, moves, vDir, hDir):
-        if hDir == 1:
-            hEndIndex = 8
-        else:
-            hEndIndex = -1
 
-        if vDir == 1:
-            vEndIndex = 8
+    def isInCheck(self):
+        if self.whiteToMove:
+            return self.isSquareUnderAttack(self.whiteKingLocation[0], self.whiteKingLocation[1])
         else:
-            vEndIndex = -1
-
-        ri = r + vDir
-        ci = c + hDir
-
-        while ri != vEndIndex and ci != hEndIndex:
-            doContinue = self.addMove(r, c, moves, ri, ci)
-            if not doContinue:
-                break
+            return self.isSquareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
 
-            ri += vDir
-            ci += hDir
 
+    '''
+    Whether the opponent of the side to move attacks the square
+    '''
+    def isSquareUnderAttack(self, r, c):
+        occupied = self.colorBitboards[WHITE] | self.colorBitboards[BLACK]
+        return self.attackersTo(r*8 + c, occupied, BLACK if self.whiteToMove else WHITE) != 0
 
-    def addKnightMoves(self, r, c, moves):
-        knightMoves = [(1, -2), (2, -1), (2, 1), (1, 2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]
-        for knightMove in knightMoves:
-            self.addMove(r, c, moves, r + knightMove[0], c + knightMove[1])
+    '''
+    All moves without considering checks
+    '''
+    def getPossibleMoves(self):
+        moves = array('I')
+        self.addPieceMoves(moves, FULL, {})
+        ally = WHITE if self.whiteToMove else BLACK
+        self.addKingMoves(self.pieceBitboards[ally*6 + KING].bit_length() - 1, moves, False)
+        return [Move.fromCode(code) for code in moves]
 
 
-    def addQueenMoves(self, r, c, moves):
-        self.addBishopMoves(r, c, moves)
-        self.addRockMoves(r, c, moves)
+    '''
+    Moves of every piece but the king, restricted to checkMask and, for pinned pieces, to their pin line
+    '''
+    def addPieceMoves(self, moves, checkMask, pinned, stage = ALL_MOVES):
+        ally = WHITE if self.whiteToMove else BLACK
+        bitboards = self.pieceBitboards
+        allies = self.colorBitboards[ally]
+        occupied = allies | self.colorBitboards[ally ^ 1]
+        targetMask = ~allies & checkMask
+        if stage == TACTICAL_MOVES:
+            targetMask &= self.colorBitboards[ally ^ 1]
+        elif stage == QUIET_MOVES:
+            targetMask &= ~occupied
+        board = self.board
+        append = moves.append
+
+        for pieceType in (KNIGHT, BISHOP, ROOK, QUEEN):
+            moved = ally*6 + pieceType
+            pieces = bitboards[moved]
+            movedBits = moved << 20
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                sq = low.bit_length() - 1
+                if pieceType == KNIGHT:
+                    targets = KNIGHT_ATTACKS[sq]
+                elif pieceType == BISHOP:
+                    targets = bishopAttacks(sq, occupied)
+                elif pieceType == ROOK:
+                    targets = rookAttacks(sq, occupied)
+                else:
+                    targets = bishopAttacks(sq, occupied) | rookAttacks(sq, occupied)
+                targets &= targetMask
+                if sq in pinned:
+                    targets &= pinned[sq]
+                base = sq | movedBits
+                while targets:
+                    target = targets & -targets
+                    targets ^= target
+                    endSq = target.bit_length() - 1
+                    append(base | (endSq << 6) | (PIECE_INDEX[board[endSq >> 3][endSq & 7]] << 24))
+
+        self.addPawnMoves(moves, checkMask, pinned, ally, occupied, stage)
+
+
+    def addPawnMoves(self, moves, checkMask, pinned, ally, occupied, stage = ALL_MOVES):
+        board = self.board
+        append = moves.append
+        moved = ally*6 + PAWN
+        pawns = self.pieceBitboards[moved]
+        enemies = self.colorBitboards[ally ^ 1]
+        empty = ~occupied & FULL
+        if ally == WHITE:
+            attacks, forward, startRow, promotionRow = PAWN_ATTACKS['w'], -8, ROW_MASKS[6], ROW_MASKS[0]
+        else:
+            attacks, forward, startRow, promotionRow = PAWN_ATTACKS['b'], 8, ROW_MASKS[1], ROW_MASKS[7]
+        promotions = [(ally*6 + piece) << 16 for piece in (QUEEN, ROOK, BISHOP, KNIGHT)]
+        enpassantBit = 0
+        if self.enpassantPossible != ():
+            enpassantBit = 1 << (self.enpassantPossible[0]*8 + self.enpassantPossible[1])
+        if stage == TACTICAL_MOVES: # captures and pushes that promote
+            checkMask &= enemies | promotionRow
+        elif stage == QUIET_MOVES:
+            checkMask &= empty & ~promotionRow
+            enpassantBit = 0
+
+        while pawns:
+            low = pawns & -pawns
+            pawns ^= low
+            sq = low.bit_length() - 1
+            pushBit = 1 << (sq + forward)
+            targets = 0
+            if pushBit & empty:
+                targets = pushBit
+                if low & startRow:
+                    doubleBit = 1 << (sq + 2*forward)
+                    if doubleBit & empty:
+                        targets |= doubleBit
+            targets |= attacks[sq] & enemies
+            targets &= checkMask
+            if sq in pinned:
+                targets &= pinned[sq]
+            base = sq | (moved << 20)
+            while targets:
+                target = targets & -targets
+                targets ^= target
+                endSq = target.bit_length() - 1
+                code = base | (endSq << 6) | (PIECE_INDEX[board[endSq >> 3][endSq & 7]] << 24)
+                if target & promotionRow:
+                    for promoted in promotions:
+                        append(code | MOVE_PROMOTION | promoted)
+                elif endSq - sq == 2*forward:
+                    append(code | MOVE_DOUBLE_PUSH)
+                else:
+                    append(code)
+
+            if attacks[sq] & enpassantBit and self.isLegalEnpassant(sq, enpassantBit, occupied, ally):
+                endSq = enpassantBit.bit_length() - 1
+                append(base | (endSq << 6) | MOVE_ENPASSANT | (((ally ^ 1)*6 + PAWN) << 24))
 
 
-    def addKingMoves(self, r, c, moves):
-        kingMoves = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
-        for kingMove in kingMoves:
-            self.addMove(r, c, moves, r + kingMove[0], c + kingMove[1])
+    '''
+    En passant removes two pieces from the same row, so it is checked against the board after the capture
+    '''
+    def isLegalEnpassant(self, sq, enpassantBit, occupied, ally):
+        capturedBit = 1 << (sq - sq % 8 + self.enpassantPossible[1])
+        occupiedAfter = (occupied ^ (1 << sq) ^ capturedBit) | enpassantBit
+        bitboards = self.pieceBitboards
+        kingSq = bitboards[ally*6 + KING].bit_length() - 1
+        offset = (ally ^ 1)*6
+        queens = bitboards[offset + QUEEN]
+        return not ((KNIGHT_ATTACKS[kingSq] & bitboards[offset + KNIGHT]) or
+                    (PAWN_ATTACKS['w' if ally == WHITE else 'b'][kingSq] & bitboards[offset + PAWN] & ~capturedBit) or
+                    (rookAttacks(kingSq, occupiedAfter) & (bitboards[offset + ROOK] | queens)) or
+                    (bishopAttacks(kingSq, occupiedAfter) & (bitboards[offset + BISHOP] | queens)))
+
+
+    def addKingMoves(self, kingSq, moves, legalOnly, stageMask = FULL):
+        ally = WHITE if self.whiteToMove else BLACK
+        targets = KING_ATTACKS[kingSq] & ~self.colorBitboards[ally] & stageMask
+        # the king does not block attacks along the line it moves away on
+        occupiedWithoutKing = (self.colorBitboards[WHITE] | self.colorBitboards[BLACK]) ^ (1 << kingSq)
+        board = self.board
+        base = kingSq | ((ally*6 + KING) << 20)
+        while targets:
+            target = targets & -targets
+            targets ^= target
+            endSq = target.bit_length() - 1
+            if not legalOnly or not self.attackersTo(endSq, occupiedWithoutKing, ally ^ 1):
+                moves.append(base | (endSq << 6) | (PIECE_INDEX[board[endSq >> 3][endSq & 7]] << 24))
 
 
     def addCastleMoves(self, r, c, moves):
         if self.isSquareUnderAttack(r, c): # cannot castle in check
             return
-        if (self.whiteToMove and self.currentCastlingRights.wks) or (not self.whiteToMove and self.currentCastlingRights.bks):
+        if self.castlingRights & (WHITE_KING_SIDE if self.whiteToMove else BLACK_KING_SIDE):
             self.addKingSideCastleMoves(r, c, moves)
-        if (self.whiteToMove and self.currentCastlingRights.wqs) or (not self.whiteToMove and self.currentCastlingRights.bqs):
+        if self.castlingRights & (WHITE_QUEEN_SIDE if self.whiteToMove else BLACK_QUEEN_SIDE):
             self.addQueenSideCastleMoves(r, c, moves)
 
 
     def addKingSideCastleMoves(self, r, c, moves):
         if self.board[r][c+1] == '--' and self.board[r][c+2] == '--':
             if not self.isSquareUnderAttack(r, c+1) and not self.isSquareUnderAttack(r, c+2):
-                moves.append(Move((r,c), (r, c+2), self.board, isCastle=True))
+                moves.append(encodeMove(r*8 + c, r*8 + c + 2, PIECE_INDEX[self.board[r][c]], EMPTY, MOVE_CASTLE))
 
 
     def addQueenSideCastleMoves(self, r, c, moves):
         if self.board[r][c-1] == '--' and self.board[r][c-2] == '--' and self.board[r][c-3] == '--':
             if not self.isSquareUnderAttack(r, c-1) and not self.isSquareUnderAttack(r, c-2):
-                moves.append(Move((r,c), (r, c-2), self.board, isCastle=True))
-
-
-    def addMove(self, r, c, moves, ri, ci):
-        if ri < 0 or ri > 7 or ci < 0 or ci > 7: # move out of the board
-            return True
-
-        squareToMove = self.board[ri][ci]
-        if squareToMove == '--':
-            moves.append(Move((r, c), (ri, ci), self.board))
-        elif self.whiteToMove:
-            if squareToMove[0] == 'b':
-                moves.append(Move((r, c), (ri, ci), self.board))
-            return False
-        elif not self.whiteToMove:
-            if squareToMove[0] == 'w':
-                moves.append(Move((r, c), (ri, ci), self.board))
-            return False
-        return True
-
-
-    def copyOfCastleRights(self, castleRights):
-        return CastleRights(castleRights.wks,castleRights.bks,castleRights.wqs,castleRights.bqs)
+                moves.append(encodeMove(r*8 + c, r*8 + c - 2, PIECE_INDEX[self.board[r][c]], EMPTY, MOVE_CASTLE))
 
 
 class CastleRights():
@@ -354,7 +936,11 @@ class CastleRights():
 
 
 
+'''
+View over a packed move code, every attribute is decoded on access
+'''
 class Move():
+    __slots__ = ('code',)
     ranksToRows = {
         "1": 7, "2": 6, "3": 5, "4": 4,
         "5": 3, "6": 2, "7": 1, "8": 0
@@ -366,29 +952,98 @@ class Move():
     }
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
-    def __init__(self, startSq, endSq, board, isEnpassantMove = False, isCastle = False):
-        self.startRow = startSq[0]
-        self.startCol = startSq[1]
-        self.endRow = endSq[0]
-        self.endCol = endSq[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
-        self.moveHashcode = self.startRow*1000 + self.startCol*100 + self.endRow*10 + self.endCol
-        self.isPawnPromotion = (self.pieceMoved == 'wP' and self.endRow == 0) or (self.pieceMoved == 'bP' and self.endRow == 7)
-        self.isEnpassant = isEnpassantMove
+    def __init__(self, startSq, endSq, board, isEnpassantMove = False, isCastle = False, promotionPiece = 'Q'):
+        pieceMoved = board[startSq[0]][startSq[1]]
+        pieceCaptured = board[endSq[0]][endSq[1]]
+        flags = 0
+        promoted = 0
+        if isEnpassantMove:
+            flags |= MOVE_ENPASSANT
+            pieceCaptured = 'wP' if pieceMoved == 'bP' else 'bP'
+        if isCastle:
+            flags |= MOVE_CASTLE
+        if pieceMoved[1] == 'P':
+            if endSq[0] == 0 or endSq[0] == 7:
+                flags |= MOVE_PROMOTION
+                promoted = PIECE_INDEX[pieceMoved[0] + promotionPiece]
+            elif abs(startSq[0] - endSq[0]) == 2:
+                flags |= MOVE_DOUBLE_PUSH
+        self.code = encodeMove(startSq[0]*8 + startSq[1], endSq[0]*8 + endSq[1], PIECE_INDEX[pieceMoved],
+                               PIECE_INDEX[pieceCaptured], flags, promoted)
+
+
+    @classmethod
+    def fromCode(cls, code):
+        move = cls.__new__(cls)
+        move.code = code
+        return move
+
+
+    @property
+    def startRow(self):
+        return (self.code >> 3) & 7
+
+
+    @property
+    def startCol(self):
+        return self.code & 7
 
-        if self.isEnpassant:
-            self.pieceCaptured = 'wP' if self.pieceMoved == 'bP' else 'bP'
 
-        self.isCastle = isCastle
+    @property
+    def endRow(self):
+        return (self.code >> 9) & 7
+
+
+    @property
+    def endCol(self):
+        return (self.code >> 6) & 7
+
+
+    @property
+    def pieceMoved(self):
+        return PIECES[(self.code >> 20) & 15]
+
+
+    @property
+    def pieceCaptured(self):
+        return PIECES[self.code >> 24]
+
+
+    @property
+    def promotedPiece(self):
+        return PIECES[(self.code >> 16) & 15] if self.code & MOVE_PROMOTION else '--'
+
+
+    @property
+    def isPawnPromotion(self):
+        return self.code & MOVE_PROMOTION != 0
+
+
+    @property
+    def isEnpassant(self):
+        return self.code & MOVE_ENPASSANT != 0
+
+
+    @property
+    def isCastle(self):
+        return self.code & MOVE_CASTLE != 0
+
+
+    @property
+    def moveHashcode(self):
+        return self.startRow*1000 + self.startCol*100 + self.endRow*10 + self.endCol
 
 
     def __eq__(self, other):
         if isinstance(other, Move):
-            return self.moveHashcode == other.moveHashcode
+            return self.code & MOVE_KEY_MASK == other.code & MOVE_KEY_MASK
         return False
 
 
+    def __hash__(self):
+        return self.code & MOVE_KEY_MASK
+
+
     def __str__(self):
         return f"({self.startRow}, {self.startCol}) -> ({self.endRow}, {self.endCol})"
 
@@ -401,5 +1056,12 @@ class Move():
         return self.pieceMoved + self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
 
 
+    def getUciNotation(self):
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.isPawnPromotion:
+            notation += self.promotedPiece[1].lower()
+        return notation
+
+
     def getRankFile(self, r, c):
         return self.colsToFiles[c] + self.rowsToRanks[r]
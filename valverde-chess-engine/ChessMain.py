@@ -1,17 +1,23 @@
+import os
 import pygame as p
 import ChessEngine
-import RandomMoveFinder
+import Search
+from OpeningBook import OpeningBook
+from Tablebase import Tablebase
 
 WIDTH = HEIGHT = 512
 DIMENSION = 8
 SQ_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 15
+AI_TIME_LIMIT = 1.0 # seconds per computer move
+BOOK_FILE = 'book.bin' # Polyglot opening book, used when the file exists
+TABLEBASE_DIR = 'tablebases' # Syzygy .rtbw and .rtbz endgame tables, probing is off without them
 IMAGES = {}
-p.init()
 whiteColor = p.Color("white")
 blackColor = p.Color("gray")
 highlightSelectedSquareColor = p.Color("blue")
 highlightPossibleMovesColor = p.Color("yellow")
+thinkingColor = p.Color("black")
 
 
 def loadImages():
@@ -22,10 +28,12 @@ def loadImages():
 
 
 def main():
+    p.init()
     screen = p.display.set_mode((WIDTH, HEIGHT))
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
     gs = ChessEngine.GameState()
+    gs.enableMoveCache() # undo and redo come back to the same positions
     validMoves = gs.getValidMoves()
     moveMade = False
     loadImages()
@@ -35,12 +43,16 @@ def main():
     playerWhite = False # player is white
     playerBlack = False # computer is black
     isGameOver = False
+    aiWorker = Search.SearchWorker(Search.Searcher(tablebase=Tablebase.open(TABLEBASE_DIR))) # searches in the background so the window keeps drawing
+    font = p.font.SysFont("Helvetica", 14, True)
+    book = OpeningBook(BOOK_FILE) if os.path.exists(BOOK_FILE) else None
 
 
     while running:
         isHumanTurn = (gs.whiteToMove and playerWhite) or (not gs.whiteToMove and playerBlack)
         for e in p.event.get():
             if e.type == p.QUIT:
+                aiWorker.cancel()
                 running = False
             elif e.type == p.MOUSEBUTTONDOWN: # human moving
                 if not isGameOver and isHumanTurn:
@@ -69,22 +81,35 @@ def main():
 
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_z:
+                    aiWorker.cancel()
                     gs.undoMove()
                     moveMade = True
 
         # AI move logic
-        if not isGameOver and not isHumanTurn:
-            aiMove = RandomMoveFinder.findMove(validMoves)
-            gs.makeMove(aiMove)
-            moveMade = True
+        if not isGameOver and not isHumanTurn and not moveMade and not aiWorker.isThinking:
+            code = book.chooseMove(gs) if book is not None else None
+            if code is None:
+                code = aiWorker.poll(gs)
+            if code is None:
+                aiWorker.start(gs, AI_TIME_LIMIT)
+            else:
+                for move in validMoves:
+                    if move.code == code:
+                        gs.makeMove(move)
+                        moveMade = True
+                        print(move.getChessNotation())
 
         if moveMade:
             validMoves = gs.getValidMoves()
             moveMade = False
-            if len(validMoves) == 0:
-                isGameOver = True
+            status = gs.gameStatus()
+            isGameOver = status != ChessEngine.ONGOING # undoing a move can take the game back out of its end
+            if isGameOver:
+                print(ChessEngine.GAME_STATUS_NAMES[status])
 
         drawGameState(screen, gs, validMoves, sqSelected)
+        if aiWorker.isThinking:
+            drawThinking(screen, font, aiWorker.progress())
         clock.tick(MAX_FPS)
         p.display.flip()
 
@@ -113,6 +138,16 @@ def drawGameState(screen, gs, validMoves, sqSelected):
     drawPieces(screen, gs.board)
 
 
+def drawThinking(screen, font, progress):
+    depth, nodes, nps = progress
+    text = font.render(f"thinking... depth {depth}  nodes {nodes}  {nps/1000:.1f}k nps", True, thinkingColor)
+    s = p.Surface((WIDTH, text.get_height() + 4))
+    s.set_alpha(160)
+    s.fill(whiteColor)
+    screen.blit(s, (0, HEIGHT - s.get_height()))
+    screen.blit(text, (4, HEIGHT - s.get_height() + 2))
+
+
 def drawBoard(screen):
     colors = [whiteColor, blackColor]
     for r in range(DIMENSION):
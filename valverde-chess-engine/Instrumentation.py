@@ -0,0 +1,302 @@
+import argparse
+import functools
+import json
+import platform
+import sys
+import time
+import ChessEngine
+import Evaluation
+import Perft
+import Search
+from TranspositionTable import TranspositionTable
+
+'''
+Opt-in counters and timers on the hot path. Nothing is instrumented until enable() is called:
+the hooked methods are swapped for counting wrappers then and the originals put back by disable(),
+so a run without instrumentation executes exactly the code it always did.
+Only the current process is instrumented, Parallel workers are not
+'''
+
+
+def _countGenerated(counters, args, result):
+    counters["movesGenerated"] += len(result)
+
+
+def _countHit(counters, args, result):
+    if result is not None:
+        counters["ttHits"] += 1
+
+
+def _countNegamaxFailHigh(counters, args, result): # negamax(self, gs, depth, alpha, beta, ply)
+    if result >= args[4]:
+        counters["negamaxFailHighs"] += 1
+
+
+def _countQuiescenceFailHigh(counters, args, result): # quiescence(self, gs, alpha, beta, ply)
+    if result >= args[3]:
+        counters["quiescenceFailHighs"] += 1
+
+
+'''
+(owner, attribute, counter name, extra counting after the call or None)
+'''
+HOOKS = (
+    (ChessEngine.GameState, "getValidMoveCodes", "moveGeneration", _countGenerated),
+    (ChessEngine.GameState, "hasLegalMove", "legalMoveChecks", None),
+    (ChessEngine.GameState, "makeMoveCode", "makeMove", None),
+    (ChessEngine.GameState, "undoMove", "undoMove", None),
+    (ChessEngine.GameState, "attackersTo", "attackChecks", None),
+    (ChessEngine.GameState, "isInCheck", "checkTests", None),
+    (ChessEngine.Move, "__init__", "moveAllocations", None),
+    (ChessEngine.Move, "fromCode", "moveAllocations", None),
+    (Evaluation, "evaluate", "evaluations", None),
+    (TranspositionTable, "probe", "ttProbes", _countHit),
+    (TranspositionTable, "store", "ttStores", None),
+    (Search.Searcher, "negamax", "negamaxNodes", _countNegamaxFailHigh),
+    (Search.Searcher, "quiescence", "quiescenceNodes", _countQuiescenceFailHigh),
+)
+EXTRA_COUNTERS = ("movesGenerated", "ttHits", "negamaxFailHighs", "quiescenceFailHighs")
+
+
+class Instrumentation():
+    def __init__(self, timers = False):
+        self.timers = timers
+        self.originals = []
+        self.counters = {}
+        self.seconds = {}
+        self.active = {}
+        self.reset()
+
+
+    '''
+    Zeroes the counters in place, the installed wrappers keep updating the same dicts
+    '''
+    def reset(self):
+        for _, _, name, _ in HOOKS:
+            self.counters[name] = 0
+            self.seconds[name] = 0.0
+            self.active[name] = 0
+        for name in EXTRA_COUNTERS:
+            self.counters[name] = 0
+
+
+    @property
+    def enabled(self):
+        return bool(self.originals)
+
+
+    def enable(self):
+        if self.enabled:
+            return self
+        for owner, attribute, name, after in HOOKS:
+            original = owner.__dict__[attribute] if isinstance(owner, type) else getattr(owner, attribute)
+            if isinstance(original, classmethod):
+                wrapper = classmethod(self.wrap(original.__func__, name, after))
+            else:
+                wrapper = self.wrap(original, name, after)
+            self.originals.append((owner, attribute, original))
+            setattr(owner, attribute, wrapper)
+        return self
+
+
+    def disable(self):
+        for owner, attribute, original in reversed(self.originals):
+            setattr(owner, attribute, original)
+        self.originals = []
+
+
+    def __enter__(self):
+        return self.enable()
+
+
+    def __exit__(self, *exc):
+        self.disable()
+
+
+    '''
+    Timers measure inclusive time and only the outermost call of a recursion, so negamax is not counted once per ply
+    '''
+    def wrap(self, function, name, after):
+        counters = self.counters
+        if not self.timers:
+            if after is None:
+                def wrapper(*args, **kwargs):
+                    counters[name] += 1
+                    return function(*args, **kwargs)
+            else:
+                def wrapper(*args, **kwargs):
+                    counters[name] += 1
+                    result = function(*args, **kwargs)
+                    after(counters, args, result)
+                    return result
+            return functools.wraps(function)(wrapper)
+
+        seconds = self.seconds
+        active = self.active
+        clock = time.perf_counter
+        def wrapper(*args, **kwargs):
+            counters[name] += 1
+            if active[name]:
+                result = function(*args, **kwargs)
+            else:
+                active[name] = 1
+                start = clock()
+                try:
+                    result = function(*args, **kwargs)
+                finally:
+                    seconds[name] += clock() - start
+                    active[name] = 0
+            if after is not None:
+                after(counters, args, result)
+            return result
+        return functools.wraps(function)(wrapper)
+
+
+    def getStats(self):
+        stats = {"counters": dict(self.counters)}
+        if self.timers:
+            stats["seconds"] = {name: round(value, 6) for name, value in self.seconds.items() if self.counters[name]}
+        return stats
+
+
+'''
+The run with its instrumentation as one JSON document, with what is needed to compare it against another run
+'''
+def writeJson(path, workload, stats, nodes, elapsed, extra = None):
+    document = {
+        "workload": workload,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "nodes": nodes,
+        "elapsed": round(elapsed, 6),
+        "nps": round(nodes / elapsed) if elapsed > 0 else 0,
+    }
+    document.update(stats)
+    if extra:
+        document.update(extra)
+    if path == "-":
+        json.dump(document, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(path, "w") as out:
+            json.dump(document, out, indent=2)
+            out.write("\n")
+    return document
+
+
+'''
+Perft to the given depth of every perft position, or a fixed depth search of each when searchDepth is set.
+Returns (nodes, elapsed, failures)
+'''
+def runWorkload(depth, searchDepth = None, positionNames = None, out = sys.stdout):
+    nodes = 0
+    failures = 0
+    start = time.perf_counter()
+    for name, fen, expected in Perft.PERFT_POSITIONS:
+        if positionNames and name not in positionNames:
+            continue
+        gs = Perft.loadFen(fen)
+        if searchDepth:
+            result = Search.Searcher().search(gs, maxDepth=searchDepth)
+            nodes += result.nodes
+            out.write(f"{name:<10} {result}\n")
+        else:
+            stats = Perft.perft(gs, depth)
+            nodes += stats.nodes
+            ok = depth not in expected or stats.asTuple() == expected[depth]
+            failures += not ok
+            out.write(f"{name:<10} perft {depth} nodes {stats.nodes:>9}  {'ok' if ok else 'FAIL'}\n")
+    return nodes, time.perf_counter() - start, failures
+
+
+'''
+Counters that moved by more than tolerance (a fraction) from the baseline run, as (name, baseline, current).
+Counters are deterministic for a given workload, so any change is a change in the code
+'''
+def compareCounters(baseline, current, tolerance):
+    changes = []
+    for name, value in current["counters"].items():
+        before = baseline.get("counters", {}).get(name)
+        if before is None:
+            continue
+        if abs(value - before) > tolerance * max(before, 1):
+            changes.append((name, before, value))
+    return changes
+
+
+def profileWorkload(profiler, outPath, depth, searchDepth, positionNames, top):
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            sys.exit("pyinstrument is not installed, use --profile cprofile or pip install pyinstrument")
+        profile = Profiler()
+        profile.start()
+        result = runWorkload(depth, searchDepth, positionNames)
+        profile.stop()
+        if outPath:
+            with open(outPath, "w") as out:
+                out.write(profile.output_html())
+        sys.stdout.write(profile.output_text(unicode=False, color=False))
+        return result
+
+    import cProfile
+    import pstats
+    profile = cProfile.Profile()
+    result = profile.runcall(runWorkload, depth, searchDepth, positionNames)
+    if outPath:
+        profile.dump_stats(outPath)
+    pstats.Stats(profile).sort_stats("cumulative").print_stats(top)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Instrumented or profiled run over the perft positions")
+    parser.add_argument("--depth", type=int, default=3, help="perft depth")
+    parser.add_argument("--search-depth", type=int, help="search each position to this depth instead of perft")
+    parser.add_argument("--position", action="append", help="run only the named perft position (repeatable)")
+    parser.add_argument("--timers", action="store_true", help="time the hooked calls too, slows the run down")
+    parser.add_argument("--json", help="write the counters to this file, - for standard output")
+    parser.add_argument("--baseline", help="JSON of an earlier run, fail when a counter moved past --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="allowed relative change of a counter")
+    parser.add_argument("--profile", choices=("cprofile", "pyinstrument"), help="profile the run instead of counting")
+    parser.add_argument("--profile-out", help="cProfile stats file or pyinstrument HTML report")
+    parser.add_argument("--top", type=int, default=30, help="functions listed by cProfile")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        _, _, failures = profileWorkload(args.profile, args.profile_out, args.depth, args.search_depth, args.position, args.top)
+        return 1 if failures else 0
+
+    log = sys.stderr if args.json == "-" else sys.stdout # keep standard output for the JSON
+    with Instrumentation(args.timers) as instrumentation:
+        nodes, elapsed, failures = runWorkload(args.depth, args.search_depth, args.position, log)
+    stats = instrumentation.getStats()
+    for name, value in stats["counters"].items():
+        seconds = stats.get("seconds", {}).get(name)
+        log.write(f"{name:<20} {value:>12}" + (f"  {seconds:9.3f}s" if seconds is not None else "") + "\n")
+    log.write(f"nodes {nodes}  {elapsed:.3f}s  {nodes / elapsed if elapsed > 0 else 0.0:.0f} nps (instrumented)\n")
+
+    workload = {"depth": args.search_depth, "mode": "search"} if args.search_depth else {"depth": args.depth, "mode": "perft"}
+    workload["positions"] = args.position or [name for name, _, _ in Perft.PERFT_POSITIONS]
+    document = {"counters": stats["counters"]}
+    if args.json:
+        document = writeJson(args.json, workload, stats, nodes, elapsed)
+
+    if args.baseline:
+        with open(args.baseline) as stream:
+            baseline = json.load(stream)
+        if baseline.get("workload") != workload:
+            log.write(f"baseline workload {baseline.get('workload')} differs from this one, counters not compared\n")
+        else:
+            changes = compareCounters(baseline, document, args.tolerance)
+            for name, before, value in changes:
+                log.write(f"counter {name} changed: {before} -> {value} ({(value - before) / max(before, 1):+.1%})\n")
+            if changes:
+                failures += 1
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
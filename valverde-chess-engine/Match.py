@@ -0,0 +1,359 @@
+import argparse
+import math
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import ChessEngine
+import Pgn
+import RandomMoveFinder
+import Search
+from Tablebase import Tablebase
+from TranspositionTable import TranspositionTable, DEFAULT_SIZE_MB
+from Uci import timeBudget
+
+'''
+Headless self-play matches between two engine configurations, games played in parallel processes.
+Every opening of the suite is played twice with colors swapped, games end by the game-over rules,
+a time forfeit or the ply limit. Results go to a PGN file, with Elo and an optional SPRT on the way
+'''
+DEFAULT_MOVE_TIME = 0.1 # seconds per move when a configuration sets no limit and there is no clock
+DEFAULT_MAX_PLIES = 400 # adjudicated a draw after this many plies
+ELO_CONFIDENCE = 1.959964 # two sided 95% normal quantile
+
+OPENINGS = [
+    "r1bqkbnr/1ppp1ppp/p1n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 0 4", # Ruy Lopez
+    "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4", # Italian
+    "rnbqkb1r/1p2pppp/p2p1n2/8/3NP3/2N5/PPP2PPP/R1BQKB1R w KQkq - 0 6", # Sicilian Najdorf
+    "rnbqkb1r/ppp2ppp/4pn2/3p4/3PP3/2N5/PPP2PPP/R1BQKBNR w KQkq - 2 4", # French
+    "rnbqkbnr/pp2pppp/2p5/8/3PN3/8/PPP2PPP/R1BQKBNR b KQkq - 0 4", # Caro-Kann
+    "rnb1kbnr/ppp1pppp/8/q7/8/2N5/PPPP1PPP/R1BQKBNR w KQkq - 2 4", # Scandinavian
+    "rnbqkb1r/ppp2ppp/4pn2/3p4/2PP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 2 4", # Queen's Gambit Declined
+    "rnbqkb1r/pp2pppp/2p2n2/3p4/2PP4/5N2/PP2PPPP/RNBQKB1R w KQkq - 2 4", # Slav
+    "rnbqk2r/ppp1ppbp/3p1np1/8/2PPP3/2N5/PP3PPP/R1BQKBNR w KQkq - 0 5", # King's Indian
+    "rnbqk2r/pppp1ppp/4pn2/8/1bPP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 2 4", # Nimzo-Indian
+    "rnbqkb1r/pppp1ppp/5n2/4p3/2P5/2N3P1/PP1PPP1P/R1BQKBNR b KQkq - 0 3", # English
+    "rnbqkbnr/ppp2ppp/4p3/3p4/2P5/5NP1/PP1PPP1P/RNBQKB1R b KQkq - 0 3", # Reti
+]
+
+
+'''
+One side of a match, parsed from a spec like "random" or "search:depth=4,hash=8,name=new".
+Search options: depth, nodes, movetime (milliseconds), hash (MB), noorder, tablebases (directory)
+'''
+class EngineConfig():
+    def __init__(self, name, kind = 'search', depth = None, nodes = None, moveTime = None, hashMb = DEFAULT_SIZE_MB,
+                 orderMoves = True, tablebasePath = None):
+        self.name = name
+        self.kind = kind
+        self.depth = depth
+        self.nodes = nodes
+        self.moveTime = moveTime
+        self.hashMb = hashMb
+        self.orderMoves = orderMoves
+        self.tablebasePath = tablebasePath
+
+
+    @classmethod
+    def fromSpec(cls, spec):
+        kind, _, options = spec.partition(':')
+        if kind not in ('random', 'search'):
+            raise ValueError(f"unknown engine kind {kind} in {spec}")
+        config = cls(spec, kind)
+        for option in filter(None, options.split(',')):
+            key, _, value = option.partition('=')
+            try:
+                if key == 'name':
+                    config.name = value
+                elif key == 'depth':
+                    config.depth = int(value)
+                elif key == 'nodes':
+                    config.nodes = int(value)
+                elif key == 'movetime':
+                    config.moveTime = int(value) / 1000
+                elif key == 'hash':
+                    config.hashMb = int(value)
+                elif key == 'noorder':
+                    config.orderMoves = False
+                elif key == 'tablebases':
+                    config.tablebasePath = value
+                else:
+                    raise ValueError(f"unknown option {key} in {spec}")
+            except ValueError as e:
+                raise ValueError(f"bad option {option} in {spec}: {e}") from None
+        return config
+
+
+    def __repr__(self):
+        return self.name
+
+
+'''
+Per process searchers, one per configuration, so the tables are allocated once and only cleared between games
+'''
+_workerSearchers = {}
+
+
+def _getSearcher(config):
+    searcher = _workerSearchers.get(config.name)
+    if searcher is None:
+        tablebase = Tablebase.open(config.tablebasePath) if config.tablebasePath else None
+        searcher = Search.Searcher(TranspositionTable(config.hashMb), config.orderMoves, tablebase)
+        _workerSearchers[config.name] = searcher
+    return searcher
+
+
+'''
+Plays one game and returns its record as a dict of plain values, so it pickles cheaply back to the parent.
+timeControl is (base seconds, increment seconds) or None
+'''
+def playGame(index, fen, white, black, timeControl = None, maxPlies = DEFAULT_MAX_PLIES, seed = None):
+    random.seed(seed) # RandomMoveFinder draws from the module level generator
+    gs = ChessEngine.GameState.fromFen(fen)
+    configs = (white, black)
+    searchers = [_getSearcher(config) if config.kind == 'search' else None for config in configs]
+    for searcher in searchers:
+        if searcher is not None:
+            searcher.tt.clear()
+            if searcher.ordering is not None:
+                searcher.ordering.clear()
+    clocks = [timeControl[0], timeControl[0]] if timeControl else None
+    nodes = [0, 0]
+    thinking = [0.0, 0.0]
+    codes = []
+    result, termination = '1/2-1/2', 'adjudication'
+
+    while True:
+        status = gs.gameStatus()
+        if status != ChessEngine.ONGOING:
+            if status == ChessEngine.CHECKMATE:
+                result = '0-1' if gs.whiteToMove else '1-0'
+            termination = ChessEngine.GAME_STATUS_NAMES[status]
+            break
+        if len(codes) >= maxPlies:
+            termination = 'ply limit'
+            break
+
+        side = ChessEngine.WHITE if gs.whiteToMove else ChessEngine.BLACK
+        config, searcher = configs[side], searchers[side]
+        start = time.perf_counter()
+        if searcher is None:
+            code = RandomMoveFinder.findMove(gs.getValidMoves()).code
+        else:
+            timeLimit = config.moveTime
+            if timeLimit is None and clocks is not None:
+                timeLimit = timeBudget(clocks[side], timeControl[1])
+            if timeLimit is None and config.depth is None and config.nodes is None:
+                timeLimit = DEFAULT_MOVE_TIME
+            searchResult = searcher.search(gs, timeLimit, config.depth, config.nodes)
+            code = searchResult.bestMove
+            nodes[side] += searchResult.nodes
+        elapsed = time.perf_counter() - start
+        thinking[side] += elapsed
+        if clocks is not None:
+            clocks[side] -= elapsed
+            if clocks[side] < 0:
+                result = '0-1' if side == ChessEngine.WHITE else '1-0'
+                termination = 'time forfeit'
+                break
+            clocks[side] += timeControl[1]
+        gs.makeMoveCode(code)
+        codes.append(code)
+
+    return {
+        "index": index,
+        "fen": fen,
+        "white": white.name,
+        "black": black.name,
+        "result": result,
+        "termination": termination,
+        "codes": codes,
+        "nodes": nodes,
+        "thinking": thinking,
+    }
+
+
+'''
+Score, Elo difference with its 95% error margin and likelihood of superiority of the first engine,
+from its wins, draws and losses
+'''
+def eloStatistics(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0:
+        return {"games": 0, "score": 0.5, "elo": 0.0, "eloError": math.inf, "los": 0.5}
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = ELO_CONFIDENCE * math.sqrt(variance / games)
+    decisive = wins + losses
+    return {
+        "games": games,
+        "score": score,
+        "elo": scoreToElo(score),
+        "eloError": (scoreToElo(score + margin) - scoreToElo(score - margin)) / 2 if 0 < score < 1 else math.inf,
+        "los": 0.5 * (1 + math.erf((wins - losses) / math.sqrt(2 * decisive))) if decisive else 0.5,
+    }
+
+
+def scoreToElo(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return 400 * math.log10(score / (1 - score))
+
+
+def eloToScore(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+'''
+Log likelihood ratio of H1 (the first engine is elo1 stronger) against H0 (elo0 stronger) and its bounds,
+in the normal approximation of the game results used by most testing frameworks.
+Stop with H1 accepted once llr >= upper, with H0 accepted once llr <= lower
+'''
+def sprt(wins, draws, losses, elo0, elo1, alpha = 0.05, beta = 0.05):
+    lower, upper = math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+    games = wins + draws + losses
+    if games == 0 or wins + losses == 0:
+        return 0.0, lower, upper
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance == 0:
+        return 0.0, lower, upper
+    score0, score1 = eloToScore(elo0), eloToScore(elo1)
+    llr = games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+    return llr, lower, upper
+
+
+'''
+FEN per line of a text or EPD file, EPD operations after the four position fields are dropped
+'''
+def loadOpenings(path):
+    openings = []
+    with open(path) as stream:
+        for line in stream:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+                fen = ' '.join(fields[:6])
+            else:
+                fen = ' '.join(fields[:4])
+            ChessEngine.GameState.fromFen(fen) # raises ValueError on a bad line
+            openings.append(fen)
+    return openings
+
+
+def formatElo(elo):
+    return f"{elo:+.1f}" if math.isfinite(elo) else ('+inf' if elo > 0 else '-inf')
+
+
+'''
+Plays games between engines a and b, a taking white in even games. Results are counted for a.
+Returns (wins, draws, losses) of a
+'''
+def runMatch(a, b, games, openings = None, timeControl = None, processes = None, pgnPath = None,
+             maxPlies = DEFAULT_MAX_PLIES, sprtBounds = None, report = 10, seed = 0, out = sys.stdout):
+    openings = openings or OPENINGS
+    wins = draws = losses = 0
+    finished = 0
+    nodes = {a.name: 0, b.name: 0}
+    thinking = {a.name: 0.0, b.name: 0.0}
+    pgn = open(pgnPath, 'a') if pgnPath else None
+    tags = {"Event": f"{a.name} vs {b.name}", "Site": "Match.py", "Date": time.strftime("%Y.%m.%d")}
+    if timeControl:
+        tags["TimeControl"] = f"{timeControl[0]:g}+{timeControl[1]:g}"
+    start = time.perf_counter()
+    executor = ProcessPoolExecutor(processes)
+    try:
+        futures = []
+        for index in range(games):
+            fen = openings[(index // 2) % len(openings)]
+            white, black = (a, b) if index % 2 == 0 else (b, a)
+            futures.append(executor.submit(playGame, index, fen, white, black, timeControl, maxPlies, seed + index))
+        for future in as_completed(futures):
+            game = future.result()
+            finished += 1
+            points = {'1-0': 1, '0-1': -1}.get(game["result"], 0) * (1 if game["white"] == a.name else -1)
+            for side, name in enumerate((game["white"], game["black"])):
+                nodes[name] += game["nodes"][side]
+                thinking[name] += game["thinking"][side]
+            if points > 0:
+                wins += 1
+            elif points < 0:
+                losses += 1
+            else:
+                draws += 1
+            if pgn is not None:
+                gameTags = dict(tags, Round=str(game["index"] + 1), White=game["white"], Black=game["black"],
+                                Termination=game["termination"])
+                startFen = game["fen"] if game["fen"] != ChessEngine.START_FEN else None
+                Pgn.writeGame(pgn, gameTags, game["codes"], game["result"], startFen)
+
+            stop = False
+            llrText = ''
+            if sprtBounds is not None:
+                llr, lower, upper = sprt(wins, draws, losses, *sprtBounds)
+                llrText = f"  LLR {llr:.2f} ({lower:.2f}, {upper:.2f})"
+                if llr >= upper or llr <= lower:
+                    stop = True
+                    llrText += '  H1 accepted' if llr >= upper else '  H0 accepted'
+            if stop or finished == games or (report and finished % report == 0):
+                stats = eloStatistics(wins, draws, losses)
+                out.write(f"{finished}/{games}  +{wins} ={draws} -{losses}  score {stats['score']:.3f}  "
+                          f"elo {formatElo(stats['elo'])} +/- {stats['eloError']:.1f}  LOS {stats['los']:.1%}  "
+                          f"{time.perf_counter() - start:.0f}s{llrText}\n")
+                out.flush()
+            if stop:
+                for pending in futures:
+                    pending.cancel()
+                break
+    finally:
+        executor.shutdown(cancel_futures=True)
+        if pgn is not None:
+            pgn.close()
+    for name in (a.name, b.name): # throughput, so a speed regression shows next to the strength one
+        if nodes[name]:
+            out.write(f"{name}: {nodes[name]} nodes in {thinking[name]:.1f}s, {nodes[name] / max(thinking[name], 1e-9):.0f} nps\n")
+    return wins, draws, losses
+
+
+def parseTimeControl(text):
+    base, _, increment = text.partition('+')
+    return float(base), float(increment or 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Self-play match between two engine configurations")
+    parser.add_argument("engineA", help='first engine, e.g. "search:depth=3,name=new" or "random"')
+    parser.add_argument("engineB", help="second engine, results are counted for the first")
+    parser.add_argument("--games", type=int, default=100, help="games to play, openings are played in pairs")
+    parser.add_argument("--openings", help="file with one FEN or EPD position per line, a built-in suite by default")
+    parser.add_argument("--tc", help="clock as base+increment seconds, e.g. 10+0.1")
+    parser.add_argument("--processes", type=int, help="worker processes, all CPUs by default")
+    parser.add_argument("--pgn", help="append the games to this PGN file")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES, help="adjudicate a draw after this many plies")
+    parser.add_argument("--sprt", nargs=2, type=float, metavar=("ELO0", "ELO1"),
+                        help="stop once the SPRT of H0: elo = ELO0 against H1: elo = ELO1 decides")
+    parser.add_argument("--alpha", type=float, default=0.05, help="SPRT false positive rate")
+    parser.add_argument("--beta", type=float, default=0.05, help="SPRT false negative rate")
+    parser.add_argument("--report", type=int, default=10, help="print the standings every this many games")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random movers")
+    args = parser.parse_args(argv)
+
+    try:
+        a, b = EngineConfig.fromSpec(args.engineA), EngineConfig.fromSpec(args.engineB)
+        openings = loadOpenings(args.openings) if args.openings else OPENINGS
+        timeControl = parseTimeControl(args.tc) if args.tc else None
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+    if a.name == b.name:
+        b.name += " (2)"
+    sprtBounds = (args.sprt[0], args.sprt[1], args.alpha, args.beta) if args.sprt else None
+    runMatch(a, b, args.games, openings, timeControl, args.processes, args.pgn, args.max_plies, sprtBounds,
+             args.report, args.seed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
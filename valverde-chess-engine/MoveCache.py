@@ -0,0 +1,72 @@
+from collections import OrderedDict
+
+'''
+Bounded least-recently-used cache of legal moves per position, keyed by zobrist key.
+Entries hold the moves together with the check mate and stale mate flags their generation sets
+'''
+DEFAULT_MAX_ENTRIES = 4096
+
+
+class MoveCacheEntry():
+    __slots__ = ('moves', 'checkMate', 'staleMate')
+
+    def __init__(self, moves, checkMate, staleMate):
+        self.moves = moves
+        self.checkMate = checkMate
+        self.staleMate = staleMate
+
+
+class MoveCache():
+    def __init__(self, maxEntries = DEFAULT_MAX_ENTRIES):
+        if maxEntries < 1:
+            raise ValueError("move cache needs room for at least one position")
+        self.maxEntries = maxEntries
+        self.entries = OrderedDict()
+        self.resetStats()
+
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def clear(self):
+        self.entries.clear()
+        self.resetStats()
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+
+    def put(self, key, moves, checkMate, staleMate):
+        entry = MoveCacheEntry(moves, checkMate, staleMate)
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+
+    def getStats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "maxEntries": self.maxEntries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
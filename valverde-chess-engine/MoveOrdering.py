@@ -0,0 +1,144 @@
+import argparse
+import sys
+from array import array
+from ChessEngine import EMPTY, MOVE_PROMOTION, TACTICAL_MOVES, QUIET_MOVES
+import Evaluation
+
+'''
+Move ordering for alpha-beta: hash move, then captures and promotions by MVV-LVA,
+then killer moves of the ply, then the remaining quiet moves by history score.
+Quiet moves are only generated once the tactical ones failed to cut the node off
+'''
+KILLER_SLOTS = 2
+HISTORY_LIMIT = 1 << 20 # history scores are halved once one of them passes this
+
+
+'''
+Captures of valuable pieces by cheap ones first, then promotions, then quiet moves
+'''
+def captureOrderKey(code):
+    captured = code >> 24
+    score = 0
+    if captured != EMPTY:
+        score = 10 * Evaluation.PIECE_VALUES[captured % 6] - Evaluation.PIECE_VALUES[((code >> 20) & 15) % 6]
+    if code & MOVE_PROMOTION:
+        score += Evaluation.PIECE_VALUES[((code >> 16) & 15) % 6]
+    return -score
+
+
+def isTactical(code):
+    return code >> 24 != EMPTY or code & MOVE_PROMOTION
+
+
+class MoveOrderer():
+    def __init__(self, maxPly):
+        self.maxPly = maxPly
+        self.tacticalBuffers = [array('I') for _ in range(maxPly + 1)]
+        self.quietBuffers = [array('I') for _ in range(maxPly + 1)]
+        self.clear()
+
+
+    def clear(self):
+        self.killers = [[0] * KILLER_SLOTS for _ in range(self.maxPly + 1)]
+        self.history = [0] * (12 * 64) # indexed by moved piece * 64 + end square
+
+
+    '''
+    Killers belong to the previous position tree, history is kept but weighs less
+    '''
+    def newSearch(self):
+        self.killers = [[0] * KILLER_SLOTS for _ in range(self.maxPly + 1)]
+        self.history = [score >> 2 for score in self.history]
+
+
+    def historyKey(self, code):
+        return -self.history[((code >> 20) & 15) * 64 + ((code >> 6) & 63)]
+
+
+    '''
+    Called when a quiet move caused a beta cutoff
+    '''
+    def recordCutoff(self, code, depth, ply):
+        killers = self.killers[ply]
+        if killers[0] != code:
+            killers[1] = killers[0]
+            killers[0] = code
+        index = ((code >> 20) & 15) * 64 + ((code >> 6) & 63)
+        self.history[index] += depth * depth
+        if self.history[index] > HISTORY_LIMIT:
+            self.history = [score >> 1 for score in self.history]
+
+
+    '''
+    Legal moves of gs in search order, generated stage by stage as the caller keeps asking for more
+    '''
+    def orderedMoves(self, gs, ply, hashMove = 0):
+        tactical = gs.getValidMoveCodes(self.tacticalBuffers[ply], TACTICAL_MOVES)
+        quiet = None
+        if hashMove:
+            if isTactical(hashMove):
+                if hashMove in tactical: # a colliding key could hand over a move of another position
+                    yield hashMove
+                else:
+                    hashMove = 0
+            else:
+                quiet = gs.getValidMoveCodes(self.quietBuffers[ply], QUIET_MOVES)
+                if hashMove in quiet:
+                    yield hashMove
+                else:
+                    hashMove = 0
+
+        for code in sorted(tactical, key=captureOrderKey):
+            if code != hashMove:
+                yield code
+
+        if quiet is None:
+            quiet = gs.getValidMoveCodes(self.quietBuffers[ply], QUIET_MOVES)
+        killers = [killer for killer in self.killers[ply] if killer and killer != hashMove and killer in quiet]
+        yield from killers
+        for code in sorted(quiet, key=self.historyKey):
+            if code != hashMove and code not in killers:
+                yield code
+
+
+    '''
+    Captures and promotions only, for the quiescence search
+    '''
+    def orderedCaptures(self, gs, ply):
+        return sorted(gs.getValidMoveCodes(self.tacticalBuffers[ply], TACTICAL_MOVES), key=captureOrderKey)
+
+
+'''
+Nodes needed for fixed depth searches of the perft positions with and without move ordering
+'''
+def benchmark(depth, positionNames = None, out = sys.stdout):
+    import Search # imported here, Search itself imports this module
+    import Perft
+    totals = [0, 0]
+    for name, fen, _ in Perft.PERFT_POSITIONS:
+        if positionNames and name not in positionNames:
+            continue
+        counts = []
+        for orderMoves in (False, True):
+            result = Search.Searcher(orderMoves=orderMoves).search(Perft.loadFen(fen), maxDepth=depth)
+            counts.append((result.nodes, result.elapsed))
+        totals[0] += counts[0][0]
+        totals[1] += counts[1][0]
+        out.write(f"{name:<10} depth {depth}  unordered {counts[0][0]:>9} nodes {counts[0][1]:7.2f}s  "
+                  f"ordered {counts[1][0]:>9} nodes {counts[1][1]:7.2f}s  "
+                  f"{counts[0][0] / max(counts[1][0], 1):5.1f}x fewer\n")
+    out.write(f"total      unordered {totals[0]} nodes  ordered {totals[1]} nodes  {totals[0] / max(totals[1], 1):.1f}x fewer\n")
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Node count benchmark of move ordering")
+    parser.add_argument("--depth", type=int, default=3, help="search depth, unordered kiwipete takes minutes at 4")
+    parser.add_argument("--position", action="append", help="run only the named perft position (repeatable)")
+    args = parser.parse_args(argv)
+    benchmark(args.depth, args.position)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from ChessEngine import MOVE_CASTLE, MOVE_PROMOTION
+from PolyglotRandom import RANDOM64
+import Pgn
+
+'''
+Polyglot opening books: 16 byte big endian entries (key, move, weight, learn) sorted by key.
+The file is memory mapped and searched in place, so opening a book costs nothing however big it is
+'''
+ENTRY = struct.Struct('>QHHI')
+ENTRY_BYTES = ENTRY.size
+KEY = struct.Struct('>Q')
+DEFAULT_BOOK_DEPTH = 16 # plies from the start of the game the book is asked for
+MAX_WEIGHT = 0xFFFF
+
+_CASTLE_KEYS = RANDOM64[768:772]
+_ENPASSANT_KEYS = RANDOM64[772:780]
+_WHITE_TO_MOVE_KEY = RANDOM64[780]
+
+
+'''
+Polyglot key of the position. Polyglot squares count from a1, so rows of GameState flip with sq ^ 56,
+and its piece kinds interleave colors: black pawn, white pawn, black knight and so on
+'''
+def polyglotKey(gs):
+    key = 0
+    for piece, bitboard in enumerate(gs.pieceBitboards):
+        kind = (piece % 6) * 2 + (1 if piece < 6 else 0)
+        keys = RANDOM64[kind * 64:(kind + 1) * 64]
+        while bitboard:
+            low = bitboard & -bitboard
+            bitboard ^= low
+            key ^= keys[(low.bit_length() - 1) ^ 56]
+    for bit in range(4): # rights bits are white king side, white queen side, black king side, black queen side
+        if gs.castlingRights & (1 << bit):
+            key ^= _CASTLE_KEYS[bit]
+    if gs.enpassantPossible != ():
+        r, c = gs.enpassantPossible
+        pawnRow = r + (1 if gs.whiteToMove else -1) # hashed only when a pawn could take, legal or not
+        pawn = 'wP' if gs.whiteToMove else 'bP'
+        if (c > 0 and gs.board[pawnRow][c - 1] == pawn) or (c < 7 and gs.board[pawnRow][c + 1] == pawn):
+            key ^= _ENPASSANT_KEYS[c]
+    if gs.whiteToMove:
+        key ^= _WHITE_TO_MOVE_KEY
+    return key
+
+
+'''
+Polyglot move: to file, to row, from file, from row (3 bits each, rows from rank 1), then the promotion piece.
+Castling is written as the king taking its own rook
+'''
+def encodePolyglotMove(code):
+    start, end = (code & 63) ^ 56, ((code >> 6) & 63) ^ 56
+    if code & MOVE_CASTLE:
+        end = (end & ~7) | (7 if end & 7 == 6 else 0)
+    move = end | (start << 6)
+    if code & MOVE_PROMOTION:
+        move |= (((code >> 16) & 15) % 6) << 12 # knight 1 ... queen 4, same as the piece types
+    return move
+
+
+def decodePolyglotMove(gs, move):
+    for code in gs.getValidMoveCodes():
+        if encodePolyglotMove(code) == move:
+            return code
+    return None
+
+
+class OpeningBook():
+    def __init__(self, path, bookDepth = DEFAULT_BOOK_DEPTH, rng = None):
+        self.path = path
+        self.bookDepth = bookDepth
+        self.rng = rng if rng is not None else random.Random()
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.count = size // ENTRY_BYTES
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def __len__(self):
+        return self.count
+
+
+    '''
+    Index of the first entry with the key or a bigger one, by binary search over the mapped file
+    '''
+    def lowerBound(self, key):
+        low, high = 0, self.count
+        data = self.data
+        while low < high:
+            middle = (low + high) >> 1
+            if KEY.unpack_from(data, middle * ENTRY_BYTES)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+
+    '''
+    Book moves of gs as (move code, weight, learn), moves the position does not allow are skipped
+    '''
+    def getEntries(self, gs):
+        key = polyglotKey(gs)
+        entries = []
+        index = self.lowerBound(key)
+        while index < self.count:
+            entryKey, move, weight, learn = ENTRY.unpack_from(self.data, index * ENTRY_BYTES)
+            if entryKey != key:
+                break
+            code = decodePolyglotMove(gs, move)
+            if code is not None:
+                entries.append((code, weight, learn))
+            index += 1
+        return entries
+
+
+    '''
+    A book move picked at random in proportion to the weights, None when out of book or past the book depth.
+    Moves of weight 0 are never played, as in other Polyglot readers: the book keeps them only to mark them bad
+    '''
+    def chooseMove(self, gs, weighted = True):
+        if self.bookDepth is not None and gs.plyOffset + len(gs.undoStack) >= self.bookDepth:
+            return None
+        entries = [entry for entry in self.getEntries(gs) if entry[1] > 0]
+        if not entries:
+            return None
+        if not weighted:
+            return max(entries, key=lambda entry: entry[1])[0]
+        total = sum(weight for _, weight, _ in entries)
+        pick = self.rng.randrange(total)
+        for code, weight, _ in entries:
+            if pick < weight:
+                return code
+            pick -= weight
+        return entries[-1][0]
+
+
+'''
+Builds a Polyglot book from PGN files out of the first maxPlies moves of every game.
+A move weighs 2 per win and 1 per draw of the side that played it, weights are scaled to fit 16 bits
+'''
+def buildBook(pgnPaths, outPath, maxPlies = DEFAULT_BOOK_DEPTH, minCount = 1):
+    counts = {} # (key, move) -> [times played, score]
+    games = 0
+    for pgnPath in pgnPaths:
+        with open(pgnPath, encoding='utf-8', errors='replace') as stream:
+            for tags, sanMoves, result in Pgn.readGames(stream):
+                if 'FEN' in tags: # only games from the initial position
+                    continue
+                games += 1
+                gs, codes = Pgn.replay(tags, sanMoves, maxPlies)
+                for code in reversed(codes):
+                    gs.undoMove()
+                    whiteMoved = gs.whiteToMove
+                    points = {'1-0': 2 if whiteMoved else 0, '0-1': 0 if whiteMoved else 2, '1/2-1/2': 1}.get(result, 0)
+                    entry = counts.setdefault((polyglotKey(gs), encodePolyglotMove(code)), [0, 0])
+                    entry[0] += 1
+                    entry[1] += points
+
+    entries = [(key, move, score) for (key, move), (played, score) in counts.items() if played >= minCount]
+    highest = max((score for _, _, score in entries), default=0)
+    scale = MAX_WEIGHT / highest if highest > MAX_WEIGHT else 1
+    entries.sort(key=lambda entry: (entry[0], -entry[2]))
+    with open(outPath, 'wb') as out:
+        for key, move, score in entries:
+            out.write(ENTRY.pack(key, move, max(1, int(score * scale)) if score else 0, 0))
+    return games, len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a Polyglot opening book from PGN files, or list book moves")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="build a book from PGN files")
+    build.add_argument("output")
+    build.add_argument("pgn", nargs="+")
+    build.add_argument("--depth", type=int, default=DEFAULT_BOOK_DEPTH, help="plies of every game to take")
+    build.add_argument("--min-count", type=int, default=1, help="leave out moves played fewer times")
+    probe = subparsers.add_parser("probe", help="list the book moves of a position")
+    probe.add_argument("book")
+    probe.add_argument("--fen", help="position to probe, the initial one by default")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        games, entries = buildBook(args.pgn, args.output, args.depth, args.min_count)
+        print(f"{games} games, {entries} entries written to {args.output}")
+        return 0
+
+    from ChessEngine import GameState, Move
+    gs = GameState.fromFen(args.fen) if args.fen else GameState()
+    with OpeningBook(args.book, bookDepth=None) as book:
+        print(f"key {polyglotKey(gs):016x}")
+        for code, weight, learn in book.getEntries(gs):
+            print(f"{Move.fromCode(code).getUciNotation()} weight {weight} learn {learn}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import os
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import ChessEngine
+import Perft
+import Search
+
+'''
+Process pool that splits the root moves of a position across workers, for perft and for search.
+Positions travel as GameState.toBytes snapshots and moves as packed codes, never as pickled GameStates.
+Workers share nothing: every process keeps its own Searcher and transposition table between calls
+'''
+_workerSearcher = None
+
+
+def _initWorker():
+    global _workerSearcher
+    _workerSearcher = Search.Searcher()
+
+
+def _perftWorker(data, codes, depth):
+    gs = ChessEngine.GameState.fromBytes(data)
+    buffers = [array('I') for _ in range(depth + 1)]
+    result = []
+    for code in codes:
+        gs.makeMoveCode(code)
+        moveStats = Perft.perft(gs, depth - 1, buffers=buffers)
+        gs.undoMove()
+        result.append((code, moveStats.asTuple()))
+    return result
+
+
+def _searchWorker(data, codes, timeLimit, maxDepth, maxNodes):
+    gs = ChessEngine.GameState.fromBytes(data)
+    iterations = []
+    result = _workerSearcher.search(gs, timeLimit, maxDepth, maxNodes,
+                                    onIteration=lambda r: iterations.append((r.depth, r.score, r.bestMove, r.pv)),
+                                    searchMoves=set(codes))
+    return iterations, result.nodes
+
+
+class ParallelPool():
+    def __init__(self, processes = None):
+        self.processes = processes or os.cpu_count() or 1
+        self.executor = None
+
+
+    def getExecutor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.processes, initializer=_initWorker)
+        return self.executor
+
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    '''
+    Deals the root moves round-robin into one group per process, captures and promotions spread evenly
+    '''
+    def splitRootMoves(self, gs):
+        codes = sorted(gs.getValidMoveCodes(), key=Search.captureOrderKey)
+        groups = [codes[i::self.processes] for i in range(self.processes)]
+        return [group for group in groups if group]
+
+
+    '''
+    Per root move perft statistics, as (move code, PerftStats) in generation order.
+    Like Perft.divide only node counts are meaningful at depth 1
+    '''
+    def divide(self, gs, depth):
+        if depth < 1:
+            raise ValueError("divide needs a depth of at least 1")
+        data = gs.toBytes()
+        groups = self.splitRootMoves(gs)
+        futures = [self.getExecutor().submit(_perftWorker, data, group, depth) for group in groups]
+        byCode = {}
+        for future in futures:
+            for code, values in future.result():
+                stats = Perft.PerftStats()
+                stats.nodes, stats.captures, stats.enpassant, stats.castles, stats.promotions, stats.checks = values
+                byCode[code] = stats
+        return [(code, byCode[code]) for code in gs.getValidMoveCodes()]
+
+
+    def perft(self, gs, depth):
+        if depth <= 1: # move kind counters of the last ply are taken in the parent, not worth a round trip
+            return Perft.perft(gs, depth)
+        stats = Perft.PerftStats()
+        for _, moveStats in self.divide(gs, depth):
+            stats.add(moveStats)
+        return stats
+
+
+    '''
+    Root splitting: every worker runs iterative deepening over its own share of root moves.
+    The answer is the best move at the deepest iteration all workers completed, nodes are summed over workers
+    '''
+    def search(self, gs, timeLimit = None, maxDepth = None, maxNodes = None):
+        if timeLimit is None and maxDepth is None and maxNodes is None:
+            timeLimit = Search.DEFAULT_TIME_LIMIT
+        start = time.perf_counter()
+        result = Search.SearchResult()
+        groups = self.splitRootMoves(gs)
+        if not groups:
+            return result
+        data = gs.toBytes()
+        workerNodes = None if maxNodes is None else max(1, maxNodes // len(groups))
+        futures = [self.getExecutor().submit(_searchWorker, data, group, timeLimit, maxDepth, workerNodes)
+                   for group in groups]
+        outcomes = [future.result() for future in futures]
+
+        result.nodes = sum(nodes for _, nodes in outcomes)
+        # a worker that found a mate stops deepening early, its last iteration is final
+        unfinished = [len(iterations) for iterations, _ in outcomes
+                      if not iterations or abs(iterations[-1][1]) < Search.MATE_SCORE - Search.MAX_PLY]
+        completedDepth = min(unfinished) if unfinished else Search.MAX_PLY
+        if completedDepth == 0: # some worker did not finish its first iteration, fall back to the first move
+            result.bestMove = groups[0][0]
+            result.pv = [result.bestMove]
+        else:
+            best = max((iterations[min(completedDepth, len(iterations)) - 1] for iterations, _ in outcomes),
+                       key=lambda iteration: iteration[1])
+            result.depth, result.score, result.bestMove, result.pv = best
+        result.elapsed = time.perf_counter() - start
+        return result
+
+
+defaultPool = None
+
+
+'''
+Pool shared by callers that do not manage their own, created on first use and kept for later calls
+'''
+def getDefaultPool(processes = None):
+    global defaultPool
+    if defaultPool is None or (processes is not None and defaultPool.processes != processes):
+        if defaultPool is not None:
+            defaultPool.close()
+        defaultPool = ParallelPool(processes)
+    return defaultPool
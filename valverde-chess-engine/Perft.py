@@ -0,0 +1,224 @@
+import argparse
+import sys
+import time
+from array import array
+import ChessEngine
+import Zobrist
+import Evaluation
+
+'''
+Standard perft positions with their known leaf counts per depth:
+(nodes, captures, en passant, castles, promotions, checks)
+'''
+PERFT_POSITIONS = [
+    ("startpos", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", {
+        1: (20, 0, 0, 0, 0, 0),
+        2: (400, 0, 0, 0, 0, 0),
+        3: (8902, 34, 0, 0, 0, 12),
+        4: (197281, 1576, 0, 0, 0, 469),
+        5: (4865609, 82719, 258, 0, 0, 27351)}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", {
+        1: (48, 8, 0, 2, 0, 0),
+        2: (2039, 351, 1, 91, 0, 3),
+        3: (97862, 17102, 45, 3162, 0, 993),
+        4: (4085603, 757163, 1929, 128013, 15172, 25523)}),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", {
+        1: (14, 1, 0, 0, 0, 2),
+        2: (191, 14, 0, 0, 0, 10),
+        3: (2812, 209, 2, 0, 0, 267),
+        4: (43238, 3348, 123, 0, 0, 1680),
+        5: (674624, 52051, 1165, 0, 0, 52950)}),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", {
+        1: (6, 0, 0, 0, 0, 0),
+        2: (264, 87, 0, 6, 48, 10),
+        3: (9467, 1021, 4, 0, 120, 38),
+        4: (422333, 131393, 0, 7795, 60032, 15492)}),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", {
+        1: (44, 6, 0, 1, 4, 0),
+        2: (1486, 222, 0, 0, 0, 117),
+        3: (62379, 8517, 0, 1081, 5068, 1201),
+        4: (2103487, 296153, 0, 0, 0, 158486)}),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", {
+        1: (46, 4, 0, 0, 0, 1),
+        2: (2079, 203, 0, 0, 0, 40),
+        3: (89890, 9470, 0, 0, 0, 1783),
+        4: (3894594, 440388, 0, 0, 0, 68985)}),
+]
+
+STAT_NAMES = ("nodes", "captures", "enpassant", "castles", "promotions", "checks")
+
+
+class PerftStats():
+    def __init__(self):
+        self.nodes = 0
+        self.captures = 0
+        self.enpassant = 0
+        self.castles = 0
+        self.promotions = 0
+        self.checks = 0
+
+
+    def asTuple(self):
+        return (self.nodes, self.captures, self.enpassant, self.castles, self.promotions, self.checks)
+
+
+    def add(self, other):
+        self.nodes += other.nodes
+        self.captures += other.captures
+        self.enpassant += other.enpassant
+        self.castles += other.castles
+        self.promotions += other.promotions
+        self.checks += other.checks
+
+
+def loadFen(fen):
+    return ChessEngine.GameState.fromFen(fen)
+
+
+'''
+Counts leaf nodes of the legal move tree, split by the kind of the last move played.
+Move codes for each ply go into one reused buffer. With verify, incrementally maintained state is checked
+against a full recompute after every move
+'''
+def perft(gs, depth, stats=None, buffers=None, verify=False):
+    if stats is None:
+        stats = PerftStats()
+    if depth == 0:
+        stats.nodes += 1
+        return stats
+    if buffers is None:
+        buffers = [array('I') for _ in range(depth + 1)]
+
+    moves = gs.getValidMoveCodes(buffers[depth])
+    if depth == 1:
+        for code in moves:
+            stats.nodes += 1
+            if code >> 24 != ChessEngine.EMPTY:
+                stats.captures += 1
+            if code & ChessEngine.MOVE_ENPASSANT:
+                stats.enpassant += 1
+            if code & ChessEngine.MOVE_CASTLE:
+                stats.castles += 1
+            if code & ChessEngine.MOVE_PROMOTION:
+                stats.promotions += 1
+            gs.makeMoveCode(code)
+            if verify:
+                verifyState(gs)
+            if gs.isInCheck():
+                stats.checks += 1
+            gs.undoMove()
+        return stats
+
+    for code in moves:
+        gs.makeMoveCode(code)
+        if verify:
+            verifyState(gs)
+        perft(gs, depth - 1, stats, buffers, verify)
+        gs.undoMove()
+    return stats
+
+
+def verifyState(gs):
+    expectedKey = Zobrist.computeKey(gs)
+    if gs.zobristKey != expectedKey:
+        moves = ' '.join(move.getUciNotation() for move in gs.moveLog)
+        raise AssertionError(f"zobrist key {gs.zobristKey:016x} != recomputed {expectedKey:016x} after {moves}")
+    expectedTerms = Evaluation.computeTerms(gs)
+    terms = (gs.material, gs.middlegameScore, gs.endgameScore, gs.phase)
+    if terms != expectedTerms:
+        moves = ' '.join(move.getUciNotation() for move in gs.moveLog)
+        raise AssertionError(f"evaluation terms {terms} != recomputed {expectedTerms} after {moves}")
+
+
+'''
+Node count for every root move, used to find where a move generator diverges from a reference engine
+'''
+def divide(gs, depth):
+    result = []
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        nodes = perft(gs, depth - 1).nodes if depth > 1 else 1
+        gs.undoMove()
+        result.append((move.getUciNotation(), nodes))
+    return result
+
+
+'''
+With processes, root moves are split across a pool of worker processes (verify is then not applied)
+'''
+def runSuite(maxDepth, positionNames=None, verify=False, out=sys.stdout, processes=None):
+    pool = None
+    if processes:
+        import Parallel # imported here, Parallel itself imports this module
+        pool = Parallel.getDefaultPool(processes)
+    failures = 0
+    totalNodes = 0
+    totalTime = 0.0
+    for name, fen, expected in PERFT_POSITIONS:
+        if positionNames and name not in positionNames:
+            continue
+        for depth in sorted(expected):
+            if depth > maxDepth:
+                break
+            gs = loadFen(fen)
+            start = time.perf_counter()
+            stats = pool.perft(gs, depth) if pool else perft(gs, depth, verify=verify)
+            elapsed = time.perf_counter() - start
+            totalNodes += stats.nodes
+            totalTime += elapsed
+            ok = stats.asTuple() == expected[depth]
+            if not ok:
+                failures += 1
+            nps = stats.nodes / elapsed if elapsed > 0 else 0.0
+            out.write(f"{name:<10} depth {depth}  nodes {stats.nodes:>9}  {elapsed:8.3f}s  {nps:>10.0f} nps  {'ok' if ok else 'FAIL'}\n")
+            if not ok:
+                for statName, got, want in zip(STAT_NAMES, stats.asTuple(), expected[depth]):
+                    if got != want:
+                        out.write(f"    {statName}: expected {want}, got {got}\n")
+
+    totalNps = totalNodes / totalTime if totalTime > 0 else 0.0
+    out.write(f"total nodes {totalNodes}  {totalTime:.3f}s  {totalNps:.0f} nps  failures {failures}\n")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft correctness and move generator throughput suite")
+    parser.add_argument("--depth", type=int, default=3, help="maximum depth to run for every position")
+    parser.add_argument("--position", action="append", help="run only the named position (repeatable)")
+    parser.add_argument("--fen", help="run a single FEN instead of the suite")
+    parser.add_argument("--divide", action="store_true", help="print node counts per root move for --fen")
+    parser.add_argument("--verify", action="store_true",
+                        help="debug mode, check incremental state such as the zobrist key against a full recompute")
+    parser.add_argument("--processes", type=int, help="split root moves across this many worker processes")
+    args = parser.parse_args(argv)
+
+    if args.fen:
+        gs = loadFen(args.fen)
+        pool = None
+        if args.processes:
+            import Parallel
+            pool = Parallel.getDefaultPool(args.processes)
+        if args.divide:
+            total = 0
+            if pool:
+                counts = [(ChessEngine.Move.fromCode(code).getUciNotation(), stats.nodes) for code, stats in pool.divide(gs, args.depth)]
+            else:
+                counts = divide(gs, args.depth)
+            for notation, nodes in counts:
+                print(f"{notation}: {nodes}")
+                total += nodes
+            print(f"total: {total}")
+        else:
+            start = time.perf_counter()
+            stats = pool.perft(gs, args.depth) if pool else perft(gs, args.depth, verify=args.verify)
+            elapsed = time.perf_counter() - start
+            for statName, value in zip(STAT_NAMES, stats.asTuple()):
+                print(f"{statName}: {value}")
+            print(f"time: {elapsed:.3f}s  nps: {stats.nodes / elapsed if elapsed > 0 else 0.0:.0f}")
+        return 0
+
+    return 1 if runSuite(args.depth, args.position, args.verify, processes=args.processes) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import re
+from ChessEngine import GameState, Move, EMPTY, PAWN, MOVE_CASTLE, MOVE_PROMOTION
+
+'''
+Standard algebraic notation and PGN reading and writing over GameState
+'''
+SAN_PIECES = 'PNBRQK'
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+
+_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_MOVE_NUMBER = re.compile(r'^\d+\.+')
+
+
+'''
+SAN of a legal move of gs, without the check suffix when withSuffix is False
+'''
+def toSan(gs, code, withSuffix = True):
+    start, end = code & 63, (code >> 6) & 63
+    moved = (code >> 20) & 15
+    pieceType = moved % 6
+    if code & MOVE_CASTLE:
+        san = 'O-O' if end & 7 == 6 else 'O-O-O'
+    else:
+        target = Move.colsToFiles[end & 7] + Move.rowsToRanks[end >> 3]
+        capture = code >> 24 != EMPTY
+        if pieceType == PAWN:
+            san = (Move.colsToFiles[start & 7] + 'x' if capture else '') + target
+            if code & MOVE_PROMOTION:
+                san += '=' + SAN_PIECES[((code >> 16) & 15) % 6]
+        else:
+            san = SAN_PIECES[pieceType]
+            others = [other & 63 for other in gs.getValidMoveCodes()
+                      if other != code and (other >> 20) & 15 == moved and (other >> 6) & 63 == end]
+            if others:
+                if all(other & 7 != start & 7 for other in others):
+                    san += Move.colsToFiles[start & 7]
+                elif all(other >> 3 != start >> 3 for other in others):
+                    san += Move.rowsToRanks[start >> 3]
+                else:
+                    san += Move.colsToFiles[start & 7] + Move.rowsToRanks[start >> 3]
+            san += ('x' if capture else '') + target
+    if withSuffix:
+        gs.makeMoveCode(code)
+        if gs.isInCheck():
+            san += '#' if len(gs.getValidMoveCodes()) == 0 else '+'
+        gs.undoMove()
+    return san
+
+
+'''
+Move code of a SAN string in gs, None when no legal move matches it
+'''
+def parseSan(gs, san):
+    san = san.rstrip('+#!?').replace('0', 'O')
+    if len(san) > 2 and san[-1] in 'NBRQ' and san[-2] != '=': # promotion written without '=', like e8Q
+        san = san[:-1] + '=' + san[-1]
+    for code in gs.getValidMoveCodes():
+        if toSan(gs, code, False) == san:
+            return code
+    return None
+
+
+'''
+Games of a PGN text stream as (tags, SAN moves, result)
+'''
+def readGames(stream):
+    tags = {}
+    movetext = []
+    for line in stream:
+        stripped = line.strip()
+        if stripped.startswith('['):
+            if movetext:
+                yield _finishGame(tags, movetext)
+                tags, movetext = {}, []
+            match = _TAG.match(stripped)
+            if match:
+                tags[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+        elif stripped and not stripped.startswith('%'):
+            movetext.append(line)
+    if tags or movetext:
+        yield _finishGame(tags, movetext)
+
+
+def _finishGame(tags, movetext):
+    text = ''.join(movetext)
+    text = re.sub(r'\{[^}]*\}', ' ', text)
+    text = re.sub(r';[^\n]*', ' ', text)
+    while '(' in text: # variations can nest, strip innermost first
+        stripped = re.sub(r'\([^()]*\)', ' ', text)
+        if stripped == text:
+            break
+        text = stripped
+    moves = []
+    result = tags.get('Result', '*')
+    for token in text.split():
+        token = _MOVE_NUMBER.sub('', token)
+        if not token or token.startswith('$'):
+            continue
+        if token in RESULTS:
+            result = token
+            continue
+        moves.append(token)
+    return tags, moves, result
+
+
+'''
+Replays SAN moves from the game's start position (FEN tag or the initial one), stopping at the first illegal one.
+Returns the GameState and the move codes played
+'''
+def replay(tags, sanMoves, maxPlies = None):
+    gs = GameState.fromFen(tags['FEN']) if 'FEN' in tags else GameState()
+    codes = []
+    for san in sanMoves:
+        if maxPlies is not None and len(codes) >= maxPlies:
+            break
+        code = parseSan(gs, san)
+        if code is None:
+            break
+        gs.makeMoveCode(code)
+        codes.append(code)
+    return gs, codes
+
+
+'''
+Writes one game with the seven tag roster first, moves wrapped at 80 columns
+'''
+def writeGame(out, tags, codes, result = '*', startFen = None):
+    tags = dict(tags)
+    tags['Result'] = result
+    if startFen is not None:
+        tags['SetUp'] = '1'
+        tags['FEN'] = startFen
+    for name in SEVEN_TAG_ROSTER:
+        value = tags.pop(name, '?' if name != 'Date' else '????.??.??')
+        out.write(f'[{name} "{_escape(value)}"]\n')
+    for name, value in tags.items():
+        out.write(f'[{name} "{_escape(value)}"]\n')
+    out.write('\n')
+
+    gs = GameState.fromFen(startFen) if startFen is not None else GameState()
+    tokens = []
+    for code in codes:
+        if gs.whiteToMove:
+            tokens.append(f"{gs.fullmoveNumber}.")
+        elif not tokens:
+            tokens.append(f"{gs.fullmoveNumber}...")
+        tokens.append(toSan(gs, code))
+        gs.makeMoveCode(code)
+    tokens.append(result)
+
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 80:
+            out.write(line + '\n')
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    out.write(line + '\n\n')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
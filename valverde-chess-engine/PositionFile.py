@@ -0,0 +1,113 @@
+import argparse
+import mmap
+import sys
+from ChessEngine import GameState, POSITION_BYTES
+
+'''
+Files of fixed-width binary positions (GameState.toBytes records laid end to end, no header).
+Reading goes through a memory map, so a record is only decoded when it is asked for
+'''
+
+
+def writePositions(path, positions, append = False):
+    count = 0
+    with open(path, 'ab' if append else 'wb') as f:
+        for position in positions:
+            f.write(position if isinstance(position, (bytes, bytearray)) else position.toBytes())
+            count += 1
+    return count
+
+
+class PositionFile():
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        size = self.file.seek(0, 2)
+        if size % POSITION_BYTES:
+            self.file.close()
+            raise ValueError(f"{path} is not a whole number of {POSITION_BYTES} byte positions")
+        self.count = size // POSITION_BYTES
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def __len__(self):
+        return self.count
+
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("position index out of range")
+        return GameState.fromBytes(self.data, index * POSITION_BYTES)
+
+
+    def raw(self, index):
+        return self.data[index * POSITION_BYTES:(index + 1) * POSITION_BYTES]
+
+
+    '''
+    Every position in file order. With gs, that one GameState is reloaded for each record
+    instead of building a new one, the caller must be done with it before taking the next
+    '''
+    def positions(self, gs = None):
+        for index in range(self.count):
+            if gs is None:
+                yield GameState.fromBytes(self.data, index * POSITION_BYTES)
+            else:
+                gs.loadBytes(self.data, index * POSITION_BYTES)
+                yield gs
+
+
+    def __iter__(self):
+        return self.positions()
+
+
+def readPositions(path, gs = None):
+    with PositionFile(path) as positionFile:
+        yield from positionFile.positions(gs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert between FEN lists (one per line) and binary position files")
+    parser.add_argument("source")
+    parser.add_argument("target")
+    parser.add_argument("--to-fen", action="store_true", help="read a binary file and write FENs, default is the reverse")
+    args = parser.parse_args(argv)
+
+    if args.to_fen:
+        with open(args.target, 'w') as out:
+            gs = GameState()
+            for position in readPositions(args.source, gs):
+                out.write(position.toFen() + '\n')
+        return 0
+
+    def loadEach(lines):
+        gs = GameState()
+        for line in lines:
+            fen = line.strip()
+            if fen and not fen.startswith('#'):
+                gs.loadFen(fen)
+                yield gs
+
+    with open(args.source) as lines:
+        count = writePositions(args.target, loadEach(lines))
+    print(f"{count} positions written to {args.target}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,418 @@
+import threading
+import time
+from array import array
+from ChessEngine import Move, TACTICAL_MOVES
+import Evaluation
+from MoveOrdering import MoveOrderer, captureOrderKey, isTactical
+from TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from Tablebase import WIN, LOSS
+
+MATE_SCORE = 100000
+TABLEBASE_WIN_SCORE = 20000 # known win by the tablebases, below every mate score
+INFINITY = 1000000
+MAX_PLY = 64
+DEFAULT_TIME_LIMIT = 1.0
+LIMIT_CHECK_INTERVAL = 1023 # nodes between clock and node budget checks, minus one
+
+
+class SearchAborted(Exception):
+    pass
+
+
+class SearchResult():
+    def __init__(self):
+        self.bestMove = None # packed move code
+        self.score = 0
+        self.depth = 0
+        self.nodes = 0
+        self.elapsed = 0.0
+        self.pv = []
+
+
+    @property
+    def nps(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+
+    def __str__(self):
+        pv = ' '.join(Move.fromCode(code).getUciNotation() for code in self.pv) or '-'
+        return f"depth {self.depth} score {self.score} nodes {self.nodes} nps {self.nps:.0f} time {self.elapsed:.2f}s pv {pv}"
+
+
+    def __repr__(self):
+        return self.__str__()
+
+
+'''
+Mate scores are stored relative to the node, so they stay right when the position is reached at another ply
+'''
+def scoreToTT(score, ply):
+    if score >= MATE_SCORE - MAX_PLY:
+        return score + ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def scoreFromTT(score, ply):
+    if score >= MATE_SCORE - MAX_PLY:
+        return score - ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score + ply
+    return score
+
+
+'''
+Iterative deepening negamax with alpha-beta pruning and a quiescence search over captures.
+Stops at the time limit, the node budget or the maximum depth, whichever comes first,
+and always answers with the best move of the last completed iteration.
+orderMoves=False searches the main tree in generation order, only meant for measuring what ordering saves.
+With a tablebase, WDL is probed inside the tree after captures and pawn moves and the root move is picked by DTZ
+when the position is in the tables
+'''
+class Searcher():
+    def __init__(self, tt = None, orderMoves = True, tablebase = None):
+        self.tt = tt if tt is not None else TranspositionTable()
+        self.ordering = MoveOrderer(MAX_PLY) if orderMoves else None
+        self.tablebase = tablebase
+        self.nodes = 0
+        self.deadline = None
+        self.maxNodes = None
+        self.stopRequested = False
+        self.moveBuffers = [array('I') for _ in range(MAX_PLY + 1)]
+
+
+    '''
+    searchMoves restricts the root to the given move codes
+    '''
+    def search(self, gs, timeLimit = None, maxDepth = None, maxNodes = None, onIteration = None, searchMoves = None):
+        start = time.perf_counter()
+        self.nodes = 0
+        self.deadline = start + timeLimit if timeLimit is not None else None
+        self.maxNodes = maxNodes
+        self.tt.newSearch()
+        if self.ordering is not None:
+            self.ordering.newSearch()
+        maxDepth = min(maxDepth, MAX_PLY) if maxDepth is not None else MAX_PLY
+
+        result = SearchResult()
+        checkMate, staleMate = gs.checkMate, gs.staleMate
+        rootMoves = list(gs.getValidMoveCodes())
+        if self.ordering is not None:
+            rootMoves.sort(key=captureOrderKey)
+        if searchMoves is not None:
+            rootMoves = [code for code in rootMoves if code in searchMoves]
+        if len(rootMoves) == 0:
+            return result
+        result.bestMove = rootMoves[0]
+
+        if searchMoves is None and self.probeRoot(gs, result):
+            gs.checkMate, gs.staleMate = checkMate, staleMate
+            result.elapsed = time.perf_counter() - start
+            if onIteration is not None:
+                onIteration(result)
+            return result
+
+        logLength = len(gs.undoStack)
+        try:
+            for depth in range(1, maxDepth + 1):
+                score, bestMove = self.searchRoot(gs, rootMoves, depth)
+                result.bestMove = bestMove
+                result.score = score
+                result.depth = depth
+                result.nodes = self.nodes
+                result.elapsed = time.perf_counter() - start
+                self.tt.store(gs.zobristKey, bestMove, scoreToTT(score, 0), depth, EXACT)
+                result.pv = self.getPrincipalVariation(gs, depth)
+                if onIteration is not None:
+                    onIteration(result)
+                # search the best move first in the next iteration
+                rootMoves.remove(bestMove)
+                rootMoves.insert(0, bestMove)
+                if abs(score) >= MATE_SCORE - MAX_PLY: # forced mate found, deeper search cannot improve it
+                    break
+        except SearchAborted:
+            while len(gs.undoStack) > logLength:
+                gs.undoMove()
+
+        if not result.pv:
+            result.pv = [result.bestMove]
+        gs.checkMate, gs.staleMate = checkMate, staleMate
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        return result
+
+
+    '''
+    A stop request stays until resetStop, search itself never clears it: a stop sent before a background thread
+    got into search still ends that search. Whoever starts such a thread calls resetStop first
+    '''
+    def stop(self):
+        self.stopRequested = True
+
+
+    def resetStop(self):
+        self.stopRequested = False
+
+
+    def isTablebasePosition(self, gs):
+        return self.tablebase is not None and \
+            (gs.colorBitboards[0] | gs.colorBitboards[1]).bit_count() <= self.tablebase.maxPieces
+
+
+    '''
+    WDL inside the tree, only right after a capture or pawn move: the tables assume a fresh fifty-move count,
+    so further on a win they report may already be a draw. The root goes by DTZ, which counts the plies left
+    '''
+    def canProbeWdl(self, gs):
+        return gs.halfmoveClock == 0 and not gs.castlingRights and self.isTablebasePosition(gs)
+
+
+    '''
+    Fills result from the tablebases when they cover the root, returns whether they did
+    '''
+    def probeRoot(self, gs, result):
+        if not self.isTablebasePosition(gs):
+            return False
+        root = self.tablebase.probeRoot(gs)
+        if root is None:
+            return False
+        code, wdl, plies = root
+        result.bestMove = code
+        if wdl == WIN:
+            result.score = TABLEBASE_WIN_SCORE - plies
+        elif wdl == LOSS:
+            result.score = -TABLEBASE_WIN_SCORE + plies
+        else: # draws, and wins or losses the fifty-move rule turns into draws
+            result.score = 0
+        result.depth = 1
+        result.pv = [code]
+        return True
+
+
+    def tablebaseScore(self, gs, ply):
+        wdl = self.tablebase.probeWdl(gs)
+        if wdl is None:
+            return None
+        if wdl == WIN:
+            return TABLEBASE_WIN_SCORE - ply
+        if wdl == LOSS:
+            return -TABLEBASE_WIN_SCORE + ply
+        return 0 # cursed wins and blessed losses are draws under the fifty-move rule
+
+
+    def checkLimits(self):
+        if self.stopRequested or (self.deadline is not None and time.perf_counter() >= self.deadline) or \
+                (self.maxNodes is not None and self.nodes >= self.maxNodes):
+            raise SearchAborted()
+
+
+    def searchRoot(self, gs, rootMoves, depth):
+        alpha = -INFINITY
+        bestMove = rootMoves[0]
+        for code in rootMoves:
+            gs.makeMoveCode(code)
+            score = -self.negamax(gs, depth - 1, -INFINITY, -alpha, 1)
+            gs.undoMove()
+            if score > alpha:
+                alpha = score
+                bestMove = code
+        return alpha, bestMove
+
+
+    def negamax(self, gs, depth, alpha, beta, ply):
+        if gs.isDrawByRule(2): # before the horizon, a quiet move can repeat the position there
+            return 0
+        if depth <= 0:
+            return self.quiescence(gs, alpha, beta, ply)
+
+        self.nodes += 1
+        if self.nodes & LIMIT_CHECK_INTERVAL == 0:
+            self.checkLimits()
+
+        key = gs.zobristKey
+        hashMove = 0
+        entry = self.tt.probe(key)
+        if entry is not None:
+            hashMove = entry.move
+            if entry.depth >= depth:
+                score = scoreFromTT(entry.score, ply)
+                if entry.bound == EXACT or (entry.bound == LOWER_BOUND and score >= beta) or \
+                        (entry.bound == UPPER_BOUND and score <= alpha):
+                    return score
+
+        if self.tablebase is not None and self.canProbeWdl(gs):
+            score = self.tablebaseScore(gs, ply)
+            if score is not None:
+                return score
+        if ply >= MAX_PLY:
+            return Evaluation.evaluate(gs)
+        if self.ordering is not None:
+            moves = self.ordering.orderedMoves(gs, ply, hashMove)
+        else:
+            moves = gs.getValidMoveCodes(self.moveBuffers[ply])
+
+        alphaOrig = alpha
+        bestMove = 0
+        moveCount = 0
+        for code in moves:
+            moveCount += 1
+            gs.makeMoveCode(code)
+            score = -self.negamax(gs, depth - 1, -beta, -alpha, ply + 1)
+            gs.undoMove()
+            if score >= beta:
+                if self.ordering is not None and not isTactical(code):
+                    self.ordering.recordCutoff(code, depth, ply)
+                self.tt.store(key, code, scoreToTT(beta, ply), depth, LOWER_BOUND)
+                return beta
+            if score > alpha:
+                alpha = score
+                bestMove = code
+        if moveCount == 0:
+            return -MATE_SCORE + ply if gs.isInCheck() else 0
+        self.tt.store(key, bestMove, scoreToTT(alpha, ply), depth, EXACT if alpha > alphaOrig else UPPER_BOUND)
+        return alpha
+
+
+    def quiescence(self, gs, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & LIMIT_CHECK_INTERVAL == 0:
+            self.checkLimits()
+
+        if self.tablebase is not None and self.canProbeWdl(gs): # a capture can reach the tables at the horizon
+            score = self.tablebaseScore(gs, ply)
+            if score is not None:
+                return score
+        standPat = Evaluation.evaluate(gs)
+        if standPat >= beta:
+            return beta
+        if standPat > alpha:
+            alpha = standPat
+        if ply >= MAX_PLY:
+            return alpha
+
+        if self.ordering is not None:
+            captures = self.ordering.orderedCaptures(gs, ply)
+        else: # still by MVV-LVA, unordered captures make the quiescence search explode
+            captures = sorted(gs.getValidMoveCodes(self.moveBuffers[ply], TACTICAL_MOVES), key=captureOrderKey)
+        for code in captures:
+            gs.makeMoveCode(code)
+            score = -self.quiescence(gs, -beta, -alpha, ply + 1)
+            gs.undoMove()
+            if score >= beta:
+                return beta
+            if score > alpha:
+                alpha = score
+        return alpha
+
+
+    '''
+    Follows best moves stored in the table from the current position, checking each one is legal
+    '''
+    def getPrincipalVariation(self, gs, maxLength):
+        pv = []
+        seen = set()
+        while len(pv) < maxLength and gs.zobristKey not in seen:
+            entry = self.tt.probe(gs.zobristKey)
+            if entry is None or not entry.move or entry.move not in gs.getValidMoveCodes():
+                break
+            seen.add(gs.zobristKey)
+            pv.append(entry.move)
+            gs.makeMoveCode(entry.move)
+        for _ in pv:
+            gs.undoMove()
+        return pv
+
+
+defaultSearcher = None
+
+
+'''
+Counterpart of RandomMoveFinder.findMove, but not a drop-in one: the moves alone do not give the position,
+so callers must pass gs as well. Searches it for at most timeLimit seconds or maxDepth plies and returns
+the entry of validMoves for the best move
+'''
+def findMove(validMoves, gs, timeLimit = None, maxDepth = None, verbose = False):
+    if timeLimit is None and maxDepth is None:
+        timeLimit = DEFAULT_TIME_LIMIT
+    global defaultSearcher
+    if defaultSearcher is None: # kept between calls so the transposition table carries over from move to move
+        defaultSearcher = Searcher()
+    result = defaultSearcher.search(gs, timeLimit, maxDepth, onIteration=print if verbose else None)
+    if result.bestMove is None:
+        return None
+    for move in validMoves:
+        if move.code == result.bestMove:
+            return move
+    return Move.fromCode(result.bestMove)
+
+
+'''
+Searches on a background thread over a snapshot of the position, so a caller such as the pygame loop keeps running.
+poll hands over the best move once the search is done and the position is still the one it was started on
+'''
+class SearchWorker():
+    def __init__(self, searcher = None):
+        self.searcher = searcher if searcher is not None else Searcher()
+        self.thread = None
+        self.result = None
+        self.key = None
+        self.startTime = 0.0
+        self.completedDepth = 0
+
+
+    def start(self, gs, timeLimit = None, maxDepth = None):
+        self.cancel()
+        if timeLimit is None and maxDepth is None:
+            timeLimit = DEFAULT_TIME_LIMIT
+        snapshot = gs.copy() # keeps the played moves, the search needs them to see repetitions
+        self.key = gs.zobristKey
+        self.result = None
+        self.completedDepth = 0
+        self.startTime = time.perf_counter()
+        self.searcher.resetStop()
+        self.thread = threading.Thread(target=self.run, args=(snapshot, timeLimit, maxDepth), daemon=True)
+        self.thread.start()
+
+
+    def run(self, gs, timeLimit, maxDepth):
+        self.result = self.searcher.search(gs, timeLimit, maxDepth, onIteration=self.recordIteration)
+
+
+    def recordIteration(self, result):
+        self.completedDepth = result.depth
+
+
+    @property
+    def isThinking(self):
+        return self.thread is not None and self.thread.is_alive()
+
+
+    '''
+    Best move code of the finished search, None while it runs or when gs moved on since it started
+    '''
+    def poll(self, gs):
+        if self.thread is None or self.thread.is_alive():
+            return None
+        self.thread = None
+        result, self.result = self.result, None
+        if result is None or self.key != gs.zobristKey:
+            return None
+        return result.bestMove
+
+
+    '''
+    Live (completed depth, nodes, nodes per second) of the running search
+    '''
+    def progress(self):
+        elapsed = time.perf_counter() - self.startTime
+        nodes = self.searcher.nodes
+        return self.completedDepth, nodes, nodes / elapsed if elapsed > 0 else 0.0
+
+
+    def cancel(self):
+        if self.thread is not None:
+            self.searcher.stop()
+            self.thread.join()
+            self.thread = None
+        self.result = None
@@ -0,0 +1,933 @@
+import argparse
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from collections import OrderedDict
+from math import comb
+from ChessEngine import PAWN, WHITE, BLACK, EMPTY, FIFTY_MOVE_PLIES, MOVE_ENPASSANT, TACTICAL_MOVES
+
+'''
+Syzygy endgame tablebases: a WDL file (.rtbw) and a DTZ file (.rtbz) per material, as published for up to 7 men.
+Files are memory mapped, positions are indexed the way the Syzygy probing code does it and the values are
+Huffman coded in blocks. A probe decodes the whole block it lands in and keeps it in a bounded LRU cache,
+so the next probe into the same block is a lookup. Syzygy squares count from a1, GameState rows from rank 8,
+so squares flip with sq ^ 56
+'''
+WDL_MAGIC = b'\x71\xe8\x23\x5d'
+DTZ_MAGIC = b'\xd7\x66\x0c\xa5'
+WDL_SUFFIX, DTZ_SUFFIX = '.rtbw', '.rtbz'
+TABLE_NAME = re.compile(r'^K[QRBNP]*vK[QRBNP]*$')
+DEFAULT_CACHE_BLOCKS = 256
+
+'''
+WDL for the side to move, assuming the last move reset the fifty-move counter.
+A cursed win is a win only without the fifty-move rule, a blessed loss is the other side of it
+'''
+LOSS, BLESSED_LOSS, DRAW, CURSED_WIN, WIN = -2, -1, 0, 1, 2
+WDL_NAMES = {LOSS: 'loss', BLESSED_LOSS: 'blessed loss', DRAW: 'draw', CURSED_WIN: 'cursed win', WIN: 'win'}
+
+UINT16 = struct.Struct('<H')
+UINT32 = struct.Struct('<I')
+UINT32_BE = struct.Struct('>I')
+UINT64_BE = struct.Struct('>Q')
+INDEX_ENTRY = struct.Struct('<IH') # first block of an index chunk and the offset of the chunk's middle in it
+MASK64 = (1 << 64) - 1
+
+KEY_ORDER = ((6, 'K'), (5, 'Q'), (4, 'R'), (3, 'B'), (2, 'N'), (1, 'P')) # Syzygy piece codes, black ones have bit 3 set
+LEADING_GROUP_SIZE = (31332, None, 462) # placements of the leading group by encoding type: three unique pieces or two kings
+WDL_TO_MAP = (1, 3, 0, 2, 0) # DTZ value map used for a WDL
+PLIES_FLAGS = (8, 0, 0, 0, 4) # DTZ flag meaning a WDL's values are plies, not moves
+
+'''
+Squares of the a1-d1-d4 triangle the first leading piece is moved into, the diagonals and the lower half
+'''
+TRIANGLE = (
+    6, 0, 1, 2, 2, 1, 0, 6,
+    0, 7, 3, 4, 4, 3, 7, 0,
+    1, 3, 8, 5, 5, 8, 3, 1,
+    2, 4, 5, 9, 9, 5, 4, 2,
+    2, 4, 5, 9, 9, 5, 4, 2,
+    1, 3, 8, 5, 5, 8, 3, 1,
+    0, 7, 3, 4, 4, 3, 7, 0,
+    6, 0, 1, 2, 2, 1, 0, 6,
+)
+TRIANGLE_SQUARES = (1, 2, 3, 10, 11, 19, 0, 9, 18, 27)
+LOWER = (
+    28,  0,  1,  2,  3,  4,  5,  6,
+     0, 29,  7,  8,  9, 10, 11, 12,
+     1,  7, 30, 13, 14, 15, 16, 17,
+     2,  8, 13, 31, 18, 19, 20, 21,
+     3,  9, 14, 18, 32, 22, 23, 24,
+     4, 10, 15, 19, 22, 33, 25, 26,
+     5, 11, 16, 20, 23, 25, 34, 27,
+     6, 12, 17, 21, 24, 26, 27, 35,
+)
+DIAG = (
+     0,  0,  0,  0,  0,  0,  0,  8,
+     0,  1,  0,  0,  0,  0,  9,  0,
+     0,  0,  2,  0,  0, 10,  0,  0,
+     0,  0,  0,  3, 11,  0,  0,  0,
+     0,  0,  0, 12,  4,  0,  0,  0,
+     0,  0, 13,  0,  0,  5,  0,  0,
+     0, 14,  0,  0,  0,  0,  6,  0,
+    15,  0,  0,  0,  0,  0,  0,  7,
+)
+
+'''
+Pawn squares: the leading pawn's file and rank, and the order the other leading pawns are counted in
+'''
+FLAP = (
+    0,  0,  0,  0,  0,  0,  0, 0,
+    0,  6, 12, 18, 18, 12,  6, 0,
+    1,  7, 13, 19, 19, 13,  7, 1,
+    2,  8, 14, 20, 20, 14,  8, 2,
+    3,  9, 15, 21, 21, 15,  9, 3,
+    4, 10, 16, 22, 22, 16, 10, 4,
+    5, 11, 17, 23, 23, 17, 11, 5,
+    0,  0,  0,  0,  0,  0,  0, 0,
+)
+PTWIST = (
+     0,  0,  0,  0,  0,  0,  0,  0,
+    47, 35, 23, 11, 10, 22, 34, 46,
+    45, 33, 21,  9,  8, 20, 32, 44,
+    43, 31, 19,  7,  6, 18, 30, 42,
+    41, 29, 17,  5,  4, 16, 28, 40,
+    39, 27, 15,  3,  2, 14, 26, 38,
+    37, 25, 13,  1,  0, 12, 24, 36,
+     0,  0,  0,  0,  0,  0,  0,  0,
+)
+
+
+def offDiagonal(sq):
+    return (sq >> 3) - (sq & 7)
+
+
+def flipDiagonal(sq):
+    return ((sq >> 3) | (sq << 3)) & 63
+
+
+'''
+Index of two kings with the first in the triangle: 462 legal pairs, the ones with both kings on the a1-h8
+diagonal counted last, the second king never above it while the first is on it
+'''
+def kingPairIndex():
+    index = [[-1] * 64 for _ in TRIANGLE_SQUARES]
+    count = 0
+    bothOnDiagonal = []
+    for triangle, first in enumerate(TRIANGLE_SQUARES):
+        for second in range(64):
+            if abs((first >> 3) - (second >> 3)) <= 1 and abs((first & 7) - (second & 7)) <= 1:
+                continue
+            if offDiagonal(first) == 0 and offDiagonal(second) > 0:
+                continue
+            if offDiagonal(first) == 0 and offDiagonal(second) == 0:
+                bothOnDiagonal.append((triangle, second))
+                continue
+            index[triangle][second] = count
+            count += 1
+    for triangle, second in bothOnDiagonal:
+        index[triangle][second] = count
+        count += 1
+    return index
+
+
+'''
+Placements of 1 to 5 leading pawns before the first one's FLAP square, and their total per leading file
+'''
+def leadingPawnIndex():
+    index = [[0] * 24 for _ in range(5)]
+    sizes = [[0] * 4 for _ in range(5)]
+    for others in range(5):
+        for pawnFile in range(4):
+            total = 0
+            for flap in range(pawnFile * 6, pawnFile * 6 + 6):
+                index[others][flap] = total
+                square = 8 * (flap % 6 + 1) + flap // 6
+                total += comb(PTWIST[square], others) if others else 1
+            sizes[others][pawnFile] = total
+    return index, sizes
+
+
+KING_PAIR_INDEX = kingPairIndex()
+PAWN_INDEX, PAWN_FACTOR = leadingPawnIndex()
+
+
+'''
+Material key of the position, white first, in Syzygy naming order like KRvK
+'''
+def materialKey(gs):
+    sides = []
+    for color in (WHITE, BLACK):
+        sides.append(''.join(letter * gs.pieceBitboards[color*6 + code - 1].bit_count() for code, letter in KEY_ORDER))
+    return sides[0] + 'v' + sides[1]
+
+
+def piecesKey(pieces):
+    sides = []
+    for color in (0, 8):
+        sides.append(''.join(letter * pieces.count(color | code) for code, letter in KEY_ORDER))
+    return sides[0] + 'v' + sides[1]
+
+
+def isZeroing(code):
+    return code >> 24 != EMPTY or ((code >> 20) & 15) % 6 == PAWN
+
+
+def isMate(gs):
+    return gs.isInCheck() and not gs.hasLegalMove()
+
+
+'''
+Value of a position lost or won right after a zeroing move, in DTZ terms
+'''
+def dtzBeforeZeroing(wdl):
+    if wdl == DRAW:
+        return 0
+    plies = 1 if abs(wdl) == WIN else FIFTY_MOVE_PLIES + 1
+    return plies if wdl > 0 else -plies
+
+
+class MissingTable(Exception):
+    pass
+
+
+'''
+One Huffman coded value table. Symbols are sorted by code length, longest first, and the canonical codes
+of a length count up from its base, so a code's length is the first whose base it reaches.
+A symbol is either a value or a pair of symbols standing for a run of up to 256 values
+'''
+class PairsData():
+    def __init__(self, data, p, tableSize, isDtz):
+        self.data = data
+        self.isDtz = isDtz
+        self.flags = data[p]
+        self.indexTable = self.sizeTable = self.blocks = 0 # set once the file layout is known
+        if self.flags & 0x80: # every position has the same value
+            self.constant = 0 if isDtz else data[p + 1]
+            self.next = p + 2
+            self.indexBytes = self.sizeBytes = self.dataBytes = 0
+            return
+        self.constant = None
+        self.blockSize = data[p + 1]
+        self.indexBits = data[p + 2]
+        realBlocks = UINT32.unpack_from(data, p + 4)[0]
+        maxLength, minLength = data[p + 8], data[p + 9]
+        lengths = maxLength - minLength + 1
+        symbols = UINT16.unpack_from(data, p + 10 + 2 * lengths)[0]
+        self.symbolTable = p + 12 + 2 * lengths
+        self.next = self.symbolTable + 3 * symbols + (symbols & 1)
+        self.indexBytes = 6 * ((tableSize + (1 << self.indexBits) - 1) >> self.indexBits)
+        self.sizeBytes = 2 * (realBlocks + data[p + 3]) # padding entries let index lookups step past the last block
+        self.dataBytes = realBlocks << self.blockSize
+
+        firstSymbol = [UINT16.unpack_from(data, p + 10 + 2 * i)[0] for i in range(lengths)]
+        base = [0] * lengths
+        for i in range(lengths - 2, -1, -1):
+            base[i] = (base[i + 1] + firstSymbol[i] - firstSymbol[i + 1]) // 2
+        self.minLength = minLength
+        self.base = [0] * minLength + [base[i] << (64 - minLength - i) for i in range(lengths)] # indexed by code length
+        self.firstSymbol = [0] * minLength + firstSymbol
+        self.expansions = [None] * symbols
+
+
+    def blockValues(self, block):
+        return UINT16.unpack_from(self.data, self.sizeTable + 2 * block)[0] + 1
+
+
+    '''
+    Block holding the index and the index's offset in it. The index table points at the middle of every
+    2^indexBits chunk, from there the block sizes are walked forwards or backwards
+    '''
+    def locate(self, index):
+        block, offset = INDEX_ENTRY.unpack_from(self.data, self.indexTable + 6 * (index >> self.indexBits))
+        offset += (index & ((1 << self.indexBits) - 1)) - (1 << (self.indexBits - 1))
+        while offset < 0:
+            block -= 1
+            offset += self.blockValues(block)
+        count = self.blockValues(block)
+        while offset >= count:
+            offset -= count
+            block += 1
+            count = self.blockValues(block)
+        return block, offset
+
+
+    def expand(self, symbol):
+        values = self.expansions[symbol]
+        if values is None:
+            data = self.data
+            p = self.symbolTable + 3 * symbol
+            left = ((data[p + 1] & 0x0f) << 8) | data[p]
+            right = (data[p + 2] << 4) | (data[p + 1] >> 4)
+            if right == 0xfff: # a value: 12 bits in DTZ tables, a byte in WDL tables
+                values = (left if self.isDtz else data[p],)
+            else:
+                values = self.expand(left) + self.expand(right)
+            self.expansions[symbol] = values
+        return values
+
+
+    '''
+    All values of a block. Codes are read most significant bit first through a 64 bit window
+    that is refilled 32 bits at a time
+    '''
+    def decode(self, block):
+        data = self.data
+        base = self.base
+        firstSymbol = self.firstSymbol
+        minLength = self.minLength
+        count = self.blockValues(block)
+        values = array('H') if self.isDtz else bytearray()
+        p = self.blocks + (block << self.blockSize)
+        code = UINT64_BE.unpack_from(data, p)[0]
+        p += 8
+        used = 0 # bits shifted out since the last refill
+        while len(values) < count:
+            length = minLength
+            while code < base[length]:
+                length += 1
+            values.extend(self.expand(firstSymbol[length] + ((code - base[length]) >> (64 - length))))
+            code = (code << length) & MASK64
+            used += length
+            if used >= 32:
+                used -= 32
+                code |= UINT32_BE.unpack_from(data, p)[0] << used
+                p += 4
+        return values
+
+
+'''
+How one side to move of a table, or of one leading pawn file, is indexed: the pieces in index order,
+their grouping (norm), the multiplier of each group and the values
+'''
+class TableEncoding():
+    def __init__(self, pieces, norm, factor, size):
+        self.pieces = pieces
+        self.norm = norm
+        self.factor = factor
+        self.size = size
+        self.pairs = None
+        self.maps = None # DTZ value maps by WDL, (start, wide) when the table has them
+
+
+'''
+How a table is indexed as far as its name decides it: the piece counts, which pawns lead and for pawnless
+tables the encoding type, three unique pieces or the two kings leading
+'''
+class TableShape():
+    def __init__(self, name):
+        first, second = name.split('v')
+        self.key = name
+        self.mirroredKey = second + 'v' + first
+        self.symmetric = first == second
+        self.pieceCount = len(name) - 1
+        self.hasPawns = 'P' in name
+        if self.hasPawns: # the side with fewer pawns leads, the second side when both have as many
+            self.pawns = [second.count('P'), first.count('P')]
+            if self.pawns[1] and (not self.pawns[0] or self.pawns[1] < self.pawns[0]):
+                self.pawns.reverse()
+        else:
+            unique = sum(side.count(letter) == 1 for side in (first, second) for letter in 'KQRBNP')
+            self.encType = 0 if unique >= 3 else 2
+
+
+    def norm(self, pieces):
+        norm = [0] * self.pieceCount
+        if self.hasPawns:
+            norm[0] = self.pawns[0]
+            if self.pawns[1]:
+                norm[self.pawns[0]] = self.pawns[1]
+            i = self.pawns[0] + self.pawns[1]
+        else:
+            norm[0] = 3 if self.encType == 0 else 2
+            i = norm[0]
+        while i < self.pieceCount:
+            j = i
+            while j < self.pieceCount and pieces[j] == pieces[i]:
+                norm[i] += 1
+                j += 1
+            i += norm[i]
+        return norm
+
+
+    '''
+    Multipliers of the groups, order and secondOrder give where the leading group and the other side's pawns
+    come in the index. Returns the factors and the table size
+    '''
+    def factors(self, norm, order, secondOrder, pawnFile):
+        factor = [0] * self.pieceCount
+        i = norm[0]
+        if secondOrder < 0x0f:
+            i += norm[i]
+        free = 64 - i
+        size = 1
+        k = 0
+        while i < self.pieceCount or k == order or k == secondOrder:
+            if k == order:
+                factor[0] = size
+                size *= PAWN_FACTOR[norm[0] - 1][pawnFile] if self.hasPawns else LEADING_GROUP_SIZE[self.encType]
+            elif k == secondOrder:
+                factor[norm[0]] = size
+                size *= comb(48 - norm[0], norm[norm[0]])
+            else:
+                factor[i] = size
+                size *= comb(free, norm[i])
+                free -= norm[i]
+                i += norm[i]
+            k += 1
+        return factor, size
+
+
+    def encoding(self, pieces, order = 0, secondOrder = 0x0f, pawnFile = 0):
+        norm = self.norm(pieces)
+        factor, size = self.factors(norm, order, secondOrder, pawnFile)
+        return TableEncoding(pieces, norm, factor, size)
+
+
+    def pieceSquares(self, gs, pieces, colorFlip, mirror, squares):
+        i = len(squares)
+        while i < len(pieces):
+            piece = pieces[i] ^ colorFlip
+            bitboard = gs.pieceBitboards[(piece >> 3) * 6 + (piece & 7) - 1]
+            while bitboard:
+                low = bitboard & -bitboard
+                bitboard ^= low
+                squares.append((low.bit_length() - 1) ^ mirror)
+            i = len(squares)
+        return squares
+
+
+    '''
+    Index of the pieces after all pieces together below the groups before them, floor skips the first rank
+    for the second side's pawns
+    '''
+    def groupIndex(self, encoding, squares, i, floor = 0):
+        index = 0
+        while i < self.pieceCount:
+            count = encoding.norm[i]
+            group = sorted(squares[i:i + count])
+            placement = 0
+            for m, sq in enumerate(group):
+                below = sum(sq > other for other in squares[:i])
+                placement += comb(sq - below - floor, m + 1)
+            index += placement * encoding.factor[i]
+            i += count
+            if floor:
+                break
+        return index
+
+
+    '''
+    Without pawns the board is turned so the first piece lands in the a1-d1-d4 triangle and the leading group
+    below the a1-h8 diagonal
+    '''
+    def encodePieces(self, encoding, squares):
+        if squares[0] & 0x04:
+            squares = [sq ^ 0x07 for sq in squares]
+        if squares[0] & 0x20:
+            squares = [sq ^ 0x38 for sq in squares]
+        leading = 3 if self.encType == 0 else 2
+        for sq in squares[:leading]:
+            if offDiagonal(sq):
+                if offDiagonal(sq) > 0:
+                    squares = [flipDiagonal(sq) for sq in squares]
+                break
+
+        if self.encType == 0:
+            a, b, c = squares[0], squares[1], squares[2]
+            i = int(b > a)
+            j = int(c > a) + int(c > b)
+            if offDiagonal(a):
+                index = TRIANGLE[a] * 63 * 62 + (b - i) * 62 + (c - j)
+            elif offDiagonal(b):
+                index = 6 * 63 * 62 + DIAG[a] * 28 * 62 + LOWER[b] * 62 + c - j
+            elif offDiagonal(c):
+                index = 6 * 63 * 62 + 4 * 28 * 62 + DIAG[a] * 7 * 28 + (DIAG[b] - i) * 28 + LOWER[c]
+            else:
+                index = 6 * 63 * 62 + 4 * 28 * 62 + 4 * 7 * 28 + DIAG[a] * 7 * 6 + (DIAG[b] - i) * 6 + (DIAG[c] - j)
+        else:
+            index = KING_PAIR_INDEX[TRIANGLE[squares[0]]][squares[1]]
+        return index * encoding.factor[0] + self.groupIndex(encoding, squares, leading)
+
+
+    '''
+    With pawns the board is only mirrored so the leading pawn is on files a-d
+    '''
+    def encodePawns(self, encoding, squares):
+        if squares[0] & 0x04:
+            squares = [sq ^ 0x07 for sq in squares]
+        lead = self.pawns[0]
+        squares[1:lead] = sorted(squares[1:lead], key=PTWIST.__getitem__, reverse=True)
+        index = PAWN_INDEX[lead - 1][FLAP[squares[0]]]
+        for i in range(lead - 1, 0, -1):
+            index += comb(PTWIST[squares[i]], lead - i)
+        index *= encoding.factor[0]
+        if self.pawns[1]:
+            index += self.groupIndex(encoding, squares, lead, 8)
+        return index + self.groupIndex(encoding, squares, lead + self.pawns[1])
+
+
+'''
+One memory mapped table file. The layout is read on the first probe, opening a directory of tables only checks magics
+'''
+class TableFile(TableShape):
+    def __init__(self, path, isDtz):
+        super().__init__(os.path.splitext(os.path.basename(path))[0])
+        self.path = path
+        self.isDtz = isDtz
+        with open(path, 'rb') as stream:
+            self.data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:4] != (DTZ_MAGIC if isDtz else WDL_MAGIC):
+            self.data.close()
+            raise ValueError(f"{path} is not a Syzygy {'DTZ' if isDtz else 'WDL'} table")
+        self.files = None # encodings per leading pawn file and side to move
+
+
+    def close(self):
+        self.data.close()
+
+
+    def readEncoding(self, p, shift, pawnFile):
+        data = self.data
+        order = (data[p] >> shift) & 0x0f
+        skip = 1
+        secondOrder = 0x0f
+        if self.hasPawns and self.pawns[1]:
+            secondOrder = (data[p + 1] >> shift) & 0x0f
+            skip = 2
+        pieces = [(data[p + skip + i] >> shift) & 0x0f for i in range(self.pieceCount)]
+        return self.encoding(pieces, order, secondOrder, pawnFile)
+
+
+    '''
+    Header: magic, a flags byte (bit 0 both sides to move stored, bit 1 pawns), the pieces of every encoding,
+    then the Huffman tables of all encodings, DTZ value maps, index tables, block sizes and the 64 byte aligned blocks
+    '''
+    def readLayout(self):
+        data = self.data
+        sides = 1 if self.isDtz else 1 + (data[4] & 1)
+        p = 5
+        files = []
+        for pawnFile in range(4 if self.hasPawns else 1):
+            files.append([self.readEncoding(p, shift, pawnFile) for shift in (0, 4)[:sides]])
+            p += self.pieceCount + (2 if self.hasPawns and self.pawns[1] else 1)
+        p += p & 1
+
+        allPairs = []
+        for encodings in files:
+            for encoding in encodings:
+                encoding.pairs = PairsData(data, p, encoding.size, self.isDtz)
+                p = encoding.pairs.next
+                allPairs.append(encoding.pairs)
+        if self.isDtz:
+            for encodings in files:
+                flags = encodings[0].pairs.flags
+                if flags & 2:
+                    encodings[0].maps = []
+                    for _ in range(4):
+                        if flags & 16:
+                            p += p & 1
+                            encodings[0].maps.append(p + 2)
+                            p += 2 + 2 * UINT16.unpack_from(data, p)[0]
+                        else:
+                            encodings[0].maps.append(p + 1)
+                            p += 1 + data[p]
+            p += p & 1
+        for pairs in allPairs:
+            pairs.indexTable = p
+            p += pairs.indexBytes
+        for pairs in allPairs:
+            pairs.sizeTable = p
+            p += pairs.sizeBytes
+        for pairs in allPairs:
+            p = (p + 63) & ~63
+            pairs.blocks = p
+            p += pairs.dataBytes
+
+        if not self.hasPawns: # pawnless tables can be stored with the colors the other way round from their name
+            self.key = piecesKey(files[0][0].pieces)
+            self.mirroredKey = piecesKey([piece ^ 8 for piece in files[0][0].pieces])
+        self.files = files
+
+
+    '''
+    Encoding, index and table side of the position. The side to move is side 0 when the table's first color
+    is to move; when black holds the table's first color, colors swap and for pawns the board flips
+    '''
+    def locate(self, gs, key):
+        if self.files is None:
+            self.readLayout()
+        if self.symmetric:
+            flipped = not gs.whiteToMove
+            side = 0
+        elif key == self.key:
+            flipped = False
+            side = 0 if gs.whiteToMove else 1
+        else:
+            flipped = True
+            side = 1 if gs.whiteToMove else 0
+        colorFlip = 8 if flipped else 0
+        mirror = 0 if flipped and self.hasPawns else 56
+
+        if not self.hasPawns:
+            encodings = self.files[0]
+            encoding = encodings[side] if side < len(encodings) else encodings[0]
+            squares = self.pieceSquares(gs, encoding.pieces, colorFlip, mirror, [])
+            return encoding, self.encodePieces(encoding, squares), side
+
+        squares = self.pieceSquares(gs, self.files[0][0].pieces[:1], colorFlip, mirror, [])
+        for i in range(1, self.pawns[0]): # the pawn with the lowest FLAP square leads and picks the file
+            if FLAP[squares[0]] > FLAP[squares[i]]:
+                squares[0], squares[i] = squares[i], squares[0]
+        encodings = self.files[min(squares[0] & 7, 7 - (squares[0] & 7))]
+        encoding = encodings[side] if side < len(encodings) else encodings[0]
+        squares = self.pieceSquares(gs, encoding.pieces, colorFlip, mirror, squares)
+        return encoding, self.encodePawns(encoding, squares), side
+
+
+'''
+Tables of one directory. Probes return None for positions the tables do not cover: castling rights,
+more pieces than the largest table or a missing table
+'''
+class Tablebase():
+    def __init__(self, directory, cacheBlocks = DEFAULT_CACHE_BLOCKS):
+        self.directory = directory
+        self.cacheBlocks = cacheBlocks
+        self.cache = OrderedDict() # (PairsData, block) -> decoded values
+        self.wdlTables = {} # material key, either color first -> TableFile
+        self.dtzTables = {}
+        self.maxPieces = 2 # bare kings are always known
+        for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else ():
+            material, suffix = os.path.splitext(name)
+            if suffix not in (WDL_SUFFIX, DTZ_SUFFIX) or not TABLE_NAME.match(material):
+                continue
+            table = TableFile(os.path.join(directory, name), suffix == DTZ_SUFFIX)
+            tables = self.dtzTables if table.isDtz else self.wdlTables
+            tables[table.key] = tables[table.mirroredKey] = table
+            if not table.isDtz:
+                self.maxPieces = max(self.maxPieces, table.pieceCount)
+        self.resetStats()
+
+
+    '''
+    Tablebase of the directory, or None when it holds no tables so callers can skip probing altogether
+    '''
+    @classmethod
+    def open(cls, directory, cacheBlocks = DEFAULT_CACHE_BLOCKS):
+        tablebase = cls(directory, cacheBlocks)
+        if not tablebase.wdlTables:
+            tablebase.close()
+            return None
+        return tablebase
+
+
+    def tableFiles(self):
+        return {id(table): table for table in list(self.wdlTables.values()) + list(self.dtzTables.values())}.values()
+
+
+    def close(self):
+        for table in self.tableFiles():
+            table.close()
+        self.wdlTables = {}
+        self.dtzTables = {}
+        self.cache.clear()
+
+
+    def resetStats(self):
+        self.probes = 0
+        self.hits = 0 # probes answered by the tables
+        self.cacheHits = 0
+        self.cacheMisses = 0
+
+
+    def getStats(self):
+        return {
+            "tables": sorted(os.path.basename(table.path) for table in self.tableFiles()),
+            "probes": self.probes,
+            "hits": self.hits,
+            "cachedBlocks": len(self.cache),
+            "cacheHits": self.cacheHits,
+            "cacheMisses": self.cacheMisses,
+        }
+
+
+    def covers(self, gs):
+        return not gs.castlingRights and \
+            (gs.colorBitboards[WHITE] | gs.colorBitboards[BLACK]).bit_count() <= self.maxPieces
+
+
+    def value(self, pairs, index):
+        if pairs.constant is not None:
+            return pairs.constant
+        block, offset = pairs.locate(index)
+        cacheKey = (pairs, block)
+        values = self.cache.get(cacheKey)
+        if values is None:
+            self.cacheMisses += 1
+            values = pairs.decode(block)
+            self.cache[cacheKey] = values
+            if len(self.cache) > self.cacheBlocks:
+                self.cache.popitem(last=False)
+        else:
+            self.cacheHits += 1
+            self.cache.move_to_end(cacheKey)
+        return values[offset]
+
+
+    def tableWdl(self, gs):
+        if (gs.colorBitboards[WHITE] | gs.colorBitboards[BLACK]).bit_count() == 2:
+            return DRAW
+        key = materialKey(gs)
+        table = self.wdlTables.get(key)
+        if table is None:
+            raise MissingTable(key)
+        encoding, index, _ = table.locate(gs, key)
+        return self.value(encoding.pairs, index) - 2
+
+
+    '''
+    Plies to zeroing as stored, None when the table holds the other side to move
+    '''
+    def tableDtz(self, gs, wdl):
+        key = materialKey(gs)
+        table = self.dtzTables.get(key)
+        if table is None:
+            raise MissingTable(key)
+        encoding, index, side = table.locate(gs, key)
+        flags = encoding.pairs.flags
+        if not table.symmetric and flags & 1 != side:
+            return None
+        plies = self.value(encoding.pairs, index)
+        if encoding.maps is not None:
+            start = encoding.maps[WDL_TO_MAP[wdl + 2]]
+            plies = UINT16.unpack_from(table.data, start + 2 * plies)[0] if flags & 16 else table.data[start + plies]
+        if not flags & PLIES_FLAGS[wdl + 2] or wdl & 1: # stored in moves
+            plies *= 2
+        return plies
+
+
+    '''
+    The tables hold don't care values where a capture decides, so captures are searched first.
+    Returns the value and 2 when a capture reaches it, 1 when the table does
+    '''
+    def searchCaptures(self, gs, alpha, beta):
+        for code in gs.getValidMoveCodes(None, TACTICAL_MOVES):
+            if code >> 24 == EMPTY or code & MOVE_ENPASSANT:
+                continue
+            gs.makeMoveCode(code)
+            try:
+                value = -self.searchCaptures(gs, -beta, -alpha)[0]
+            finally:
+                gs.undoMove()
+            if value > alpha:
+                if value >= beta:
+                    return value, 2
+                alpha = value
+        value = self.tableWdl(gs)
+        if alpha >= value:
+            return alpha, 1 + (alpha > 0)
+        return value, 1
+
+
+    '''
+    Best value of the en passant captures, None without any
+    '''
+    def enpassantValue(self, gs):
+        best = None
+        if gs.enpassantPossible == ():
+            return best
+        for code in gs.getValidMoveCodes(None, TACTICAL_MOVES):
+            if code & MOVE_ENPASSANT:
+                gs.makeMoveCode(code)
+                try:
+                    value = -self.searchCaptures(gs, LOSS, WIN)[0]
+                finally:
+                    gs.undoMove()
+                best = value if best is None else max(best, value)
+        return best
+
+
+    def onlyEnpassant(self, gs):
+        return all(code & MOVE_ENPASSANT for code in gs.getValidMoveCodes())
+
+
+    def positionWdl(self, gs):
+        wdl = self.searchCaptures(gs, LOSS, WIN)[0]
+        enpassant = self.enpassantValue(gs)
+        if enpassant is not None and (enpassant >= wdl or (wdl == DRAW and self.onlyEnpassant(gs))):
+            wdl = enpassant
+        return wdl
+
+
+    def positionDtzWithoutEnpassant(self, gs):
+        wdl, found = self.searchCaptures(gs, LOSS, WIN)
+        if wdl == DRAW:
+            return 0
+        if found == 2: # a capture is best
+            return dtzBeforeZeroing(wdl)
+        if wdl > 0:
+            for code in gs.getValidMoveCodes():
+                if ((code >> 20) & 15) % 6 == PAWN and code >> 24 == EMPTY:
+                    gs.makeMoveCode(code)
+                    try:
+                        value = -self.positionWdl(gs)
+                    finally:
+                        gs.undoMove()
+                    if value == wdl: # a winning pawn move
+                        return dtzBeforeZeroing(wdl)
+
+        plies = self.tableDtz(gs, wdl)
+        if plies is not None:
+            return dtzBeforeZeroing(wdl) + (plies if wdl > 0 else -plies)
+
+        if wdl > 0: # the table holds the other side, look one move ahead
+            best = 0xffff
+            for code in gs.getValidMoveCodes():
+                if isZeroing(code):
+                    continue
+                gs.makeMoveCode(code)
+                try:
+                    value = -self.positionDtz(gs)
+                    if value == 1 and isMate(gs):
+                        best = 1
+                    elif value > 0:
+                        best = min(best, value + 1)
+                finally:
+                    gs.undoMove()
+            return best
+        best = -1
+        for code in gs.getValidMoveCodes():
+            gs.makeMoveCode(code)
+            try:
+                if gs.halfmoveClock == 0:
+                    value = -1 if wdl == LOSS else (0 if self.searchCaptures(gs, CURSED_WIN, WIN)[0] == WIN else -FIFTY_MOVE_PLIES - 1)
+                else:
+                    value = -self.positionDtz(gs) - 1
+            finally:
+                gs.undoMove()
+            best = min(best, value)
+        return best
+
+
+    '''
+    DTZ of the position in plies: positive when the side to move wins, beyond 100 when only without
+    the fifty-move rule. It can be one ply long, as the tables round in endgame phases where that is harmless
+    '''
+    def positionDtz(self, gs):
+        dtz = self.positionDtzWithoutEnpassant(gs)
+        enpassant = self.enpassantValue(gs)
+        if enpassant is None:
+            return dtz
+        enpassant = dtzBeforeZeroing(enpassant)
+        if dtz < -FIFTY_MOVE_PLIES:
+            replace = enpassant >= 0
+        elif dtz < 0:
+            replace = enpassant >= 0 or enpassant < -FIFTY_MOVE_PLIES
+        elif dtz > FIFTY_MOVE_PLIES:
+            replace = enpassant > 0
+        elif dtz > 0:
+            replace = enpassant == 1
+        elif enpassant >= 0:
+            replace = True
+        else:
+            replace = self.onlyEnpassant(gs)
+        return enpassant if replace else dtz
+
+
+    '''
+    WIN, CURSED_WIN, DRAW, BLESSED_LOSS or LOSS for the side to move, None when the position is not in the tables
+    '''
+    def probeWdl(self, gs):
+        self.probes += 1
+        if not self.covers(gs):
+            return None
+        try:
+            wdl = self.positionWdl(gs)
+        except MissingTable:
+            return None
+        self.hits += 1
+        return wdl
+
+
+    '''
+    Plies to the next zeroing move, positive when the side to move wins, negative when it loses, 0 for a draw
+    '''
+    def probeDtz(self, gs):
+        self.probes += 1
+        if not self.covers(gs):
+            return None
+        try:
+            dtz = self.positionDtz(gs)
+        except MissingTable:
+            return None
+        self.hits += 1
+        return dtz
+
+
+    '''
+    Best legal move by the tables as (move code, WDL, DTZ in plies), None when some move leaves the tables.
+    The fifty-move counter of the position decides whether a win is still a win; wins take the fastest way
+    to zeroing, losses the slowest, draws stay drawn
+    '''
+    def probeRoot(self, gs):
+        self.probes += 1
+        if not self.covers(gs):
+            return None
+        best = None
+        try:
+            for code in list(gs.getValidMoveCodes()):
+                gs.makeMoveCode(code)
+                try:
+                    if gs.halfmoveClock == 0:
+                        dtz = dtzBeforeZeroing(-self.positionWdl(gs))
+                    else:
+                        dtz = -self.positionDtz(gs)
+                        dtz += (dtz > 0) - (dtz < 0)
+                        if dtz == 2 and isMate(gs):
+                            dtz = 1
+                finally:
+                    gs.undoMove()
+                plies = abs(dtz)
+                if dtz == 0:
+                    wdl = DRAW
+                elif gs.halfmoveClock + plies <= FIFTY_MOVE_PLIES:
+                    wdl = WIN if dtz > 0 else LOSS
+                else:
+                    wdl = CURSED_WIN if dtz > 0 else BLESSED_LOSS
+                rank = (wdl, -plies if dtz > 0 else plies)
+                if best is None or rank > best[0]:
+                    best = (rank, code, wdl, plies)
+        except MissingTable:
+            return None
+        if best is None:
+            return None
+        self.hits += 1
+        return best[1], best[2], best[3]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Probe a position in Syzygy endgame tablebases")
+    parser.add_argument("directory", help="directory with .rtbw and .rtbz files")
+    parser.add_argument("fen")
+    args = parser.parse_args(argv)
+
+    from ChessEngine import GameState, Move
+    tablebase = Tablebase.open(args.directory)
+    if tablebase is None:
+        print(f"no tables in {args.directory}")
+        return 1
+    gs = GameState.fromFen(args.fen)
+    wdl = tablebase.probeWdl(gs)
+    print(f"wdl {WDL_NAMES.get(wdl)} dtz {tablebase.probeDtz(gs)}")
+    root = tablebase.probeRoot(gs)
+    if root is not None:
+        print(f"best {Move.fromCode(root[0]).getUciNotation()} {WDL_NAMES[root[1]]} in {root[2]} plies")
+    tablebase.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
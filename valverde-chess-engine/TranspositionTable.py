@@ -0,0 +1,134 @@
+from array import array
+
+'''
+Fixed-size transposition table kept in one flat array of unsigned 64-bit words.
+Every bucket holds two entries of two words each (zobrist key, packed data):
+the first entry is depth-preferred, the second is always replaced.
+Packed data: bits 0-27 move code, 28-48 score + SCORE_OFFSET, 49-55 depth, 56-57 bound, 58-63 search age
+'''
+EXACT, LOWER_BOUND, UPPER_BOUND = 1, 2, 3 # 0 marks an empty entry
+DEFAULT_SIZE_MB = 16
+BUCKET_BYTES = 32
+SCORE_OFFSET = 1 << 20
+MAX_DEPTH = 127
+AGE_MASK = 63
+HASHFULL_SAMPLE_BUCKETS = 500
+
+MOVE_MASK = (1 << 28) - 1
+SCORE_MASK = (1 << 21) - 1
+
+
+class TTEntry():
+    __slots__ = ('move', 'score', 'depth', 'bound')
+
+    def __init__(self, move, score, depth, bound):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.bound = bound
+
+
+class TranspositionTable():
+    def __init__(self, sizeMb = DEFAULT_SIZE_MB):
+        self.resize(sizeMb)
+
+
+    def resize(self, sizeMb):
+        buckets = 1
+        while buckets * 2 * BUCKET_BYTES <= sizeMb * 1024 * 1024:
+            buckets *= 2
+        self.bucketMask = buckets - 1
+        self.table = array('Q')
+        self.table.frombytes(bytes(buckets * BUCKET_BYTES))
+        self.age = 0
+        self.resetStats()
+
+
+    def clear(self):
+        self.table = array('Q')
+        self.table.frombytes(bytes((self.bucketMask + 1) * BUCKET_BYTES))
+        self.age = 0
+        self.resetStats()
+
+
+    def resetStats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0 # stores that evicted a different position from the current search
+
+
+    '''
+    Called once per search, so entries from earlier moves become the first to go
+    '''
+    def newSearch(self):
+        self.age = (self.age + 1) & AGE_MASK
+
+
+    def probe(self, key):
+        self.probes += 1
+        table = self.table
+        index = (key & self.bucketMask) << 2
+        if table[index] == key and table[index + 1]:
+            data = table[index + 1]
+        elif table[index + 2] == key and table[index + 3]:
+            data = table[index + 3]
+        else:
+            return None
+        self.hits += 1
+        return TTEntry(data & MOVE_MASK, ((data >> 28) & SCORE_MASK) - SCORE_OFFSET, (data >> 49) & MAX_DEPTH, (data >> 56) & 3)
+
+
+    def store(self, key, move, score, depth, bound):
+        self.stores += 1
+        table = self.table
+        index = (key & self.bucketMask) << 2
+        depth = max(0, min(depth, MAX_DEPTH))
+        data = (move or 0) | ((score + SCORE_OFFSET) << 28) | (depth << 49) | (bound << 56) | (self.age << 58)
+
+        preferred = table[index + 1]
+        if table[index] == key or not preferred or (preferred >> 58) != self.age or depth >= (preferred >> 49) & MAX_DEPTH:
+            if table[index] == key and not move: # keep the known best move of this position
+                data |= preferred & MOVE_MASK
+            elif preferred and table[index] != key and (preferred >> 58) == self.age:
+                self.collisions += 1
+            table[index] = key
+            table[index + 1] = data
+        else:
+            replaced = table[index + 3]
+            if table[index + 2] == key and not move:
+                data |= replaced & MOVE_MASK
+            elif replaced and table[index + 2] != key and (replaced >> 58) == self.age:
+                self.collisions += 1
+            table[index + 2] = key
+            table[index + 3] = data
+
+
+    '''
+    Per mille of entries used by the current search, like UCI hashfull. Keys pick buckets by their low bits,
+    so the sample of about a thousand entries is spread over the whole table rather than taken from its start
+    '''
+    def hashfull(self):
+        table = self.table
+        buckets = self.bucketMask + 1
+        sampled = min(HASHFULL_SAMPLE_BUCKETS, buckets)
+        stride = buckets // sampled
+        used = 0
+        for index in range(1, sampled * stride * 4, stride * 4): # data words of the bucket's two entries
+            for data in (table[index], table[index + 2]):
+                if data and (data >> 58) == self.age:
+                    used += 1
+        return used * 1000 // (sampled * 2)
+
+
+    def getStats(self):
+        return {
+            "sizeMb": len(self.table) * 8 / (1024 * 1024),
+            "entries": (self.bucketMask + 1) * 2,
+            "probes": self.probes,
+            "hits": self.hits,
+            "hitRate": self.hits / self.probes if self.probes else 0.0,
+            "stores": self.stores,
+            "collisions": self.collisions,
+            "hashfull": self.hashfull(),
+        }
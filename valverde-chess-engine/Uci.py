@@ -0,0 +1,243 @@
+import sys
+import threading
+import ChessEngine
+import Search
+from OpeningBook import OpeningBook, DEFAULT_BOOK_DEPTH
+from Tablebase import Tablebase
+from TranspositionTable import DEFAULT_SIZE_MB
+
+'''
+Headless UCI front end. Only imports the engine modules, never pygame, so it starts fast
+under tournament managers. Searches run on a background thread while commands keep being read
+'''
+ENGINE_NAME = "Valverde"
+ENGINE_AUTHOR = "Adam Pociejowski"
+DEFAULT_MOVES_TO_GO = 30
+MOVE_OVERHEAD = 0.05 # seconds kept back per move for communication lag
+
+
+def formatScore(score):
+    if score >= Search.MATE_SCORE - Search.MAX_PLY:
+        return f"mate {(Search.MATE_SCORE - score + 1) // 2}"
+    if score <= -Search.MATE_SCORE + Search.MAX_PLY:
+        return f"mate {-(Search.MATE_SCORE + score) // 2}"
+    return f"cp {score}"
+
+
+'''
+Seconds to spend on a move with remaining seconds on the clock and the given increment
+'''
+def timeBudget(remaining, increment, movesToGo = DEFAULT_MOVES_TO_GO):
+    budget = remaining / movesToGo + increment * 0.8
+    return max(min(budget, remaining * 0.5) - MOVE_OVERHEAD, 0.01)
+
+
+def findUciMove(gs, notation):
+    for code in gs.getValidMoveCodes():
+        if ChessEngine.Move.fromCode(code).getUciNotation() == notation:
+            return code
+    return None
+
+
+class UciEngine():
+    def __init__(self, out = sys.stdout):
+        self.out = out
+        self.outLock = threading.Lock()
+        self.searcher = Search.Searcher()
+        self.gs = ChessEngine.GameState()
+        self.searchThread = None
+        self.stopEvent = threading.Event()
+        self.book = None
+        self.bookDepth = DEFAULT_BOOK_DEPTH
+
+
+    def send(self, line):
+        with self.outLock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+
+    '''
+    Handles one command line, returns False once the engine should quit
+    '''
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_SIZE_MB} min 1 max 1024")
+            self.send("option name BookFile type string default <empty>")
+            self.send(f"option name BookDepth type spin default {DEFAULT_BOOK_DEPTH} min 0 max 200")
+            self.send("option name TablebasePath type string default <empty>")
+            self.send("uciok")
+        elif command == 'isready':
+            self.send("readyok")
+        elif command == 'setoption':
+            self.setOption(args)
+        elif command == 'ucinewgame':
+            self.stopSearch()
+            self.searcher.tt.clear()
+            self.gs = ChessEngine.GameState()
+        elif command == 'position':
+            self.stopSearch()
+            self.setPosition(args)
+        elif command == 'go':
+            self.stopSearch()
+            self.startSearch(args)
+        elif command == 'stop':
+            self.stopSearch()
+        elif command == 'quit':
+            self.stopSearch()
+            return False
+        elif command == 'd': # not UCI, prints the current position like other engines do
+            self.send(self.gs.toFen())
+        else:
+            self.send(f"info string unknown command {command}")
+        return True
+
+
+    def setOption(self, args):
+        if 'name' not in args or 'value' not in args:
+            return
+        name = ' '.join(args[args.index('name') + 1:args.index('value')]).lower()
+        value = ' '.join(args[args.index('value') + 1:])
+        if name in ('hash', 'bookdepth'):
+            try:
+                number = int(value)
+            except ValueError:
+                self.send(f"info string {name} needs a number, not {value}")
+                return
+        if name == 'hash':
+            self.stopSearch()
+            self.searcher.tt.resize(max(1, number))
+        elif name == 'bookfile':
+            if self.book is not None:
+                self.book.close()
+                self.book = None
+            if value and value != '<empty>':
+                try:
+                    self.book = OpeningBook(value, self.bookDepth)
+                except OSError as e:
+                    self.send(f"info string cannot open book {value}: {e}")
+        elif name == 'tablebasepath':
+            self.stopSearch()
+            if self.searcher.tablebase is not None:
+                self.searcher.tablebase.close()
+            self.searcher.tablebase = Tablebase.open(value) if value and value != '<empty>' else None
+            if value and value != '<empty>' and self.searcher.tablebase is None:
+                self.send(f"info string no tablebases in {value}")
+        elif name == 'bookdepth':
+            self.bookDepth = number
+            if self.book is not None:
+                self.book.bookDepth = self.bookDepth
+
+
+    def setPosition(self, args):
+        if not args:
+            return
+        movesAt = args.index('moves') if 'moves' in args else len(args)
+        try:
+            if args[0] == 'startpos':
+                gs = ChessEngine.GameState()
+            elif args[0] == 'fen':
+                gs = ChessEngine.GameState.fromFen(' '.join(args[1:movesAt]))
+            else:
+                return
+        except ValueError as e:
+            self.send(f"info string {e}")
+            return
+        for notation in args[movesAt + 1:]:
+            code = findUciMove(gs, notation)
+            if code is None:
+                self.send(f"info string illegal move {notation}")
+                break
+            gs.makeMoveCode(code)
+        self.gs = gs
+
+
+    '''
+    Turns go arguments into search limits, with a time budget from the clock when no fixed limit is given
+    '''
+    def searchLimits(self, args):
+        params = {}
+        for i, token in enumerate(args):
+            if token in ('depth', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo', 'nodes') and i + 1 < len(args):
+                try:
+                    params[token] = int(args[i + 1])
+                except ValueError:
+                    self.send(f"info string ignoring {token} {args[i + 1]}, not a number")
+        infinite = 'infinite' in args
+        timeLimit = None
+        if 'movetime' in params:
+            timeLimit = max(params['movetime'] / 1000 - MOVE_OVERHEAD, 0.01)
+        else:
+            remaining = params.get('wtime' if self.gs.whiteToMove else 'btime')
+            if remaining is not None:
+                increment = params.get('winc' if self.gs.whiteToMove else 'binc', 0) / 1000
+                timeLimit = timeBudget(remaining / 1000, increment, max(params.get('movestogo', DEFAULT_MOVES_TO_GO), 1))
+        return timeLimit, params.get('depth'), params.get('nodes'), infinite
+
+
+    def startSearch(self, args):
+        timeLimit, maxDepth, maxNodes, infinite = self.searchLimits(args)
+        bookMove = self.book.chooseMove(self.gs) if self.book is not None and not infinite else None
+        if bookMove is not None:
+            self.send("info string book move")
+            self.send(f"bestmove {ChessEngine.Move.fromCode(bookMove).getUciNotation()}")
+            return
+        if timeLimit is None and maxDepth is None and maxNodes is None and not infinite:
+            infinite = True
+        self.stopEvent.clear()
+        self.searcher.resetStop()
+        # the search gets its own copy, so commands such as d can read self.gs meanwhile
+        self.searchThread = threading.Thread(target=self.runSearch, args=(self.gs.copy(), timeLimit, maxDepth, maxNodes, infinite),
+                                             daemon=True)
+        self.searchThread.start()
+
+
+    '''
+    Always ends with a bestmove, 0000 when there is none, so a failing search cannot leave the GUI waiting.
+    No ponder move is sent, pondering is not supported
+    '''
+    def runSearch(self, gs, timeLimit, maxDepth, maxNodes, infinite):
+        bestMove = None
+        try:
+            bestMove = self.searcher.search(gs, timeLimit, maxDepth, maxNodes, onIteration=self.sendInfo).bestMove
+        except Exception as e:
+            self.send(f"info string search failed: {type(e).__name__}: {e}")
+        if infinite: # UCI wants bestmove only after stop, even if the search ran out of depth earlier
+            self.stopEvent.wait()
+        if bestMove is None:
+            self.send("bestmove 0000")
+        else:
+            self.send(f"bestmove {ChessEngine.Move.fromCode(bestMove).getUciNotation()}")
+
+
+    def sendInfo(self, result):
+        pv = ' '.join(ChessEngine.Move.fromCode(code).getUciNotation() for code in result.pv)
+        self.send(f"info depth {result.depth} score {formatScore(result.score)} nodes {result.nodes} "
+                  f"nps {result.nps:.0f} time {int(result.elapsed * 1000)} hashfull {self.searcher.tt.hashfull()} pv {pv}")
+
+
+    def stopSearch(self):
+        if self.searchThread is not None:
+            self.stopEvent.set()
+            self.searcher.stop()
+            self.searchThread.join()
+            self.searchThread = None
+
+
+def main(stream = sys.stdin):
+    engine = UciEngine()
+    for line in stream:
+        if not engine.handle(line):
+            break
+    engine.stopSearch()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
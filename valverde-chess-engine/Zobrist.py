@@ -0,0 +1,33 @@
+import random
+
+'''
+Zobrist keys, generated once at import from a fixed seed so keys are stable between runs and processes
+'''
+_random = random.Random(0x5A0B)
+
+PIECE_KEYS = [[_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+BLACK_TO_MOVE_KEY = _random.getrandbits(64)
+_CASTLE_RIGHT_KEYS = [_random.getrandbits(64) for _ in range(4)]
+ENPASSANT_FILE_KEYS = [_random.getrandbits(64) for _ in range(8)]
+# one key per combination of the 4 castling right bits
+CASTLING_KEYS = [0] * 16
+for _rights in range(16):
+    for _bit in range(4):
+        if _rights & (1 << _bit):
+            CASTLING_KEYS[_rights] ^= _CASTLE_RIGHT_KEYS[_bit]
+
+
+'''
+Full recompute of the key, the incrementally maintained GameState.zobristKey must always equal it
+'''
+def computeKey(gs):
+    key = 0
+    for piece, bitboard in enumerate(gs.pieceBitboards):
+        while bitboard:
+            low = bitboard & -bitboard
+            bitboard ^= low
+            key ^= PIECE_KEYS[piece][low.bit_length() - 1]
+    if not gs.whiteToMove:
+        key ^= BLACK_TO_MOVE_KEY
+    key ^= CASTLING_KEYS[gs.castlingRights]
+    return key ^ gs.enpassantKey()
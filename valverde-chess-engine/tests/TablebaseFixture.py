@@ -0,0 +1,293 @@
+import heapq
+import os
+import struct
+from array import array
+from Bitboards import KING_ATTACKS, rookAttacks, bishopAttacks
+from ChessEngine import ROOK, QUEEN
+from Tablebase import TableShape, WDL_MAGIC, DTZ_MAGIC, WDL_SUFFIX, DTZ_SUFFIX, LOSS, DRAW, WIN
+
+'''
+Test fixture: KQvK and KRvK solved by retrograde analysis and written as Syzygy files, so the reader
+is tested on the real format without downloading tables. Values are Huffman coded with pair symbols
+for runs of equal values, positions no legal placement reaches repeat the value before them.
+The DTZ side to move differs between the two tables, so probes go through both the table and the
+one move lookahead over the side it leaves out. The 16 checksum bytes at the end are left zero
+'''
+PIECE_TYPES = {'Q': QUEEN, 'R': ROOK}
+DTZ_SIDES = {'KQvK': 0, 'KRvK': 1} # 0 stores white to move, the winning side
+SIDE_ENTRIES = 64 * 64 * 64 # positions per side to move, indexed strong king * 4096 + weak king * 64 + piece
+BLOCK_SIZE = 6 # log2 of the bytes per block
+INDEX_BITS = 8
+MAX_BLOCK_VALUES = 32768 # keeps index offsets past the last block within 16 bits
+MAX_RUN_LOG = 8 # a symbol stands for at most 256 values
+
+
+'''
+Plies to mate of a king and one piece against a bare king, white being the strong side, by retrograde analysis.
+Returns for white to move and black to move the plies to mate, -1 when there is none, and which positions are legal
+'''
+def solveKingPieceVsKing(pieceType):
+    def pieceAttacks(sq, occupied):
+        if pieceType == ROOK:
+            return rookAttacks(sq, occupied)
+        return rookAttacks(sq, occupied) | bishopAttacks(sq, occupied)
+
+    whiteResult = array('b', [-1]) * SIDE_ENTRIES
+    blackResult = array('b', [-1]) * SIDE_ENTRIES
+    remaining = array('b', [0]) * SIDE_ENTRIES # black moves not yet known to lose
+    legalWhite = bytearray(SIDE_ENTRIES)
+    legalBlack = bytearray(SIDE_ENTRIES)
+    lost = []
+
+    for wk in range(64):
+        for bk in range(64):
+            if bk == wk or KING_ATTACKS[wk] & (1 << bk):
+                continue
+            for x in range(64):
+                if x == wk or x == bk:
+                    continue
+                index = wk << 12 | bk << 6 | x
+                occupied = (1 << wk) | (1 << bk) | (1 << x)
+                if not pieceAttacks(x, occupied) & (1 << bk):
+                    legalWhite[index] = 1
+                legalBlack[index] = 1
+                moves = 0
+                drawn = False
+                occupiedWithoutKing = (1 << wk) | (1 << x)
+                targets = KING_ATTACKS[bk] & ~KING_ATTACKS[wk] & ~(1 << wk)
+                while targets:
+                    target = targets & -targets
+                    targets ^= target
+                    t = target.bit_length() - 1
+                    if t == x: # taking the piece leaves bare kings, it was not protected by the king
+                        drawn = True
+                    elif not pieceAttacks(x, occupiedWithoutKing) & target:
+                        moves += 1
+                if drawn:
+                    remaining[index] = -1
+                elif moves == 0:
+                    if pieceAttacks(x, occupied) & (1 << bk):
+                        blackResult[index] = 0
+                        lost.append(index)
+                    else:
+                        remaining[index] = -1 # stale mate
+                else:
+                    remaining[index] = moves
+
+    plies = 0
+    while lost:
+        won = []
+        for index in lost: # white moves into these positions win
+            wk, bk, x = index >> 12, (index >> 6) & 63, index & 63
+            occupied = (1 << wk) | (1 << bk) | (1 << x)
+            origins = KING_ATTACKS[wk] & ~KING_ATTACKS[bk] & ~occupied
+            while origins:
+                origin = origins & -origins
+                origins ^= origin
+                previous = (origin.bit_length() - 1) << 12 | bk << 6 | x
+                if legalWhite[previous] and whiteResult[previous] < 0:
+                    whiteResult[previous] = plies + 1
+                    won.append(previous)
+            origins = pieceAttacks(x, occupied) & ~occupied
+            while origins:
+                origin = origins & -origins
+                origins ^= origin
+                previous = wk << 12 | bk << 6 | (origin.bit_length() - 1)
+                if legalWhite[previous] and whiteResult[previous] < 0:
+                    whiteResult[previous] = plies + 1
+                    won.append(previous)
+
+        lost = []
+        for index in won: # black moves into these positions lose, once every black move does the position is lost
+            wk, bk, x = index >> 12, (index >> 6) & 63, index & 63
+            origins = KING_ATTACKS[bk] & ~KING_ATTACKS[wk] & ~((1 << wk) | (1 << x))
+            while origins:
+                origin = origins & -origins
+                origins ^= origin
+                previous = wk << 12 | (origin.bit_length() - 1) << 6 | x
+                if legalBlack[previous] and remaining[previous] > 0:
+                    remaining[previous] -= 1
+                    if remaining[previous] == 0:
+                        blackResult[previous] = plies + 2
+                        lost.append(previous)
+        plies += 2
+
+    return (whiteResult, legalWhite), (blackResult, legalBlack)
+
+
+'''
+Table values by Syzygy index for one side to move: WDL + 2, or for the DTZ table the plies to mate less one,
+the mated position storing 0 so it probes as -1
+'''
+def tableValues(shape, encoding, result, legal, isDtz, winning):
+    values = [None] * encoding.size
+    for index in range(SIDE_ENTRIES):
+        if not legal[index]:
+            continue
+        wk, bk, x = index >> 12, (index >> 6) & 63, index & 63
+        squares = [sq ^ 56 for sq in (wk, x, bk)] # in the order of the table's pieces, squares from a1
+        plies = result[index]
+        if isDtz:
+            value = max(plies - 1, 0)
+        else:
+            value = (WIN if winning else LOSS) + 2 if plies >= 0 else DRAW + 2
+        values[shape.encodePieces(encoding, squares)] = value
+    previous = next(value for value in values if value is not None)
+    for index, value in enumerate(values):
+        if value is None:
+            values[index] = previous
+        previous = values[index]
+    return values
+
+
+'''
+Runs of equal values as (value, log2 of the run length) symbols
+'''
+def runSymbols(values):
+    tokens = []
+    i = 0
+    while i < len(values):
+        j = i
+        while j < len(values) and values[j] == values[i] and j - i < 1 << MAX_RUN_LOG:
+            j += 1
+        length = j - i
+        for log in range(MAX_RUN_LOG, -1, -1):
+            if length & (1 << log):
+                tokens.append((values[i], log))
+        i = j
+    return tokens
+
+
+def huffmanLengths(frequencies):
+    if len(frequencies) == 1:
+        return {symbol: 1 for symbol in frequencies}
+    heap = [(frequency, i, (symbol,)) for i, (symbol, frequency) in enumerate(sorted(frequencies.items()))]
+    heapq.heapify(heap)
+    lengths = {symbol: 0 for symbol in frequencies}
+    counter = len(heap)
+    while len(heap) > 1:
+        first = heapq.heappop(heap)
+        second = heapq.heappop(heap)
+        for symbol in first[2] + second[2]:
+            lengths[symbol] += 1
+        heapq.heappush(heap, (first[0] + second[0], counter, first[2] + second[2]))
+        counter += 1
+    return lengths
+
+
+'''
+Huffman table and blocks of one encoding, as (header bytes, index table, size table, blocks)
+'''
+def encodePairs(values, flags, isDtz):
+    tokens = runSymbols(values)
+    symbols = set()
+    for value, log in tokens:
+        symbols.update((value, smaller) for smaller in range(log + 1)) # a run's halves are symbols too
+    frequencies = {symbol: 1 for symbol in symbols}
+    for token in tokens:
+        frequencies[token] += 1
+    lengths = huffmanLengths(frequencies)
+    assert max(lengths.values()) <= 32
+    order = sorted(symbols, key=lambda symbol: (-lengths[symbol], symbol))
+    number = {symbol: i for i, symbol in enumerate(order)}
+    minLength, maxLength = min(lengths.values()), max(lengths.values())
+
+    codes = {}
+    firstSymbol = {}
+    base = 0
+    symbol = 0
+    for length in range(maxLength, minLength - 1, -1):
+        if length < maxLength:
+            base = (base + count) // 2
+        firstSymbol[length] = symbol
+        count = 0
+        while symbol < len(order) and lengths[order[symbol]] == length:
+            codes[order[symbol]] = (base + count, length)
+            count += 1
+            symbol += 1
+
+    patterns = bytearray()
+    for value, log in order:
+        if log == 0:
+            left, right = value, 0xfff
+        else:
+            left = right = number[(value, log - 1)]
+        patterns += bytes((left & 0xff, (left >> 8) | ((right & 0x0f) << 4), right >> 4))
+    if len(order) & 1:
+        patterns.append(0)
+
+    blocks = []
+    blockBits = 8 << BLOCK_SIZE
+    current, bits, count = 0, 0, 0
+    for token in tokens:
+        code, length = codes[token]
+        if bits + length > blockBits or count + (1 << token[1]) > MAX_BLOCK_VALUES:
+            blocks.append((current << (blockBits - bits), count))
+            current, bits, count = 0, 0, 0
+        current = (current << length) | code
+        bits += length
+        count += 1 << token[1]
+    blocks.append((current << (blockBits - bits), count))
+
+    starts = []
+    start = 0
+    for _, count in blocks:
+        starts.append(start)
+        start += count
+    indexTable = bytearray()
+    block = 0
+    for chunk in range((len(values) + (1 << INDEX_BITS) - 1) >> INDEX_BITS):
+        middle = (chunk << INDEX_BITS) + (1 << (INDEX_BITS - 1))
+        while block + 1 < len(blocks) and starts[block + 1] <= middle:
+            block += 1
+        indexTable += struct.pack('<IH', block, middle - starts[block])
+
+    header = bytes((flags, BLOCK_SIZE, INDEX_BITS, 0)) + struct.pack('<I', len(blocks)) + bytes((maxLength, minLength))
+    header += b''.join(struct.pack('<H', firstSymbol[length]) for length in range(minLength, maxLength + 1))
+    header += struct.pack('<H', len(order)) + patterns
+    sizeTable = b''.join(struct.pack('<H', count - 1) for _, count in blocks)
+    data = b''.join(code.to_bytes(1 << BLOCK_SIZE, 'big') for code, _ in blocks)
+    return header, indexTable, sizeTable, data
+
+
+def align(out, boundary):
+    out += bytes(-len(out) % boundary)
+
+
+'''
+Writes one table file: the WDL file holds both sides to move, the DTZ file one of them
+'''
+def writeTable(path, shape, pieces, sideValues, isDtz, dtzSide = 0):
+    out = bytearray(DTZ_MAGIC if isDtz else WDL_MAGIC)
+    out.append(0 if isDtz else 1)
+    out.append(0) # order of the leading group, both sides
+    out += bytes((piece << 4) | piece for piece in pieces)
+    align(out, 2)
+    flags = dtzSide | 4 | 8 if isDtz else 0 # DTZ values in plies for wins and losses
+    encoded = [encodePairs(values, flags, isDtz) for values in sideValues]
+    for header, _, _, _ in encoded:
+        out += header
+    for part in (1, 2):
+        for parts in encoded:
+            out += parts[part]
+    for _, _, _, data in encoded:
+        align(out, 64)
+        out += data
+    align(out, 64)
+    out += bytes(16)
+    with open(path, 'wb') as stream:
+        stream.write(out)
+
+
+def generate(directory, tables = ('KQvK', 'KRvK')):
+    os.makedirs(directory, exist_ok=True)
+    for material in tables:
+        shape = TableShape(material)
+        pieces = [6, PIECE_TYPES[material[1]] + 1, 8 | 6] # white king, the piece, black king
+        encoding = shape.encoding(pieces)
+        sides = solveKingPieceVsKing(PIECE_TYPES[material[1]])
+        wdl = [tableValues(shape, encoding, result, legal, False, side == 0) for side, (result, legal) in enumerate(sides)]
+        writeTable(os.path.join(directory, material + WDL_SUFFIX), shape, pieces, wdl, False)
+        side = DTZ_SIDES[material]
+        dtz = tableValues(shape, encoding, sides[side][0], sides[side][1], True, side == 0)
+        writeTable(os.path.join(directory, material + DTZ_SUFFIX), shape, pieces, [dtz], True, side)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+'''
+The engine modules import each other by plain module name, so tests run with the engine directory on the path
+'''
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
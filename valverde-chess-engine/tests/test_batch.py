@@ -0,0 +1,66 @@
+import random
+import pytest
+import Perft
+import Evaluation
+from ChessEngine import WHITE, BLACK
+
+pytest.importorskip("numpy") # Batch needs NumPy, the engine does not
+import Batch
+
+'''
+The NumPy batch results against what GameState and Evaluation compute one position at a time,
+over the perft positions and positions reached by random play from them
+'''
+
+
+def positions(seed = 3, plies = 10):
+    rng = random.Random(seed)
+    states = []
+    for _, fen, _ in Perft.PERFT_POSITIONS:
+        gs = Perft.loadFen(fen)
+        states.append(gs.copy())
+        for _ in range(plies):
+            moves = list(gs.getValidMoveCodes())
+            if not moves:
+                break
+            gs.makeMoveCode(rng.choice(moves))
+            states.append(gs.copy())
+    return states
+
+
+@pytest.fixture(scope="module")
+def batch():
+    states = positions()
+    bitboards, whiteToMove = Batch.fromGameStates(states)
+    return states, bitboards, whiteToMove, Batch.bitboardsToPlanes(bitboards)
+
+
+def test_attack_maps_and_check(batch):
+    states, bitboards, whiteToMove, _ = batch
+    attacks = Batch.attackMaps(bitboards)
+    for i, gs in enumerate(states):
+        occupied = gs.colorBitboards[WHITE] | gs.colorBitboards[BLACK]
+        for color in (WHITE, BLACK):
+            expected = sum(1 << sq for sq in range(64) if gs.attackersTo(sq, occupied, color))
+            assert int(attacks[i, color]) == expected, gs.toFen()
+    assert Batch.inCheck(bitboards, whiteToMove, attacks).tolist() == [gs.isInCheck() for gs in states]
+
+
+def test_material_and_evaluation(batch):
+    states, bitboards, whiteToMove, planes = batch
+    assert Batch.material(bitboards).tolist() == [list(gs.material) for gs in states]
+    assert Batch.gamePhase(bitboards).tolist() == [gs.phase for gs in states]
+    middlegame, endgame, _ = Batch.pieceSquareScores(planes)
+    assert middlegame.tolist() == [gs.middlegameScore for gs in states]
+    assert endgame.tolist() == [gs.endgameScore for gs in states]
+    assert Batch.evaluate(planes, whiteToMove).tolist() == [Evaluation.evaluate(gs) for gs in states]
+
+
+def test_position_bytes_and_boards(batch):
+    states, bitboards, whiteToMove, planes = batch
+    decoded, decodedWhiteToMove, castlingRights, _ = Batch.fromPositionBytes(b''.join(gs.toBytes() for gs in states))
+    assert (decoded == bitboards).all()
+    assert (decodedWhiteToMove == whiteToMove).all()
+    assert castlingRights.tolist() == [gs.castlingRights for gs in states]
+    assert (Batch.fromBoards([gs.board for gs in states]) == planes).all()
+    assert Batch.toBoard(planes[5]) == states[5].board
@@ -0,0 +1,45 @@
+import pytest
+from ChessEngine import GameState, START_FEN, POSITION_BYTES
+
+'''
+FEN parsing: positions move generation cannot handle are refused up front,
+and what is accepted survives the trip through the 32 byte binary encoding unchanged
+'''
+
+
+@pytest.mark.parametrize("fen, message", [
+    ("8/8/8/8/8/8/8/8 w - - 0 1", "one king"),
+    ("4k3/8/8/8/8/8/8/8 w - - 0 1", "white needs exactly one king"),
+    ("4k3/8/8/8/8/8/8/3KK3 w - - 0 1", "white needs exactly one king"),
+    ("4kk2/8/8/8/8/8/8/4K3 w - - 0 1", "black needs exactly one king"),
+    ("qqqqkqqq/qqqqqqqq/qqqqqqqq/8/8/QQQQQQQQ/QQQQQQQQ/QQQQKQQQ w - - 0 1", "more than 32 pieces"),
+    ("4k3/8/8/8/8/8/8/P3K3 w - - 0 1", "first or last rank"),
+    ("p3k3/8/8/8/8/8/8/4K3 b - - 0 1", "first or last rank"),
+    ("4k3/8/8/8/8/8/8/4R1K1 w - - 0 1", "not to move is in check"),
+    ("4k3/8/8/8/8/8/3p4/4K3 b - - 0 1", "not to move is in check"),
+])
+def test_rejects_impossible_positions(fen, message):
+    with pytest.raises(ValueError, match=message):
+        GameState.fromFen(fen)
+
+
+def test_accepts_the_side_to_move_in_check():
+    assert GameState.fromFen("4k3/8/8/8/8/8/8/4R1K1 b - - 0 1").isInCheck()
+
+
+@pytest.mark.parametrize("fen", [
+    START_FEN,
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r3k2r/8/8/8/8/8/8/R3K2R b Kq - 7 31",
+    "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",
+    "rnbqkbnr/pppp1ppp/8/8/3Pp3/8/PPP1PPPP/RNBQKBNR b KQkq d3 0 2",
+    "8/8/3k4/8/8/8/8/K6R w - - 99 254",
+])
+def test_fen_bytes_round_trip(fen):
+    gs = GameState.fromFen(fen)
+    assert gs.toFen() == fen
+    data = gs.toBytes()
+    assert len(data) == POSITION_BYTES
+    copy = GameState.fromBytes(data)
+    assert copy.toFen() == fen
+    assert copy.zobristKey == gs.zobristKey
@@ -0,0 +1,52 @@
+import pytest
+from ChessEngine import GameState
+from MoveCache import MoveCache
+
+'''
+LRU order and counters of the move cache, and the cache in front of GameState.getValidMoves
+'''
+
+
+def test_least_recently_used_goes_first():
+    cache = MoveCache(2)
+    cache.put(1, ('a',), False, False)
+    cache.put(2, ('b',), False, False)
+    assert cache.get(1).moves == ('a',) # 1 is now the most recent
+    cache.put(3, ('c',), False, False)
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+    cache.put(4, ('d',), False, False)
+    assert list(cache.entries) == [3, 4]
+    assert cache.getStats() == {"entries": 2, "maxEntries": 2, "hits": 3, "misses": 1, "hitRate": 0.75, "evictions": 2}
+
+
+def test_put_of_a_known_key_replaces_without_evicting():
+    cache = MoveCache(2)
+    cache.put(1, ('a',), False, False)
+    cache.put(2, ('b',), False, False)
+    cache.put(1, ('x',), True, False)
+    assert len(cache) == 2 and cache.evictions == 0
+    entry = cache.get(1)
+    assert (entry.moves, entry.checkMate) == (('x',), True)
+    cache.clear()
+    assert len(cache) == 0 and cache.getStats()["hits"] == 0
+
+
+def test_needs_room():
+    with pytest.raises(ValueError):
+        MoveCache(0)
+
+
+def test_game_state_cache_keeps_the_mate_flags():
+    gs = GameState.fromFen("k7/8/1K6/8/8/8/8/2Q5 w - - 0 1")
+    cache = gs.enableMoveCache(8)
+    moves = gs.getValidMoves()
+    assert gs.getValidMoves() == moves
+    mate = next(move for move in moves if move.getUciNotation() == "c1c8")
+    gs.makeMove(mate)
+    assert gs.getValidMoves() == [] and gs.checkMate
+    gs.undoMove()
+    gs.makeMove(mate)
+    gs.checkMate = False
+    assert gs.getValidMoves() == [] and gs.checkMate # from the cache
+    assert (cache.hits, cache.misses) == (2, 2)
@@ -0,0 +1,53 @@
+import random
+import pytest
+import Perft
+from ChessEngine import ALL_MOVES, TACTICAL_MOVES, QUIET_MOVES
+from MoveOrdering import MoveOrderer, isTactical
+
+'''
+Staged generation and ordering must still hand out every legal move exactly once,
+checked on positions reached by random play from the perft positions
+'''
+PLIES = 12
+
+
+def randomPositions(seed = 7, walks = 3):
+    rng = random.Random(seed)
+    for name, fen, _ in Perft.PERFT_POSITIONS:
+        for _ in range(walks):
+            gs = Perft.loadFen(fen)
+            yield gs
+            for _ in range(PLIES):
+                moves = list(gs.getValidMoveCodes())
+                if not moves:
+                    break
+                gs.makeMoveCode(rng.choice(moves))
+                yield gs
+
+
+def test_stages_partition_the_legal_moves():
+    for gs in randomPositions():
+        tactical = list(gs.getValidMoveCodes(stage=TACTICAL_MOVES))
+        quiet = list(gs.getValidMoveCodes(stage=QUIET_MOVES))
+        legal = list(gs.getValidMoveCodes(stage=ALL_MOVES))
+        assert len(set(tactical)) == len(tactical) and len(set(quiet)) == len(quiet)
+        assert not set(tactical) & set(quiet), gs.toFen()
+        assert set(tactical) | set(quiet) == set(legal), gs.toFen()
+        assert all(isTactical(code) for code in tactical) and not any(isTactical(code) for code in quiet)
+
+
+@pytest.mark.parametrize("hashKind", ["none", "tactical", "quiet", "illegal"])
+def test_ordered_moves_yield_each_legal_move_once(hashKind):
+    orderer = MoveOrderer(4)
+    rng = random.Random(hashKind)
+    for gs in randomPositions():
+        legal = list(gs.getValidMoveCodes())
+        quiet = [code for code in legal if not isTactical(code)]
+        orderer.killers[1] = [rng.choice(quiet) if quiet else 0, 0x7fffff] # one killer that is not a move here
+        candidates = {"none": [0], "tactical": [code for code in legal if isTactical(code)],
+                      "quiet": quiet, "illegal": [0x123456]}[hashKind]
+        hashMove = rng.choice(candidates) if candidates else 0
+        ordered = list(orderer.orderedMoves(gs, 1, hashMove))
+        assert sorted(ordered) == sorted(legal), gs.toFen()
+        if hashMove in legal:
+            assert ordered[0] == hashMove
@@ -0,0 +1,87 @@
+import random
+import pytest
+from ChessEngine import GameState, Move
+from OpeningBook import OpeningBook, polyglotKey, buildBook
+from Uci import findUciMove
+
+'''
+Polyglot keys against the reference values of the format description, and a book built from PGN read back
+'''
+REFERENCE_KEYS = [
+    ("", 0x463b96181691fc9c),
+    ("e2e4", 0x823c9b50fd114196),
+    ("e2e4 d7d5", 0x0756b94461c50fb0),
+    ("e2e4 d7d5 e4e5", 0x662fafb965db29d4),
+    ("e2e4 d7d5 e4e5 f7f5", 0x22a48b5a8e47ff78),
+    ("e2e4 d7d5 e4e5 f7f5 e1e2", 0x652a607ca3f242c1),
+    ("e2e4 d7d5 e4e5 f7f5 e1e2 e8f7", 0x00fdd303c946bdd9),
+    ("a2a4 b7b5 h2h4 b5b4 c2c4", 0x3c8123ea7b067637),
+    ("a2a4 b7b5 h2h4 b5b4 c2c4 b4c3 a1a3", 0x5c3f9b829b279560),
+]
+GAMES = """[Event "a"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 1-0
+
+[Event "b"]
+[Result "0-1"]
+
+1. d4 d5 0-1
+
+[Event "c"]
+[Result "1/2-1/2"]
+
+1. e4 c5 1/2-1/2
+"""
+
+
+def play(moves):
+    gs = GameState()
+    for notation in moves.split():
+        gs.makeMoveCode(findUciMove(gs, notation))
+    return gs
+
+
+@pytest.mark.parametrize("moves, key", REFERENCE_KEYS)
+def test_polyglot_key(moves, key):
+    assert polyglotKey(play(moves)) == key
+
+
+@pytest.fixture
+def book(tmp_path):
+    pgn = tmp_path / "games.pgn"
+    pgn.write_text(GAMES)
+    path = tmp_path / "book.bin"
+    assert buildBook([str(pgn)], str(path)) == (3, 6)
+    with OpeningBook(str(path), rng=random.Random(1)) as book:
+        yield book
+
+
+def notations(book, gs):
+    return sorted((Move.fromCode(code).getUciNotation(), weight) for code, weight, _ in book.getEntries(gs))
+
+
+def test_built_book_reads_back(book):
+    assert notations(book, GameState()) == [("d2d4", 0), ("e2e4", 3)]
+    assert notations(book, play("e2e4")) == [("c7c5", 1), ("e7e5", 0)]
+    assert notations(book, play("d2d4")) == [("d7d5", 2)]
+    assert notations(book, play("e2e4 e7e5")) == [("g1f3", 2)]
+
+
+def test_weight_zero_moves_are_never_played(book):
+    gs = GameState()
+    for _ in range(20):
+        assert Move.fromCode(book.chooseMove(gs)).getUciNotation() == "e2e4"
+    assert Move.fromCode(book.chooseMove(gs, weighted=False)).getUciNotation() == "e2e4"
+    assert book.chooseMove(play("e2e4 e7e5 g1f3")) is None # only e5 lost, out of book after it
+
+
+def test_all_moves_of_weight_zero_leave_the_book(tmp_path):
+    pgn = tmp_path / "games.pgn"
+    pgn.write_text('[Result "0-1"]\n\n1. d4 d5 0-1\n')
+    path = tmp_path / "book.bin"
+    buildBook([str(pgn)], str(path))
+    with OpeningBook(str(path)) as book:
+        assert book.getEntries(GameState())
+        assert book.chooseMove(GameState()) is None
+        assert book.chooseMove(GameState(), weighted=False) is None
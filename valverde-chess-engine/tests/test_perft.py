@@ -0,0 +1,23 @@
+import pytest
+import Perft
+
+'''
+Perft with verify recomputes the zobrist key and the evaluation terms after every move,
+so drift in the incremental updates fails here instead of waiting for someone to run Perft.py --verify
+'''
+POSITIONS = {name: (fen, expected) for name, fen, expected in Perft.PERFT_POSITIONS}
+
+
+@pytest.mark.parametrize("name, depth", [("kiwipete", 3), ("position4", 3)])
+def test_perft_verifies_incremental_state(name, depth):
+    fen, expected = POSITIONS[name]
+    stats = Perft.perft(Perft.loadFen(fen), depth, verify=True)
+    assert stats.asTuple() == expected[depth]
+
+
+def test_verify_catches_a_drifted_key():
+    gs = Perft.loadFen(POSITIONS["kiwipete"][0])
+    gs.makeMoveCode(gs.getValidMoveCodes()[0])
+    gs.currentZobristKey ^= 1
+    with pytest.raises(AssertionError):
+        Perft.verifyState(gs)
@@ -0,0 +1,75 @@
+import pytest
+from ChessEngine import (GameState, ONGOING, CHECKMATE, STALEMATE, INSUFFICIENT_MATERIAL, FIFTY_MOVE_RULE,
+                         THREEFOLD_REPETITION)
+from Uci import findUciMove
+
+'''
+Game end by the rules: gameStatus for the game, isDrawByRule for the search
+'''
+
+
+def play(gs, moves):
+    for notation in moves.split():
+        code = findUciMove(gs, notation)
+        assert code is not None, notation
+        gs.makeMoveCode(code)
+    return gs
+
+
+SHUFFLE = "g1f3 g8f6 f3g1 f6g8"
+
+
+def test_threefold_repetition():
+    gs = play(GameState(), SHUFFLE)
+    assert gs.isRepetition(2) and not gs.isRepetition(3)
+    assert gs.gameStatus() == ONGOING
+    play(gs, SHUFFLE)
+    assert gs.gameStatus() == THREEFOLD_REPETITION
+    assert gs.isDrawByRule()
+
+
+def test_repetition_does_not_reach_past_an_irreversible_move():
+    gs = play(GameState(), SHUFFLE + " e2e4 e7e5")
+    play(gs, SHUFFLE + " " + SHUFFLE) # the position after e5 stands three times, the initial one is behind the pawn moves
+    assert gs.gameStatus() == THREEFOLD_REPETITION
+    gs.undoMove()
+    assert not gs.isRepetition(3)
+    gs = play(GameState(), SHUFFLE + " e2e4 e7e5 " + SHUFFLE)
+    assert not gs.isRepetition(3)
+
+
+def test_fifty_move_rule():
+    gs = play(GameState.fromFen("k7/8/1K6/8/8/8/7Q/8 w - - 99 80"), "h2h3")
+    assert gs.halfmoveClock == 100
+    assert gs.gameStatus() == FIFTY_MOVE_RULE
+    assert gs.isDrawByRule()
+
+
+def test_mate_on_the_hundredth_half_move_beats_the_fifty_move_rule():
+    gs = play(GameState.fromFen("k7/8/1K6/8/8/8/7Q/8 w - - 99 80"), "h2h8")
+    assert gs.halfmoveClock == 100
+    assert gs.gameStatus() == CHECKMATE
+    assert not gs.isDrawByRule()
+
+
+@pytest.mark.parametrize("fen, insufficient", [
+    ("4k3/8/8/8/8/8/8/4K3 w - - 0 1", True),
+    ("4k3/8/8/8/8/8/8/1N2K3 w - - 0 1", True),
+    ("4k3/8/8/8/8/8/8/2B1K3 b - - 0 1", True),
+    ("1b2k3/8/8/8/8/8/8/2B1K3 w - - 0 1", True), # both bishops on dark squares
+    ("2b1k3/8/8/8/8/8/8/2B1K3 w - - 0 1", False), # opposite colors, a mate is possible
+    ("4k3/8/8/8/8/8/8/1NN1K3 w - - 0 1", False),
+    ("4k3/8/8/8/8/8/8/1n2K1N1 w - - 0 1", False),
+    ("4k3/8/8/8/8/8/4P3/4K3 w - - 0 1", False),
+])
+def test_insufficient_material(fen, insufficient):
+    gs = GameState.fromFen(fen)
+    assert gs.isInsufficientMaterial() == insufficient
+    assert (gs.gameStatus() == INSUFFICIENT_MATERIAL) == insufficient
+
+
+def test_stalemate():
+    gs = GameState.fromFen("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+    assert gs.gameStatus() == STALEMATE
+    assert gs.staleMate and not gs.checkMate
+    assert not gs.isDrawByRule() # the search scores stale mate itself
@@ -0,0 +1,91 @@
+import pytest
+import Perft
+import Search
+import TablebaseFixture
+from ChessEngine import Move
+from Tablebase import Tablebase, LOSS, DRAW, CURSED_WIN, WIN
+
+'''
+Probes Syzygy files written by TablebaseFixture from KQvK and KRvK solved by retrograde analysis.
+KQvK stores DTZ for white to move and KRvK for black to move, so both the direct lookup and the
+one move lookahead over the missing side are exercised
+'''
+
+
+@pytest.fixture(scope="session")
+def tablebase(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("syzygy")
+    TablebaseFixture.generate(str(directory))
+    tablebase = Tablebase.open(str(directory))
+    yield tablebase
+    tablebase.close()
+
+
+@pytest.mark.parametrize("fen, wdl, dtz", [
+    ("8/8/3k4/8/8/8/8/K6R w - - 0 1", WIN, 29),
+    ("8/8/3k4/8/8/8/8/K6R b - - 0 1", LOSS, -30),
+    ("8/8/8/8/8/1k6/8/KR6 b - - 0 1", LOSS, -30),
+    ("4k3/8/8/8/8/8/8/3QK3 w - - 0 1", WIN, 15),
+    ("8/8/8/3k4/8/8/8/3QK3 b - - 0 1", LOSS, -16),
+    ("k7/8/1K6/8/8/8/8/2Q5 w - - 0 1", WIN, 1),
+    ("k7/8/1K6/8/8/8/8/7R b - - 0 1", LOSS, -2),
+    ("k7/2K5/8/8/8/8/8/R7 b - - 0 1", LOSS, -1), # mated
+    ("8/8/8/8/8/2k5/1r6/K7 w - - 0 1", DRAW, 0), # stale mate
+    ("8/8/8/8/8/8/1r6/K5k1 w - - 0 1", DRAW, 0), # the rook is taken
+])
+def test_probe(tablebase, fen, wdl, dtz):
+    gs = Perft.loadFen(fen)
+    assert tablebase.probeWdl(gs) == wdl
+    assert tablebase.probeDtz(gs) == dtz
+
+
+def test_probe_root(tablebase):
+    gs = Perft.loadFen("8/8/3k4/8/8/8/8/K6R w - - 0 1")
+    code, wdl, plies = tablebase.probeRoot(gs)
+    assert (wdl, plies) == (WIN, 29)
+    gs.makeMoveCode(code)
+    assert tablebase.probeDtz(gs) == -28
+
+
+def test_probe_root_mates_at_once(tablebase):
+    code, wdl, plies = tablebase.probeRoot(Perft.loadFen("k7/8/1K6/8/8/8/8/2Q5 w - - 0 1"))
+    assert (Move.fromCode(code).getUciNotation(), wdl, plies) == ("c1c8", WIN, 1)
+
+
+def test_probe_root_cursed_by_the_fifty_move_rule(tablebase):
+    _, wdl, plies = tablebase.probeRoot(Perft.loadFen("8/8/3k4/8/8/8/8/K6R w - - 80 100"))
+    assert (wdl, plies) == (CURSED_WIN, 29)
+
+
+def test_positions_outside_the_tables(tablebase):
+    assert tablebase.probeWdl(Perft.loadFen("8/8/3k4/8/8/8/8/K5BR w - - 0 1")) is None
+    assert tablebase.probeWdl(Perft.loadFen("r3k3/8/8/8/8/8/8/4K3 b q - 0 1")) is None
+
+
+def test_block_cache(tablebase):
+    tablebase.resetStats()
+    gs = Perft.loadFen("4k3/8/8/8/8/8/8/3QK3 w - - 0 1")
+    tablebase.probeWdl(gs)
+    tablebase.probeWdl(gs)
+    stats = tablebase.getStats()
+    assert stats["probes"] == stats["hits"] == 2
+    assert stats["cacheHits"] >= 1
+    assert stats["tables"] == ["KQvK.rtbw", "KQvK.rtbz", "KRvK.rtbw", "KRvK.rtbz"]
+
+
+def test_open_without_tables(tmp_path):
+    assert Tablebase.open(str(tmp_path)) is None
+
+
+def test_rejects_other_files(tmp_path):
+    (tmp_path / "KQvK.rtbw").write_bytes(bytes(80))
+    with pytest.raises(ValueError):
+        Tablebase(str(tmp_path))
+
+
+def test_search_probes_wdl_only_on_a_fresh_fifty_move_count(tablebase):
+    searcher = Search.Searcher(tablebase=tablebase)
+    assert searcher.canProbeWdl(Perft.loadFen("8/8/3k4/8/8/8/8/K6R b - - 0 1"))
+    assert not searcher.canProbeWdl(Perft.loadFen("8/8/3k4/8/8/8/8/K6R b - - 12 40"))
+    result = Search.Searcher(tablebase=tablebase).search(Perft.loadFen("8/8/3k4/8/8/8/8/K6R w - - 80 100"), maxDepth=2)
+    assert result.score == 0 # cursed by the fifty-move rule
@@ -0,0 +1,82 @@
+from TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+'''
+Store and probe, the replacement between the two entries of a bucket, aging and resizing
+'''
+
+
+'''
+Keys of one bucket: they agree in the bucket bits and differ above them
+'''
+def sameBucket(tt, count, base = 0x1234):
+    buckets = tt.bucketMask + 1
+    return [base + buckets * (i + 1) for i in range(count)]
+
+
+def fields(entry):
+    return (entry.move, entry.score, entry.depth, entry.bound) if entry is not None else None
+
+
+def test_store_probe_round_trip():
+    tt = TranspositionTable(1)
+    tt.store(0xDEADBEEFCAFE, 0x0ABCDEF, -31999, 7, LOWER_BOUND)
+    assert fields(tt.probe(0xDEADBEEFCAFE)) == (0x0ABCDEF, -31999, 7, LOWER_BOUND)
+    assert tt.probe(0xDEADBEEFCAFF) is None
+    assert (tt.probes, tt.hits, tt.stores) == (2, 1, 1)
+
+
+def test_storing_without_a_move_keeps_the_known_one():
+    tt = TranspositionTable(1)
+    tt.store(42, 1234, 10, 3, EXACT)
+    tt.store(42, 0, 20, 4, UPPER_BOUND)
+    assert fields(tt.probe(42)) == (1234, 20, 4, UPPER_BOUND)
+
+
+def test_depth_preferred_and_always_replace_slots():
+    tt = TranspositionTable(1)
+    deep, shallow, shallower, deeper = sameBucket(tt, 4)
+    tt.store(deep, 1, 0, 5, EXACT)
+    tt.store(shallow, 2, 0, 3, EXACT) # too shallow for the depth-preferred slot
+    assert tt.probe(deep).move == 1 and tt.probe(shallow).move == 2
+    tt.store(shallower, 3, 0, 2, EXACT) # takes the always-replace slot
+    assert tt.probe(shallow) is None
+    assert tt.probe(deep).move == 1 and tt.probe(shallower).move == 3
+    tt.store(deeper, 4, 0, 6, EXACT)
+    assert tt.probe(deep) is None
+    assert tt.probe(deeper).move == 4 and tt.probe(shallower).move == 3
+    assert tt.collisions == 2
+
+
+def test_entries_of_an_earlier_search_give_way():
+    tt = TranspositionTable(1)
+    old, new = sameBucket(tt, 2)
+    tt.store(old, 1, 0, 10, EXACT)
+    tt.newSearch()
+    tt.store(new, 2, 0, 1, EXACT)
+    assert tt.probe(new).move == 2
+    assert tt.probe(old) is None
+    assert tt.collisions == 0 # evicting an old search's entry is no collision
+
+
+def test_resize_and_clear():
+    tt = TranspositionTable(1)
+    entries = tt.getStats()["entries"]
+    tt.store(99, 5, 0, 1, EXACT)
+    tt.resize(4)
+    assert tt.getStats()["entries"] == 4 * entries
+    assert tt.getStats()["sizeMb"] == 4
+    assert tt.probe(99) is None
+    tt.store(99, 5, 0, 1, EXACT)
+    tt.clear()
+    assert tt.probe(99) is None
+    assert tt.getStats()["entries"] == 4 * entries
+
+
+def test_hashfull_samples_the_whole_table():
+    tt = TranspositionTable(1)
+    buckets = tt.bucketMask + 1
+    for bucket in range(buckets // 2, buckets): # only the second half of the table
+        tt.store(bucket, 1, 0, 1, EXACT)
+    assert abs(tt.hashfull() - 250) <= 10 # a quarter of the entries, one per bucket in half the buckets
+    tt.newSearch()
+    assert tt.hashfull() == 0
@@ -0,0 +1,93 @@
+import io
+import pytest
+from Uci import UciEngine
+
+'''
+Drives the UCI front end command by command with the output captured in memory
+'''
+
+
+@pytest.fixture
+def engine():
+    engine = UciEngine(io.StringIO())
+    yield engine
+    engine.handle("quit")
+
+
+def lines(engine):
+    return engine.out.getvalue().splitlines()
+
+
+def finish(engine):
+    engine.searchThread.join()
+    return lines(engine)
+
+
+def test_uci_handshake(engine):
+    engine.handle("uci")
+    output = lines(engine)
+    assert output[0].startswith("id name")
+    assert output[-1] == "uciok"
+    assert not any("Ponder" in line for line in output)
+
+
+def test_position_with_moves(engine):
+    engine.handle("position startpos moves e2e4 e7e5 g1f3")
+    engine.handle("d")
+    assert lines(engine) == ["rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2"]
+
+
+def test_illegal_move_keeps_the_moves_before_it(engine):
+    engine.handle("position startpos moves e2e4 e2e4")
+    engine.handle("d")
+    assert lines(engine) == ["info string illegal move e2e4", "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"]
+
+
+def test_go_depth(engine):
+    engine.handle("position startpos moves e2e4")
+    engine.handle("go depth 2")
+    output = finish(engine)
+    assert output[-1].startswith("bestmove ")
+    assert "ponder" not in output[-1]
+    assert any(line.startswith("info depth 2 ") for line in output)
+
+
+def test_isready_during_a_search(engine):
+    engine.handle("go infinite")
+    engine.handle("isready")
+    assert "readyok" in lines(engine)
+    assert engine.searchThread.is_alive() # infinite searches wait for stop
+    engine.handle("stop")
+    assert engine.searchThread is None
+    assert lines(engine)[-1].startswith("bestmove ")
+
+
+def test_malformed_numbers(engine):
+    engine.handle("setoption name Hash value lots")
+    engine.handle("go depth two movetime 100")
+    output = finish(engine)
+    assert output[0] == "info string hash needs a number, not lots"
+    assert output[1] == "info string ignoring depth two, not a number"
+    assert output[-1].startswith("bestmove ")
+
+
+def test_impossible_position_is_refused(engine):
+    engine.handle("position fen 4k3/8/8/8/8/8/8/8 w - - 0 1")
+    engine.handle("d")
+    output = lines(engine)
+    assert output[0].startswith("info string white needs exactly one king")
+    assert output[1] == "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+def test_failing_search_still_sends_bestmove(engine, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("broken")
+    monkeypatch.setattr(engine.searcher, "search", fail)
+    engine.handle("go depth 1")
+    assert finish(engine) == ["info string search failed: RuntimeError: broken", "bestmove 0000"]
+
+
+def test_no_legal_move(engine):
+    engine.handle("position fen 7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+    engine.handle("go depth 1")
+    assert finish(engine)[-1] == "bestmove 0000"